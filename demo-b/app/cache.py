@@ -0,0 +1,129 @@
+import sys
+import threading
+from collections import OrderedDict
+import numpy as np
+
+"""
+process-wide cache of loaded artifacts (word vectors, occurrence indices, alignment arrays)
+so repeated queries against the same artifacts don't reload them from disk
+"""
+
+
+def sizeof(obj, _seen=None):
+    """
+    estimates the number of bytes of memory held by obj
+    numpy arrays count their buffers, memory-mapped arrays count nothing
+    since their pages belong to the os page cache
+    """
+    if _seen is None:
+        _seen = set()
+    if id(obj) in _seen:
+        return 0
+    _seen.add(id(obj))
+    if isinstance(obj, np.memmap):
+        return 0
+    if isinstance(obj, np.ndarray):
+        # views share their base's buffer
+        if obj.base is not None:
+            return sys.getsizeof(obj) + sizeof(obj.base, _seen)
+        return obj.nbytes
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(sizeof(k, _seen) + sizeof(v, _seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(sizeof(x, _seen) for x in obj)
+    elif hasattr(obj, "__dict__"):
+        size += sizeof(vars(obj), _seen)
+    return size
+
+
+class _Pending:
+    """
+    an in-flight load that other threads can wait on
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class ArtifactCache:
+    """
+    thread-safe LRU cache bounded by an estimate of the memory its values hold
+    concurrent requests for the same key share a single load
+    """
+
+    def __init__(self, max_bytes):
+        """
+        max_bytes: int - memory budget, least recently used artifacts are evicted past it
+        """
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._items = OrderedDict()  # key -> (value, size)
+        self._pending = dict()  # key -> _Pending
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        """returns the number of cached artifacts"""
+        return len(self._items)
+
+    def __contains__(self, key):
+        """true if the artifact for key is cached"""
+        return key in self._items
+
+    def get(self, key, loader):
+        """
+        returns the artifact cached under key, calling loader() to load it on a miss
+        key: hashable id of the artifact, e.g. its path
+        loader: callable with no arguments returning the artifact
+        exceptions raised by loader are passed on to every caller waiting on the load
+        """
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                return self._items[key][0]
+            pending = self._pending.get(key)
+            leader = pending is None
+            if leader:
+                pending = self._pending[key] = _Pending()
+        if not leader:
+            # another thread is loading this artifact; wait for it
+            pending.done.wait()
+            if pending.error is not None:
+                raise pending.error
+            return pending.value
+        try:
+            value = loader()
+        except Exception as e:
+            pending.error = e
+            with self._lock:
+                del self._pending[key]
+            pending.done.set()
+            raise
+        size = sizeof(value)
+        with self._lock:
+            del self._pending[key]
+            # artifacts bigger than the whole budget are returned but not kept
+            if size <= self.max_bytes:
+                self._items[key] = (value, size)
+                self.bytes += size
+                self._evict()
+        pending.value = value
+        pending.done.set()
+        return value
+
+    def _evict(self):
+        """
+        drops least recently used artifacts until the cache fits its budget
+        caller must hold the lock
+        """
+        while self.bytes > self.max_bytes:
+            _, (_, size) = self._items.popitem(last=False)
+            self.bytes -= size
+
+    def clear(self):
+        """removes every cached artifact"""
+        with self._lock:
+            self._items.clear()
+            self.bytes = 0
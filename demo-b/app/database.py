@@ -0,0 +1,74 @@
+import os
+import sqlite3
+import threading
+
+"""
+sqlite connections reused across requests and jobs
+each thread of a worker process keeps one open connection to the database, and every
+connection runs in WAL mode so readers in one gunicorn worker are not blocked by writes
+(e.g. an alignment being registered) in the other
+"""
+
+# seconds a statement waits for a lock held by another connection before failing
+BUSY_TIMEOUT = 30.0
+
+
+def connect(path):
+    """
+    opens a connection to the sqlite db at path in WAL mode
+    returns: sqlite3.Connection
+    """
+    db = sqlite3.connect(path, timeout=BUSY_TIMEOUT)
+    # WAL is persistent in the db file, setting it again is a no-op
+    db.execute("PRAGMA journal_mode=WAL")
+    # with WAL a commit only needs to be synced at checkpoints to survive a crash
+    db.execute("PRAGMA synchronous=NORMAL")
+    return db
+
+
+class Connections:
+    """
+    hands out one connection per thread, opened on first use and kept open afterwards
+    connections opened before a fork are not reused by the child
+    """
+
+    def __init__(self, path, row_factory=None):
+        """
+        path: path to the sqlite db
+        row_factory: optional row factory set on every connection
+        """
+        self.path = path
+        self.row_factory = row_factory
+        self._local = threading.local()
+
+    def get(self):
+        """
+        returns: sqlite3.Connection of the calling thread
+        """
+        db = getattr(self._local, "db", None)
+        if db is None or self._local.pid != os.getpid():
+            db = connect(self.path)
+            if self.row_factory is not None:
+                db.row_factory = self.row_factory
+            self._local.db = db
+            self._local.pid = os.getpid()
+        return db
+
+    def release(self):
+        """
+        ends the calling thread's use of its connection for now, rolling back anything left uncommitted
+        the connection stays open for the thread's next call to get
+        """
+        db = getattr(self._local, "db", None)
+        if db is not None and self._local.pid == os.getpid() and db.in_transaction:
+            db.rollback()
+
+    def close(self):
+        """
+        closes the calling thread's connection
+        """
+        db = getattr(self._local, "db", None)
+        if db is not None:
+            if self._local.pid == os.getpid():
+                db.close()
+            self._local.db = None
@@ -9,6 +9,8 @@ create table plaintexts (
     s_path varchar not null,
     -- path to the tokenized plaintext 
     t_path varchar not null,
+    -- path to the token-id encoded corpus of the tokenized plaintext
+    c_path varchar not null,
     occ_path varchar not null
 
 );
@@ -21,9 +23,13 @@ create table embeddings (
   pt_id integer not null,
   -- path to the embedding
   wv_path varchar not null,
+  -- path to the sentence vectors of the plaintext under the embedding
+  sv_path varchar not null,
   -- foreign key constraint, if we delete plaintext delete associated embeddings
   foreign key (pt_id) references plaintexts(id) on delete cascade
 );
+-- /getEmbeddings lists the embeddings of a plaintext
+create index embeddings_pt_id on embeddings(pt_id);
 
 drop table if exists alignments;
 create table alignments (
@@ -32,19 +38,50 @@ create table alignments (
   description varchar not null,
   e1_id integer not null,
   e2_id integer not null,
-  -- path to common words
-  c_path varchar not null,
-  -- path to the first aligned embedding
-  v1_path varchar not null,
-  -- path to the secondn aligned embeddings
-  v2_path varchar not null,
-  -- path to shifts
-  s_path varchar not null,
-  -- path to dists
-  d_path varchar not null,
-  -- path to q
-  q_path varchar not null,
+  -- path to the alignment bundle: common words, aligned embeddings, shifts, Q
+  -- and the approximate neighbor indices of large alignments (see Alignment.write)
+  a_path varchar not null,
   -- foreign key constraints, on delete cascade
   foreign key (e1_id) references embeddings(id) on delete cascade
   foreign key (e2_id) references embeddings(id) on delete cascade
-);
\ No newline at end of file
+);
+-- /getAlignments lists the alignments of a pair of embeddings
+create index alignments_e1_id_e2_id on alignments(e1_id, e2_id);
+
+drop table if exists jobs;
+create table jobs (
+  id integer primary key autoincrement,
+  -- upload, embedding or alignment
+  kind varchar not null,
+  -- queued, running, done or failed
+  status varchar not null,
+  -- name and position of the stage the job is currently in
+  stage varchar,
+  stage_index integer,
+  num_stages integer not null,
+  -- fraction of the current stage that is complete
+  progress real not null,
+  -- id of the plaintext, embedding or alignment the job created
+  artifact_id integer,
+  error varchar,
+  -- id of the worker process that runs the job, jobs of workers that exited are marked failed on startup
+  pid integer,
+  created_at real not null,
+  -- when the job left the queue and started running, null while queued
+  started_at real,
+  updated_at real not null
+);
+
+drop table if exists job_stages;
+create table job_stages (
+  id integer primary key autoincrement,
+  job_id integer not null,
+  stage varchar not null,
+  stage_index integer not null,
+  started_at real not null,
+  -- wall clock seconds the stage took
+  seconds real not null,
+  foreign key (job_id) references jobs(id) on delete cascade
+);
+-- /getJob lists the stages of a job
+create index job_stages_job_id on job_stages(job_id);
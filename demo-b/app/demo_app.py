@@ -1,36 +1,54 @@
-from ctypes import alignment
 import time
 import uuid
-from flask import Flask, request, jsonify, current_app, g
+from flask import Flask, Response, request, jsonify, current_app, g
 import argparse
 import numpy as np
-import pickle
+import shutil
 from sklearn.decomposition import PCA
 import json
 import sqlite3
 import app.preprocessing.generate_embeddings.occurrences as occ
 import app.preprocessing.generate_embeddings.embed as embed
-import app.preprocessing.tokenize as tokenize
-import app.preprocessing.sentencize as sentencize
+import app.preprocessing.generate_embeddings.sentence_vectors as sentence_vectors
+import app.preprocessing.ingest as ingest
+from app.preprocessing.token_corpus import TokenCorpus
 from app.preprocessing.generate_examples.alignment.align import Alignment
-from preprocessing.WordVectors import WordVectors
+from app.jobs import JobQueue
+from app.database import Connections
+from app.resources import ResourceScheduler
+from app import metrics
+from app.cache import ArtifactCache
+from app.preprocessing.WordVectors import WordVectors
+from app.preprocessing.neighbors import METRICS
+from app.preprocessing.generate_examples.pairing import METHODS as PAIRING_METHODS
+import app.preprocessing.mapping as mapping
 from flask_cors import CORS
 from pathlib import Path
 DATABASE = "app/db/demo_app.db"
+# lock files of the heavy job slots shared by every worker on the node
+LOCK_FOLDER = "app/db"
 UPLOAD_FOLDER = "app/artifacts/uploads"
 SCRUBBED_FOLDER = "app/artifacts/scrubbed"
 OCCURRENCES_FOLDER = "app/artifacts/occurrences"
 TOKENIZED_FOLDER = "app/artifacts/tokenized"
+CORPUS_FOLDER = "app/artifacts/corpus"
 EMBEDDINGS_FOLDER = "app/artifacts/embeddings"
-COMMON_WORDS_FOLDER = "app/artifacts/alignments/common_words"
-ALIGNED_EMBEDDINGS_FOLDER = "app/artifacts/alignments/embeddings"
-SHIFTS_FOLDER = "app/artifacts/alignments/shifts"
-DISTANCES_FOLDER = "app/artifacts/alignments/distances"
-Q_FOLDER = "app/artifacts/alignments/Q"
+SENTENCE_VECTORS_FOLDER = "app/artifacts/sentence_vectors"
+ALIGNMENTS_FOLDER = "app/artifacts/alignments"
 ALLOWED_EXTENSIONS = set(["txt"])
 sqlite3.register_adapter(np.float64, float)
 
 
+def remove_artifact(path):
+    """
+    deletes an artifact, which is either a single file or a directory of files
+    """
+    if path.is_dir():
+        shutil.rmtree(path)
+    else:
+        path.unlink()
+
+
 def clean_start():
     # reset the database
     init_db()
@@ -38,52 +56,42 @@ def clean_start():
     for file in Path(UPLOAD_FOLDER).glob("*"):
         if file.name == ".gitignore":
             continue
-        file.unlink()
+        remove_artifact(file)
     # delete all files in the scrubbed folder, preserving gitignore
     for file in Path(SCRUBBED_FOLDER).glob("*"):
         if file.name == ".gitignore":
             continue
-        file.unlink()
+        remove_artifact(file)
     # delete all files in the occurrences folder, preserving gitignore
     for f in Path(OCCURRENCES_FOLDER).glob("*"):
         if f.name == ".gitignore":
             continue
-        f.unlink()
+        remove_artifact(f)
     # delete all files in the tokenized folder, preserving gitignore
     for f in Path(TOKENIZED_FOLDER).glob("*"):
         if f.name == ".gitignore":
             continue
-        f.unlink()
-    # delete all files in the embeddings folder, preserving gitignore
-    for f in Path(EMBEDDINGS_FOLDER).glob("*"):
-        if f.name == ".gitignore":
-            continue
-        f.unlink()
-    # delete all files in the common words folder, preserving gitignore
-    for f in Path(COMMON_WORDS_FOLDER).glob("*"):
-        if f.name == ".gitignore":
-            continue
-        f.unlink()
-    # delete all files in the aligned embeddings folder, preserving gitignore
-    for f in Path(ALIGNED_EMBEDDINGS_FOLDER).glob("*"):
+        remove_artifact(f)
+    # delete all files in the corpus folder, preserving gitignore
+    for f in Path(CORPUS_FOLDER).glob("*"):
         if f.name == ".gitignore":
             continue
-        f.unlink()
-    # delete all files in the shifts folder, preserving gitignore
-    for f in Path(SHIFTS_FOLDER).glob("*"):
+        remove_artifact(f)
+    # delete all files in the embeddings folder, preserving gitignore
+    for f in Path(EMBEDDINGS_FOLDER).glob("*"):
         if f.name == ".gitignore":
             continue
-        f.unlink()
-    # delete all files in the distances folder, preserving gitignore
-    for f in Path(DISTANCES_FOLDER).glob("*"):
+        remove_artifact(f)
+    # delete all files in the sentence vectors folder, preserving gitignore
+    for f in Path(SENTENCE_VECTORS_FOLDER).glob("*"):
         if f.name == ".gitignore":
             continue
-        f.unlink()
-    # delete all files in the Q folder, preserving gitignore
-    for f in Path(Q_FOLDER).glob("*"):
+        remove_artifact(f)
+    # delete all alignment bundles, preserving gitignore
+    for f in Path(ALIGNMENTS_FOLDER).glob("*"):
         if f.name == ".gitignore":
             continue
-        f.unlink()
+        remove_artifact(f)
 
 
 def allowed_file(filename):
@@ -93,6 +101,20 @@ def allowed_file(filename):
     return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
+def parse_flag(value):
+    """
+    reads a boolean setting sent as a JSON boolean, 0 or 1, or one of the strings "true", "false", "1", "0"
+    raises ValueError for anything else
+    """
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str) and value.strip().lower() in ("true", "false", "1", "0"):
+        return value.strip().lower() in ("true", "1")
+    raise ValueError(f"not a boolean: {value!r}")
+
+
 def make_dicts(cursor, row):
     """
     Convert the sqlite3 cursor to a list of dictionaries
@@ -102,13 +124,9 @@ def make_dicts(cursor, row):
 
 def get_db():
     """
-    connect to the sqlite db
+    returns this thread's connection to the sqlite db, which is reused across requests
     """
-    db = getattr(g, "_database", None)
-    if db is None:
-        db = g._database = sqlite3.connect(DATABASE)
-    db.row_factory = make_dicts
-    return db
+    return connections.get()
 
 
 def init_db():
@@ -136,10 +154,41 @@ def write_db_ret_last(query, args=()):
     Write to the database, returning the last inserted id
     """
     db = get_db()
-    db.execute(query, args)
+    cur = db.execute(query, args)
     db.commit()
-    id = db.execute("SELECT last_insert_rowid()").fetchone()["last_insert_rowid()"]
-    return id
+    return cur.lastrowid
+
+
+def load_wordvectors(path):
+    """
+    returns the WordVectors stored at path, loading them into the artifact cache if needed
+    """
+    return artifacts.get(
+        ("wv", str(path)),
+        lambda: WordVectors.from_file(path, mmap=True, dtype=app.config["VECTOR_DTYPE"]),
+    )
+
+
+def load_occurrences(path):
+    """
+    returns the OccurrenceIndex stored at path, loading it into the artifact cache if needed
+    """
+    return artifacts.get(("occ", str(path)), lambda: occ.OccurrenceIndex.load(path))
+
+
+def load_sentence_vectors(path):
+    """
+    returns the sentence vectors stored at path, memory-mapping them into the artifact cache if needed
+    """
+    return artifacts.get(("sv", str(path)), lambda: sentence_vectors.load(path))
+
+
+def load_alignment(path):
+    """
+    returns the alignment bundle stored at path, loading it into the artifact cache if needed
+    its arrays are memory-mapped, so requests only read the pages they touch
+    """
+    return artifacts.get(("alignment", str(path)), lambda: Alignment.load(path))
 
 
 def query_db(query, args=(), one=False):
@@ -161,24 +210,230 @@ app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
 app.config["SCRUBBED_FOLDER"] = SCRUBBED_FOLDER
 app.config["OCCURRENCES_FOLDER"] = OCCURRENCES_FOLDER
 app.config["TOKENIZED_FOLDER"] = TOKENIZED_FOLDER
+app.config["CORPUS_FOLDER"] = CORPUS_FOLDER
 app.config["EMBEDDINGS_FOLDER"] = EMBEDDINGS_FOLDER
-app.config["COMMON_WORDS_FOLDER"] = COMMON_WORDS_FOLDER
-app.config["ALIGNED_EMBEDDINGS_FOLDER"] = ALIGNED_EMBEDDINGS_FOLDER
-app.config["SHIFTS_FOLDER"] = SHIFTS_FOLDER
-app.config["DISTANCES_FOLDER"] = DISTANCES_FOLDER
-app.config["Q_FOLDER"] = Q_FOLDER
+app.config["SENTENCE_VECTORS_FOLDER"] = SENTENCE_VECTORS_FOLDER
+app.config["ALIGNMENTS_FOLDER"] = ALIGNMENTS_FOLDER
+# floating point type embeddings and alignments are stored and served as
+app.config.setdefault("VECTOR_DTYPE", "float32")
+# word2vec training threads, None uses the cores of the job (see below)
+app.config.setdefault("EMBED_WORKERS", None)
+# cores budgeted on this node, None uses every cpu available to the process
+app.config.setdefault("CPUS", None)
+# uploads, embeddings and alignments that may run at once on the node, each gets CPUS / HEAVY_JOBS cores
+app.config.setdefault("HEAVY_JOBS", 1)
+# gunicorn workers sharing the cores for queries (start.sh passes the same number to gunicorn)
+app.config.setdefault("WEB_WORKERS", 1)
+# alignments with at least this many words get approximate neighbor indices,
+# which /getContext only searches when the request sets approximate (exact search is the default)
+app.config.setdefault("ANN_MIN_WORDS", 50000)
+# lists of the approximate index probed per query, unless the request sets nprobe
+# (recall@10 was 0.97 at 16 and 0.76 at 4 lists on a 56k word trained embedding, see benchmarks/bench_ann.py)
+app.config.setdefault("ANN_NPROBE", 16)
 
 CORS(app, resources={r"/*": {"origins": "*"}})
 
+# artifacts shared by requests in this worker, bounded by ARTIFACT_CACHE_BYTES (default 2GB)
+artifacts = ArtifactCache(app.config.get("ARTIFACT_CACHE_BYTES", 2 * 1024**3))
+
+# sqlite connections, one per thread, kept open across requests
+connections = Connections(DATABASE, row_factory=make_dicts)
+
+# cpu budget of this worker: process pool, word2vec and BLAS threads of jobs, BLAS threads of queries
+scheduler = ResourceScheduler(
+    LOCK_FOLDER,
+    cpus=app.config["CPUS"],
+    heavy_jobs=app.config["HEAVY_JOBS"],
+    web_workers=app.config["WEB_WORKERS"],
+)
+scheduler.limit_query_threads()
+
+# background jobs for uploads, embeddings and alignments
+jobs = JobQueue(DATABASE, max_workers=app.config.get("JOB_WORKERS", 1), scheduler=scheduler)
+
 if app.config["CLEAN_START"]:
     clean_start()
 
+# jobs of workers that crashed or were restarted mid-job would otherwise stay queued or running forever
+jobs.fail_interrupted()
+
 
 @app.teardown_appcontext
 def close_connection(exception):
-    db = getattr(g, "_database", None)
-    if db is not None:
-        db.close()
+    # the connection stays open for the thread's next request
+    connections.release()
+
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def record_request(response):
+    """
+    records the latency and response size of every request, labeled by route rather than url
+    so the number of series stays bounded
+    """
+    route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    labels = dict(route=route, method=request.method, status=response.status_code)
+    if "request_start" in g:
+        metrics.REGISTRY.observe(
+            "http_request_seconds",
+            time.perf_counter() - g.request_start,
+            help="latency of requests",
+            **labels,
+        )
+    metrics.REGISTRY.inc(
+        "http_response_bytes_total",
+        response.content_length or 0,
+        help="bytes of response bodies",
+        **labels,
+    )
+    return response
+
+
+def record_artifact(artifact, path, words=None):
+    """
+    counts the bytes of an artifact written to path, and the size of its vocabulary if it has one
+    """
+    metrics.REGISTRY.inc(
+        "artifact_bytes_total", metrics.disk_bytes(path), help="bytes of artifacts written", artifact=artifact
+    )
+    if words is not None:
+        metrics.REGISTRY.set(
+            "vocabulary_words", words, help="words in the vocabulary of the last artifact written", artifact=artifact
+        )
+
+
+def with_app_context(fn):
+    """
+    wraps fn so it runs inside an app context (needed for db access from job threads)
+    """
+
+    def wrapped(*args, **kwargs):
+        with app.app_context():
+            return fn(*args, **kwargs)
+
+    return wrapped
+
+
+def run_upload(job, f_path, dataset_name, dataset_description):
+    """
+    scrubs, tokenizes and indexes an uploaded plaintext, recording it in the database
+    job: jobs.Job used to report progress
+    returns: id of the new plaintext
+    """
+    # generate random scrubbed, tokenized and occurrences filenames
+    s_filename = Path(str(uuid.uuid4()) + ".txt")
+    s_path = Path(app.config["SCRUBBED_FOLDER"]) / s_filename
+    t_filename = Path(str(uuid.uuid4()) + ".txt")
+    t_path = Path(app.config["TOKENIZED_FOLDER"]) / t_filename
+    occ_filename = Path(str(uuid.uuid4()))
+    occ_path = Path(app.config["OCCURRENCES_FOLDER"]) / occ_filename
+    c_path = Path(app.config["CORPUS_FOLDER"]) / Path(str(uuid.uuid4()))
+    # scrub, tokenize, encode and generate occurrences in a single pass over the upload
+    job.stage("ingest")
+    corpus, occs = ingest.ingest(f_path, s_path, t_path, pool=scheduler.pool(), progress=job.progress)
+    job.stage("write")
+    # write the token-id corpus to c_path and the occurrence index to occ_path
+    with metrics.stage("write", artifact="corpus"):
+        corpus.write(c_path)
+    with metrics.stage("write", artifact="occurrences"):
+        occs.write(occ_path)
+    metrics.REGISTRY.inc("upload_bytes_total", metrics.disk_bytes(f_path), help="bytes of plaintexts uploaded")
+    record_artifact("scrubbed", s_path)
+    record_artifact("tokenized", t_path)
+    record_artifact("corpus", c_path, len(corpus.vocab))
+    record_artifact("occurrences", occ_path)
+    # insert dataset_name, dataset_description, f_path, s_path, t_path, c_path and occ_path into the database
+    return write_db_ret_last(
+        "INSERT INTO plaintexts (name, description, p_path, s_path, t_path, c_path, occ_path) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (
+            dataset_name,
+            dataset_description,
+            str(f_path),
+            str(s_path),
+            str(t_path),
+            str(c_path),
+            str(occ_path),
+        ),
+    )
+
+
+def run_embedding(job, pt_id, pt_po, c_po, e_name, e_description, settings):
+    """
+    trains a word2vec embedding on a tokenized plaintext, recording it in the database
+    pt_po: path to the tokenized plaintext, c_po: path to its token-id corpus
+    job: jobs.Job used to report progress
+    returns: id of the new embedding
+    """
+    job.stage("train")
+    wv = embed.w2v_embed(
+        pt_po,
+        int(settings["size"]),
+        int(settings["window"]),
+        int(settings["minCount"]),
+        wv_workers=app.config["EMBED_WORKERS"] or scheduler.job_cpus,
+        dtype=app.config["VECTOR_DTYPE"],
+        epochs=int(settings.get("epochs", 5)),
+        negative=int(settings.get("negative", 5)),
+        sample=float(settings.get("sample", 1e-3)),
+        corpus_file=settings.get("corpusFile", True),
+    )
+    job.stage("write")
+    # generate a random directory name for the embedding
+    e_fn = Path(str(uuid.uuid4()))
+    e_path = Path(app.config["EMBEDDINGS_FOLDER"]) / e_fn
+    with metrics.stage("write", artifact="embedding"):
+        wv.to_file(e_path)
+    print("embedding saved to: " + str(e_path))
+    record_artifact("embedding", e_path, len(wv))
+    # embed every sentence of the plaintext once, so example sentence requests only gather rows
+    job.stage("sentences")
+    sv_path = Path(app.config["SENTENCE_VECTORS_FOLDER"]) / (str(e_fn) + ".npy")
+    with metrics.stage("sentence_vectors"):
+        sentence_vectors.build(TokenCorpus.load(c_po), wv, sv_path)
+    record_artifact("sentence_vectors", sv_path)
+    # create entry in embeddings for the embedding, return the id
+    return write_db_ret_last(
+        "INSERT INTO embeddings (name, description, pt_id, wv_path, sv_path) VALUES (?, ?, ?, ?, ?)",
+        (e_name, e_description, pt_id, str(e_path), str(sv_path)),
+    )
+
+
+def run_alignment(job, e1_id, e2_id, e1wvp, e2wvp, name, description, alignment_type, config):
+    """
+    aligns a pair of embeddings and writes the alignment artifacts, recording them in the database
+    job: jobs.Job used to report progress
+    returns: id of the new alignment
+    """
+    job.stage("load")
+    # get the wv object for the first embedding
+    wv1 = load_wordvectors(e1wvp)
+    # get the wv object for the second embedding
+    wv2 = load_wordvectors(e2wvp)
+    # generate the alignment (computes the two alignment matrices and the shifts)
+    job.stage("align")
+    a = Alignment.from_wv_and_config(
+        wv1, wv2, alignment_type, config, dtype=app.config["VECTOR_DTYPE"]
+    )
+    # index both aligned embeddings for approximate neighbor queries, exact search is fast enough below ANN_MIN_WORDS
+    job.stage("index")
+    if len(a.common) >= app.config["ANN_MIN_WORDS"]:
+        with metrics.stage("index"):
+            a.build_indices()
+    # write the alignment bundle, it is only registered once it is completely on disk
+    job.stage("write")
+    a_path = Path(app.config["ALIGNMENTS_FOLDER"]) / Path(str(uuid.uuid4()))
+    with metrics.stage("write", artifact="alignment"):
+        a.write(a_path)
+    record_artifact("alignment", a_path, len(a.common))
+    # create entry in alignments for the alignment, return the id
+    return write_db_ret_last(
+        "INSERT INTO alignments (name, description, e1_id, e2_id, a_path) VALUES (?, ?, ?, ?, ?)",
+        (name, description, e1_id, e2_id, str(a_path)),
+    )
 
 
 @app.route("/")
@@ -245,43 +500,16 @@ def upload_file():
         filename = Path(str(uuid.uuid4()) + ".txt")
         f_path = Path(app.config["UPLOAD_FOLDER"]) / filename
         file.save(f_path)
-        # scrub the file and save the scrubbed copy
-        # generate random scrub filename
-        s_filename = Path(str(uuid.uuid4()) + ".txt")
-        s_path = Path(app.config["SCRUBBED_FOLDER"]) / s_filename
-        # scrub and write to s_path
-        sentencize.initial_scrub(f_path, s_path)
-        # tokenize the scrubbed file and save the tokenized copy
-        # generate random tokenized filename
-        t_filename = Path(str(uuid.uuid4()) + ".txt")
-        t_path = Path(app.config["TOKENIZED_FOLDER"]) / t_filename
-        # tokenize and write to t_path
-        tokenize.initial_tokenize(s_path, t_path)
-        # generate occurrences
-        occ_filename = Path(str(uuid.uuid4()) + ".txt")
-        occ_path = Path(app.config["OCCURRENCES_FOLDER"]) / occ_filename
-        occs = occ.get_occurrences(t_path)
-        # pickle dump occs to occ_path
-        with open(occ_path, "wb+") as f:
-            pickle.dump(occs, f)
-        # insert dataset_name, dataset_description, f_path, s_path, t_path, and occ_path into the database
-        dataset_id = write_db_ret_last(
-            "INSERT INTO plaintexts (name, description, p_path, s_path, t_path, occ_path) VALUES (?, ?, ?, ?, ?, ?)",
-            (
-                dataset_name,
-                dataset_description,
-                str(f_path),
-                str(s_path),
-                str(t_path),
-                str(occ_path),
-            ),
-        )
-        return (
-            jsonify(
-                {"message": "File successfully uploaded and indexed", "id": dataset_id}
-            ),
-            201,
+        # scrub, tokenize and index the upload in the background
+        job_id = jobs.submit(
+            "upload",
+            ["ingest", "write"],
+            with_app_context(run_upload),
+            f_path,
+            dataset_name,
+            dataset_description,
         )
+        return jsonify({"message": "File successfully uploaded, indexing", "job_id": job_id}), 202
     return jsonify({"error": "Invalid file type: allowed file types are txt"}), 400
 
 
@@ -311,13 +539,10 @@ def generate_embedding():
     e_description = d["description"]
     embedding_type = d["embeddingType"]
     # if the provided file id is not in the database
-    pt = query_db("SELECT t_path FROM plaintexts WHERE id = ?", (pt_id,), one=True)
+    pt = query_db("SELECT t_path, c_path FROM plaintexts WHERE id = ?", (pt_id,), one=True)
     if pt is None:
         return jsonify({"error": "Invalid file id"}), 400
-    # get the path to the tokenized plaintext from the database response
-    pt_p = pt["t_path"]
-    pt_po = Path(pt_p)
-    # generate the embedding according to the supplied embedding type
+    # check the settings for the supplied embedding type
     if embedding_type == "word2vec":
         # attempt to extract the settings from the request
         if "settings" not in d:
@@ -331,20 +556,27 @@ def generate_embedding():
             return jsonify({"error": "No min count in the settings"}), 400
         if "minCount" not in settings:
             return jsonify({"error": "No min count in the settings"}), 400
-        wv = embed.w2v_embed(pt_po, int(settings["size"]), int(settings["window"]), int(settings["minCount"]))
+        # corpusFile is optional, but "false" must not be read as true
+        if "corpusFile" in settings:
+            try:
+                settings["corpusFile"] = parse_flag(settings["corpusFile"])
+            except ValueError:
+                return jsonify({"error": "corpusFile must be true or false"}), 400
     else:
         return jsonify({"error": "Invalid embedding type"}), 400
-    # generate a random filename for the embedding
-    e_fn = Path(str(uuid.uuid4()) + ".txt")
-    e_path = Path(app.config["EMBEDDINGS_FOLDER"]) / e_fn
-    wv.to_file(e_path)
-    print("embedding saved to: " + str(e_path))
-    # create entry in embeddings for the embedding, return the id
-    e_id = write_db_ret_last(
-        "INSERT INTO embeddings (name, description, pt_id, wv_path) VALUES (?, ?, ?, ?)",
-        (e_name, e_description, pt_id, str(e_path)),
+    # train the embedding in the background
+    job_id = jobs.submit(
+        "embedding",
+        ["train", "write", "sentences"],
+        with_app_context(run_embedding),
+        pt_id,
+        Path(pt["t_path"]),
+        Path(pt["c_path"]),
+        e_name,
+        e_description,
+        settings,
     )
-    return jsonify({"message": "Embedding generated", "id": e_id}), 201
+    return jsonify({"message": "Embedding queued", "job_id": job_id}), 202
 
 
 # route for generating alignments
@@ -396,64 +628,80 @@ def generate_alignment():
     if e2 is None:
         return jsonify({"error": f"Invalid embedding id: {e2_id}"}), 400
     e2wvp = Path(e2["wv_path"])
-    # get the wv object for the first embedding
-    wv1 = WordVectors.from_file(e1wvp)
-    # get the wv object for the second embedding
-    wv2 = WordVectors.from_file(e2wvp)
-    # get the words and vectors for the second alignment
-
-    # generate the alignment (computes the two alignment matrices, the shifts, and the distances)
+    # validate the alignment type and settings before queueing
     try:
-        a = Alignment.from_wv_and_config(wv1, wv2, alignment_type, config)
-    except ValueError as e:
+        Alignment.config_from_dict(alignment_type, config)
+    except (ValueError, TypeError) as e:
         return jsonify({"error": str(e)}), 400
-    # dump the common words to disk
-    c_fn = Path(str(uuid.uuid4()) + ".pickle")
-    c_path = Path(app.config["COMMON_WORDS_FOLDER"]) / c_fn
-    with open(c_path, "wb") as f:
-        pickle.dump(a.common, f)
-    # dump the first aligned embeddings to disk
-    av1_fn = Path(str(uuid.uuid4()) + ".pickle")
-    av1_path = Path(app.config["ALIGNED_EMBEDDINGS_FOLDER"]) / av1_fn
-    with open(av1_path, "wb") as f:
-        pickle.dump(a.v1, f)
-    # dump the second aligned embeddings to disk
-    av2_fn = Path(str(uuid.uuid4()) + ".pickle")
-    av2_path = Path(app.config["ALIGNED_EMBEDDINGS_FOLDER"]) / av2_fn
-    with open(av2_path, "wb") as f:
-        pickle.dump(a.v2, f)
-    # dump the shift matrix to disk
-    s_fn = Path(str(uuid.uuid4()) + ".pickle")
-    s_path = Path(app.config["SHIFTS_FOLDER"]) / s_fn
-    with open(s_path, "wb") as f:
-        pickle.dump(a.shifts, f)
-    # dump the dists matrix to disk
-    d_fn = Path(str(uuid.uuid4()) + ".pickle")
-    d_path = Path(app.config["DISTANCES_FOLDER"]) / d_fn
-    with open(d_path, "wb") as f:
-        pickle.dump(a.dists, f)
-    # dump the q matrix to disk
-    q_fn = Path(str(uuid.uuid4()) + ".pickle")
-    q_path = Path(app.config["Q_FOLDER"]) / q_fn
-    with open(q_path, "wb") as f:
-        pickle.dump(a.Q, f)
-    # create entry in alignments for the alignment, return the id
-    a_id = write_db_ret_last(
-        "INSERT INTO alignments (name, description, e1_id, e2_id, c_path, v1_path, v2_path, s_path, d_path, q_path) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
-        (
-            name,
-            description,
-            e1_id,
-            e2_id,
-            str(c_path),
-            str(av1_path),
-            str(av2_path),
-            str(s_path),
-            str(d_path),
-            str(q_path),
-        ),
+    # generate the alignment in the background
+    job_id = jobs.submit(
+        "alignment",
+        ["load", "align", "index", "write"],
+        with_app_context(run_alignment),
+        e1_id,
+        e2_id,
+        e1wvp,
+        e2wvp,
+        name,
+        description,
+        alignment_type,
+        config,
+    )
+    return jsonify({"message": "Alignment queued", "job_id": job_id}), 202
+
+
+@app.route("/getJob", methods=["POST"])
+def get_job():
+    """
+    gets the status, stage, progress and resulting artifact id of a job
+    """
+    # get request json
+    d = request.get_json()
+    # check if the request has an id
+    if "id" not in d:
+        return jsonify({"error": "No id provided"}), 400
+    job = query_db("SELECT * FROM jobs WHERE id = ?", (d["id"],), one=True)
+    if job is None:
+        return jsonify({"error": "Invalid job id"}), 400
+    # how long each finished stage took
+    job["stages"] = query_db(
+        "SELECT stage, stage_index, started_at, seconds FROM job_stages WHERE job_id = ? ORDER BY id",
+        (d["id"],),
+    )
+    return jsonify({"message": "Job retrieved", "job": job}), 200
+
+
+@app.route("/getJobs")
+def get_jobs():
+    """
+    return all jobs, most recent first
+    """
+    return jsonify(query_db("SELECT * FROM jobs ORDER BY id DESC"))
+
+
+@app.route("/getStageTimes")
+def get_stage_times():
+    """
+    return where the time of finished stages went, per kind of job and stage, over every job on record
+    """
+    return jsonify(
+        query_db(
+            "SELECT jobs.kind, job_stages.stage, COUNT(*) AS count, SUM(seconds) AS total, "
+            "AVG(seconds) AS mean, MAX(seconds) AS max FROM job_stages JOIN jobs ON jobs.id = job_stages.job_id "
+            "GROUP BY jobs.kind, job_stages.stage ORDER BY jobs.kind, MIN(job_stages.stage_index)"
+        )
     )
-    return jsonify({"message": "Alignment generated", "id": a_id}), 201
+
+
+@app.route("/metrics")
+def get_metrics():
+    """
+    request, pipeline stage and job latency histograms, byte counts and vocabulary sizes of this worker
+    in the prometheus text format
+    """
+    metrics.REGISTRY.set("artifact_cache_bytes", artifacts.bytes, help="bytes held by the artifact cache")
+    metrics.REGISTRY.set("artifact_cache_items", len(artifacts), help="artifacts held by the artifact cache")
+    return Response(metrics.REGISTRY.render(), mimetype="text/plain; version=0.0.4")
 
 
 @app.route("/getAlignments", methods=["POST"])
@@ -493,11 +741,11 @@ def get_alignment():
     if "id" not in d:
         return jsonify({"error": "No id provided"}), 400
     a_id = d["id"]
-    # if the provided alignment id is not in the database
-    if query_db("SELECT * FROM alignments WHERE id = ?", (a_id,), one=True) is None:
-        return jsonify({"error": "Invalid alignment id"}), 400
     # get the alignment from the database
     a = query_db("SELECT * FROM alignments WHERE id = ?", (a_id,), one=True)
+    # if the provided alignment id is not in the database
+    if a is None:
+        return jsonify({"error": "Invalid alignment id"}), 400
     return jsonify({"message": "Alignment retrieved", "alignment": a}), 200
 
 
@@ -526,29 +774,42 @@ def get_top_shifted_words():
         return jsonify({"error": "No id provided"}), 400
     a_id = d["id"]
     # if the provided alignment id is not in the database
-    r = query_db("SELECT c_path, s_path FROM alignments WHERE id = ?", (a_id,), one=True)
+    r = query_db("SELECT a_path FROM alignments WHERE id = ?", (a_id,), one=True)
     if r is None:
         return jsonify({"error": "Invalid alignment id"}), 400
-    # check if the request has a desired number of words
-    if "num_words" not in d:
+    # page size, num_words is accepted for older clients
+    if "limit" in d:
+        limit = d["limit"]
+    elif "num_words" in d:
+        limit = d["num_words"]
+    else:
         return jsonify({"error": "No number of words provided"}), 400
-    num_words = d["num_words"]
-    # check if num words is an integer
-    if not isinstance(num_words, int):
-        return jsonify({"error": "Number of words must be an integer"}), 400
-    # get the path to the shifts for the alignment
-    s_path = Path(r["s_path"])
-    s = pickle.load(open(s_path, "rb"))
-    # get the path to the common words for the alignment
-    c_path = Path(r["c_path"])
-    c = pickle.load(open(c_path, "rb"))
+    offset = d.get("offset", 0)
+    # check if the page bounds are integers
+    if not isinstance(limit, int) or not isinstance(offset, int):
+        return jsonify({"error": "Number of words and offset must be integers"}), 400
+    # most shifted words first unless the least shifted are requested
+    direction = d.get("direction", "most")
+    if direction not in ("most", "least"):
+        return jsonify({"error": "Direction must be most or least"}), 400
+    # slice the ranking stored with the alignment
+    al = load_alignment(Path(r["a_path"]))
     try:
-        ts = Alignment.top_shifted_words(c, s, num_words) 
+        ts = al.shifted_words(offset, limit, most=direction == "most")
     except ValueError as e:
         return jsonify({"message": str(e)}), 400
 
-    
-    return jsonify({"message": "Top shifted words retrieved", "shifted_words": ts, "alignment_id": a_id}), 200
+    return (
+        jsonify(
+            {
+                "message": "Top shifted words retrieved",
+                "shifted_words": ts,
+                "alignment_id": a_id,
+                "total": len(al.ranking),
+            }
+        ),
+        200,
+    )
 
 @app.route("/getRandomSentence", methods=["POST"])
 def get_random_sentence():
@@ -565,7 +826,7 @@ def get_random_sentence():
     a_id = d["id"]
     # get the alignment from the database
     a = query_db(
-        "SELECT e1_id, e2_id, q_path FROM alignments WHERE id = ?", (a_id,), one=True
+        "SELECT e1_id, e2_id, a_path FROM alignments WHERE id = ?", (a_id,), one=True
     )
     # if the provided alignment id is not in the database
     if a is None:
@@ -578,29 +839,36 @@ def get_random_sentence():
         return jsonify({"error": "No first provided"}), 400
     first = d["first"]
     word = d["word"]
+    # number of sentences from the other context to return
+    num_neighbors = d.get("neighbors", 3)
+    if not isinstance(num_neighbors, int) or num_neighbors < 1:
+        return jsonify({"error": "Number of neighbors must be a positive integer"}), 400
+    # optional seed making the random choice of sentence reproducible
+    seed = d.get("seed")
+    if seed is not None and not isinstance(seed, int):
+        return jsonify({"error": "Seed must be an integer"}), 400
     e1_id = a["e1_id"]
     e2_id = a["e2_id"]
     # swap if not first
     if first == "false":
         e1_id, e2_id = e2_id, e1_id
     
-    q_path = Path(a["q_path"])
+    a_path = Path(a["a_path"])
 
     # generate examples
     # load alignment from disk
-    with open(q_path, "rb") as f:
-        Q = pickle.load(f)
+    Q = load_alignment(a_path).Q
     # get wordvectors and plaintext ids associated with the specified embeddings
     pt1_d = query_db(
-        "SELECT pt_id, wv_path FROM embeddings WHERE id = ?", (e1_id,), one=True
+        "SELECT pt_id, sv_path FROM embeddings WHERE id = ?", (e1_id,), one=True
     )
     pt2_d = query_db(
-        "SELECT pt_id, wv_path FROM embeddings WHERE id = ?", (e2_id,), one=True
+        "SELECT pt_id, sv_path FROM embeddings WHERE id = ?", (e2_id,), one=True
     )
     pt1_id = pt1_d["pt_id"]
     pt2_id = pt2_d["pt_id"]
-    e1_v_po = Path(pt1_d["wv_path"])
-    e2_v_po = Path(pt2_d["wv_path"])
+    e1_sv_po = Path(pt1_d["sv_path"])
+    e2_sv_po = Path(pt2_d["sv_path"])
     # get the path to the scrubbed plaintext and occs file from the database (for pt1)
     r = query_db(
         "SELECT s_path, occ_path FROM plaintexts WHERE id = ?", (pt1_id,), one=True
@@ -613,16 +881,14 @@ def get_random_sentence():
     )
     occ2_po = Path(r["occ_path"])
     s2_po = Path(r["s_path"])
-    # load the occs files from disk
-    with open(occ1_po, "rb") as f:
-        occs1 = pickle.load(f)
-    with open(occ2_po, "rb") as f:
-        occs2 = pickle.load(f)
-    # load the wv objects for both embeddings from disk
-    wv1 = WordVectors.from_file(e1_v_po)
-    wv2 = WordVectors.from_file(e2_v_po)
+    # memory-map the occurrence indices (cached after the first request)
+    occs1 = load_occurrences(occ1_po)
+    occs2 = load_occurrences(occ2_po)
+    # memory-map the sentence vectors for both embeddings (cached after the first request)
+    sv1 = load_sentence_vectors(e1_sv_po)
+    sv2 = load_sentence_vectors(e2_sv_po)
     sents = Alignment.get_random_sentence(
-        word, occs1, occs2, s1_po, s2_po, Q, wv1, wv2
+        word, occs1, occs2, s1_po, s2_po, Q, sv1, sv2, num_neighbors=num_neighbors, seed=seed
     )
     return jsonify({"message": "Example sentences retrieved", "sentences": sents}), 200
 
@@ -643,7 +909,7 @@ def get_example_sentences():
     a_id = d["id"]
     # get the alignment from the database
     a = query_db(
-        "SELECT e1_id, e2_id, q_path FROM alignments WHERE id = ?", (a_id,), one=True
+        "SELECT e1_id, e2_id, a_path FROM alignments WHERE id = ?", (a_id,), one=True
     )
     # if the provided alignment id is not in the database
     if a is None:
@@ -652,25 +918,28 @@ def get_example_sentences():
     if "word" not in d:
         return jsonify({"error": "No word provided"}), 400
     word = d["word"]
+    # greedy or optimal one-to-one pairing of the sentences
+    method = d.get("method", "greedy")
+    if method not in PAIRING_METHODS:
+        return jsonify({"error": "Invalid pairing method"}), 400
     e1_id = a["e1_id"]
     e2_id = a["e2_id"]
-    q_path = Path(a["q_path"])
+    a_path = Path(a["a_path"])
 
     # generate examples
     # load alignment from disk
-    with open(q_path, "rb") as f:
-        Q = pickle.load(f)
+    Q = load_alignment(a_path).Q
     # get wordvectors and plaintext ids associated with the specified embeddings
     pt1_d = query_db(
-        "SELECT pt_id, wv_path FROM embeddings WHERE id = ?", (e1_id,), one=True
+        "SELECT pt_id, sv_path FROM embeddings WHERE id = ?", (e1_id,), one=True
     )
     pt2_d = query_db(
-        "SELECT pt_id, wv_path FROM embeddings WHERE id = ?", (e2_id,), one=True
+        "SELECT pt_id, sv_path FROM embeddings WHERE id = ?", (e2_id,), one=True
     )
     pt1_id = pt1_d["pt_id"]
     pt2_id = pt2_d["pt_id"]
-    e1_v_po = Path(pt1_d["wv_path"])
-    e2_v_po = Path(pt2_d["wv_path"])
+    e1_sv_po = Path(pt1_d["sv_path"])
+    e2_sv_po = Path(pt2_d["sv_path"])
     # get the path to the scrubbed plaintext and occs file from the database (for pt1)
     r = query_db(
         "SELECT s_path, occ_path FROM plaintexts WHERE id = ?", (pt1_id,), one=True
@@ -683,16 +952,14 @@ def get_example_sentences():
     )
     occ2_po = Path(r["occ_path"])
     s2_po = Path(r["s_path"])
-    # load the occs files from disk
-    with open(occ1_po, "rb") as f:
-        occs1 = pickle.load(f)
-    with open(occ2_po, "rb") as f:
-        occs2 = pickle.load(f)
-    # load the wv objects for both embeddings from disk
-    wv1 = WordVectors.from_file(e1_v_po)
-    wv2 = WordVectors.from_file(e2_v_po)
+    # memory-map the occurrence indices (cached after the first request)
+    occs1 = load_occurrences(occ1_po)
+    occs2 = load_occurrences(occ2_po)
+    # memory-map the sentence vectors for both embeddings (cached after the first request)
+    sv1 = load_sentence_vectors(e1_sv_po)
+    sv2 = load_sentence_vectors(e2_sv_po)
     sents = Alignment.get_example_sentences(
-        word, occs1, occs2, s1_po, s2_po, Q, wv1, wv2
+        word, occs1, occs2, s1_po, s2_po, Q, sv1, sv2, method=method
     )
     return jsonify({"message": "Example sentences retrieved", "sentences": sents}), 200
 
@@ -736,22 +1003,27 @@ def get_context():
         n_neighbors = 10
     else:
         n_neighbors = d["neighbors"]
-    # get the common words for the alignment
-    c_path = Path(db_r["c_path"])
-    c = pickle.load(open(c_path, "rb"))
-    # get the embeddings for the alignment
-    v1_path = Path(db_r["v1_path"])
-    v1 = pickle.load(open(v1_path, "rb"))
-    v2_path = Path(db_r["v2_path"])
-    v2 = pickle.load(open(v2_path, "rb"))
-    # get the distances for the alignment
-    d_path = Path(db_r["d_path"])
-    d = pickle.load(open(d_path, "rb"))
+    # get the common words and embeddings of the alignment
+    al = load_alignment(Path(db_r["a_path"]))
+    c, v1, v2 = al.common, al.v1, al.v2
     # if we request more neighbors than there are in the alignment
     if n_neighbors > len(c):
         n_neighbors = len(c)
+    # neighbors are searched exactly in the other context, approximately only if it was indexed and the request asks for it
     try:
-        words, distances, v, iv = Alignment.get_context(c, v1, v2, d, word, first, n_neighbors)
+        approximate = parse_flag(d.get("approximate", False))
+    except ValueError:
+        return jsonify({"error": "approximate must be true or false"}), 400
+    index = None
+    if approximate:
+        index = al.index2 if first else al.index1
+    nprobe = d.get("nprobe", app.config["ANN_NPROBE"])
+    if not isinstance(nprobe, int) or nprobe < 1:
+        return jsonify({"error": "nprobe must be a positive integer"}), 400
+    try:
+        words, distances, v, iv = Alignment.get_context(
+            c, v1, v2, word, first, n_neighbors, index=index, nprobe=nprobe
+        )
     except ValueError:
         return jsonify({"error": "Word not in alignment"}), 400
     # zip words and distances into dict
@@ -774,6 +1046,58 @@ def get_context():
     )
 
 
+
+@app.route("/translateWords", methods=["POST"])
+def translate_words():
+    """
+    maps a batch of words from one context of an alignment to their nearest neighbors in the other
+    """
+    # get request json
+    d = request.get_json()
+    # check if the request has an alignment id
+    if "a_id" not in d:
+        return jsonify({"error": "No alignment id provided"}), 400
+    a_id = d["a_id"]
+    db_r = query_db("SELECT a_path FROM alignments WHERE id = ?", (a_id,), one=True)
+    if db_r is None:
+        return jsonify({"error": "Invalid alignment id"}), 400
+    # check if the request has a list of words
+    if "words" not in d or not isinstance(d["words"], list):
+        return jsonify({"error": "No list of words provided"}), 400
+    # words are translated from the first context to the second unless first is "false"
+    first = d.get("first", "true") != "false"
+    # number of translations per word
+    k = d.get("neighbors", 5)
+    if not isinstance(k, int) or k < 1:
+        return jsonify({"error": "Number of neighbors must be a positive integer"}), 400
+    metric = d.get("metric", "cosine")
+    if metric not in METRICS:
+        return jsonify({"error": "Invalid metric"}), 400
+    al = load_alignment(Path(db_r["a_path"]))
+    c, v1, v2 = al.common, al.v1, al.v2
+    src, dst = (v1, v2) if first else (v2, v1)
+    # unique words of the request that are in the alignment, in request order
+    words = [w for w in dict.fromkeys(d["words"]) if w in c]
+    missing = [w for w in dict.fromkeys(d["words"]) if w not in c]
+    translations = dict()
+    if words:
+        wva = WordVectors(words, src[c.get_ids(words)], centered=False, dtype=src.dtype)
+        wvb = WordVectors(c, dst, centered=False, dtype=dst.dtype)
+        distances, indices = mapping.perform_mapping(wva, wvb, k=k, metric=metric)
+        for w, row_i, row_d in zip(words, indices, distances):
+            translations[w] = [(c[i], float(dist)) for i, dist in zip(row_i, row_d)]
+    return (
+        jsonify(
+            {
+                "message": "Words translated",
+                "translations": translations,
+                "missing": missing,
+            }
+        ),
+        200,
+    )
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument(
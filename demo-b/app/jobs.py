@@ -0,0 +1,182 @@
+import os
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from app.database import Connections
+from app import metrics
+
+"""
+background execution of long running requests (uploads, embeddings, alignments)
+job state lives in the jobs table so any gunicorn worker can report on any job
+and the duration of every stage a job went through in the job_stages table
+"""
+
+
+def _alive(pid):
+    """
+    returns: bool - true if a process with id pid exists
+    """
+    if pid is None:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class Job:
+    """
+    handle passed to a running job so it can report its progress
+    """
+
+    def __init__(self, connections, job_id, stages, kind="job"):
+        """
+        connections: database.Connections to the sqlite db holding the jobs table
+        job_id: int - id of the job in the jobs table
+        stages: list(str) - names of the stages the job will go through, in order
+        kind: str - type of job, labels its timings
+        """
+        self.connections = connections
+        self.id = job_id
+        self.stages = list(stages)
+        self.kind = kind
+        # (name, started_at, perf_counter at start) of the stage in progress
+        self._current = None
+
+    def _update(self, **fields):
+        """
+        writes fields to this job's row in the jobs table
+        """
+        fields["updated_at"] = time.time()
+        cols = ", ".join(f"{k} = ?" for k in fields)
+        with self.connections.get() as db:
+            db.execute(f"UPDATE jobs SET {cols} WHERE id = ?", (*fields.values(), self.id))
+
+    def stage(self, name):
+        """
+        marks the start of the stage called name, and the end of the previous stage
+        """
+        self.end_stage()
+        self._current = (name, time.time(), time.perf_counter())
+        self._update(stage=name, stage_index=self.stages.index(name), progress=0.0)
+
+    def end_stage(self):
+        """
+        records how long the stage in progress took in the job_stages table, if there is one
+        """
+        if self._current is None:
+            return
+        name, started_at, start = self._current
+        self._current = None
+        seconds = time.perf_counter() - start
+        metrics.REGISTRY.observe(
+            "job_stage_seconds", seconds, help="duration of the stages of jobs", kind=self.kind, stage=name
+        )
+        with self.connections.get() as db:
+            db.execute(
+                "INSERT INTO job_stages (job_id, stage, stage_index, started_at, seconds) VALUES (?, ?, ?, ?, ?)",
+                (self.id, name, self.stages.index(name), started_at, seconds),
+            )
+
+    def progress(self, fraction):
+        """
+        records how far through the current stage the job is
+        fraction: float in [0, 1]
+        """
+        self._update(progress=min(max(float(fraction), 0.0), 1.0))
+
+
+class JobQueue:
+    """
+    runs jobs on a background thread pool, recording their status in the jobs table
+    the pool is created lazily so each (forked) gunicorn worker gets its own
+    """
+
+    def __init__(self, database, max_workers=1, scheduler=None):
+        """
+        database: path to the sqlite db holding the jobs table
+        max_workers: int - number of jobs this process runs concurrently
+        scheduler: optional resources.ResourceScheduler, jobs stay queued until they get one of its heavy job slots
+        """
+        self.database = database
+        self.connections = Connections(database)
+        self.max_workers = max_workers
+        self.scheduler = scheduler
+        self._executor = None
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="job"
+            )
+        return self._executor
+
+    def fail_interrupted(self):
+        """
+        marks the queued and running jobs of worker processes that no longer exist as failed,
+        e.g. after a gunicorn worker crashed or was restarted mid-job, so clients polling them stop waiting
+        call it when the process starts, before it submits jobs: jobs recorded under this process's own id
+        can only be left over from an earlier process that had the same id
+        returns: int - number of jobs marked as failed
+        """
+        now = time.time()
+        with self.connections.get() as db:
+            rows = db.execute("SELECT id, pid FROM jobs WHERE status IN ('queued', 'running')").fetchall()
+            interrupted = [job_id for job_id, pid in rows if pid == os.getpid() or not _alive(pid)]
+            db.executemany(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+                [("failed", "interrupted: the worker running the job exited", now, job_id) for job_id in interrupted],
+            )
+        return len(interrupted)
+
+    def submit(self, kind, stages, fn, *args, **kwargs):
+        """
+        enqueues fn(job, *args, **kwargs) to run in the background
+        kind: str - type of job, e.g. "upload"
+        stages: list(str) - names of the stages fn reports through job.stage
+        fn must return the id of the artifact it created
+        returns: int - id of the queued job
+        """
+        now = time.time()
+        with self.connections.get() as db:
+            cur = db.execute(
+                "INSERT INTO jobs (kind, status, num_stages, progress, pid, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (kind, "queued", len(stages), 0.0, os.getpid(), now, now),
+            )
+            job_id = cur.lastrowid
+        job = Job(self.connections, job_id, stages, kind)
+        self._get_executor().submit(self._run, job, fn, args, kwargs)
+        return job_id
+
+    def _run(self, job, fn, args, kwargs):
+        """
+        runs a job, recording its final status and artifact id (or error)
+        """
+        start = None
+        try:
+            with self.scheduler.heavy() if self.scheduler else nullcontext():
+                start = time.perf_counter()
+                job._update(status="running", started_at=time.time())
+                try:
+                    artifact_id = fn(job, *args, **kwargs)
+                finally:
+                    job.end_stage()
+        except Exception as e:
+            traceback.print_exc()
+            status = "failed"
+            job._update(status=status, error=str(e))
+        else:
+            status = "done"
+            job._update(status=status, progress=1.0, artifact_id=artifact_id)
+        if start is not None:
+            metrics.REGISTRY.observe(
+                "job_seconds",
+                time.perf_counter() - start,
+                help="duration of jobs, from start to finish",
+                kind=job.kind,
+                status=status,
+            )
@@ -0,0 +1,182 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+"""
+in-process metrics: latency histograms, counters and gauges, rendered in the prometheus text format
+every gunicorn worker keeps its own registry, so /metrics reports the worker that served it
+(job stage timings are also stored in the job_stages table, which every worker shares)
+"""
+
+# upper bounds (seconds) of the latency buckets, from fast queries to long jobs
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 1800, 7200)
+
+
+def _labels(labels, extra=None):
+    """
+    returns the prometheus label string of labels, e.g. {stage="align"}
+    """
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    escape = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in items) + "}"
+
+
+def _number(v):
+    return "+Inf" if v == float("inf") else repr(float(v))
+
+
+class Histogram:
+    """
+    counts of observations per bucket, with their sum
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, le in enumerate(self.buckets):
+            if value <= le:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        """
+        returns the exposition lines of the histogram, bucket counts are cumulative
+        """
+        out = []
+        total = 0
+        for le, c in zip(self.buckets, self.counts):
+            total += c
+            out.append(f"{name}_bucket{_labels(labels, ('le', _number(le)))} {total}")
+        out.append(f"{name}_sum{_labels(labels)} {_number(self.sum)}")
+        out.append(f"{name}_count{_labels(labels)} {self.count}")
+        return out
+
+
+class Registry:
+    """
+    named metrics, each a family of series told apart by their labels
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # name -> (type, help)
+        self._types = {}
+        # name -> {sorted label items -> Histogram or float}
+        self._series = {}
+
+    def _get(self, name, kind, help, labels):
+        known = self._types.setdefault(name, (kind, help))
+        if known[0] != kind:
+            raise ValueError(f"{name} is a {known[0]}, not a {kind}")
+        return self._series.setdefault(name, {}), tuple(sorted(labels.items()))
+
+    def observe(self, name, value, help="", buckets=LATENCY_BUCKETS, **labels):
+        """
+        records value in the histogram name
+        """
+        with self._lock:
+            series, key = self._get(name, "histogram", help, labels)
+            if key not in series:
+                series[key] = Histogram(buckets)
+            series[key].observe(value)
+
+    def inc(self, name, value=1, help="", **labels):
+        """
+        adds value to the counter name
+        """
+        with self._lock:
+            series, key = self._get(name, "counter", help, labels)
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name, value, help="", **labels):
+        """
+        sets the gauge name to value
+        """
+        with self._lock:
+            series, key = self._get(name, "gauge", help, labels)
+            series[key] = value
+
+    def get(self, name, **labels):
+        """
+        returns the current value of a counter or gauge (a Histogram for histograms), None if never recorded
+        """
+        with self._lock:
+            return self._series.get(name, {}).get(tuple(sorted(labels.items())))
+
+    def clear(self):
+        with self._lock:
+            self._types.clear()
+            self._series.clear()
+
+    def render(self):
+        """
+        returns: str - every metric in the prometheus text exposition format
+        """
+        out = []
+        with self._lock:
+            for name in sorted(self._types):
+                kind, help = self._types[name]
+                if help:
+                    out.append(f"# HELP {name} {help}")
+                out.append(f"# TYPE {name} {kind}")
+                for labels, value in sorted(self._series[name].items()):
+                    if kind == "histogram":
+                        out.extend(value.lines(name, labels))
+                    else:
+                        out.append(f"{name}{_labels(labels)} {_number(value)}")
+        return "\n".join(out) + "\n"
+
+
+# registry of this process
+REGISTRY = Registry()
+
+
+class Timer:
+    """
+    wall clock duration of a timed block, seconds is set when the block exits
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.seconds = None
+
+
+@contextmanager
+def timed(name, help="", registry=None, **labels):
+    """
+    observes the duration of the block in the histogram name, also when it raises
+    yields: Timer
+    """
+    t = Timer()
+    try:
+        yield t
+    finally:
+        t.seconds = time.perf_counter() - t.start
+        (registry or REGISTRY).observe(name, t.seconds, help=help, **labels)
+
+
+def stage(name, **labels):
+    """
+    times a pipeline stage (scrub, tokenize, train, align, write, ...) in pipeline_stage_seconds
+    """
+    return timed("pipeline_stage_seconds", help="duration of pipeline stages", stage=name, **labels)
+
+
+def disk_bytes(path):
+    """
+    returns the number of bytes of the file at path, or of every file under it if it is a directory
+    """
+    path = Path(path)
+    if not path.is_dir():
+        return path.stat().st_size
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
@@ -0,0 +1,66 @@
+import numpy as np
+
+
+class Vocabulary:
+    """
+    implements a compact bidirectional word <-> id mapping
+    ids are positions in a contiguous array of the words, words are looked up through a single dict
+    """
+
+    def __init__(self, words):
+        """
+        words: collection of unique strings, the ith word gets id i
+        """
+        self.tokens = np.empty(len(words), dtype=object)
+        self.tokens[:] = list(words)
+        # the array is shared with callers of get_words, so it must not change
+        self.tokens.flags.writeable = False
+        self.ids = {w: i for i, w in enumerate(self.tokens)}
+        assert len(self.ids) == len(self.tokens)
+
+    def __len__(self):
+        """returns the number of words in the vocabulary"""
+        return len(self.tokens)
+
+    def __contains__(self, word):
+        """returns true if word is in the vocabulary"""
+        return word in self.ids
+
+    def __iter__(self):
+        """iterates over the words in id order"""
+        return iter(self.tokens)
+
+    def __getitem__(self, word_id):
+        """returns the word with id word_id"""
+        return self.tokens[word_id]
+
+    def __getstate__(self):
+        """only the words are pickled, the dict is rebuilt when unpickling"""
+        return {"tokens": self.tokens.tolist()}
+
+    def __setstate__(self, state):
+        self.__init__(state["tokens"])
+
+    def get_id(self, word):
+        """returns the id of word, or None if it is not in the vocabulary"""
+        return self.ids.get(word)
+
+    def get_word(self, word_id):
+        """returns the word with id word_id, or None if there is no such id"""
+        if 0 <= word_id < len(self.tokens):
+            return self.tokens[word_id]
+        return None
+
+    def get_ids(self, words):
+        """
+        returns: int64 numpy array with the ith id belonging to the ith word
+        throws a KeyError if a word is not in the vocabulary
+        """
+        ids = self.ids
+        return np.fromiter((ids[w] for w in words), dtype=np.int64, count=len(words))
+
+    def get_words(self):
+        """
+        returns: read-only numpy array of the words in id order (not a copy)
+        """
+        return self.tokens
@@ -1,9 +1,8 @@
 import numpy as np
-from sklearn import preprocessing
 import os
-from .BiMap import BiMap
+from .Vocabulary import Vocabulary
 from pathlib import Path
-import time
+from app import metrics
 
 
 class WordVectors:
@@ -11,22 +10,30 @@ class WordVectors:
     Implements a WordVector class that performs mapping of word tokens to vectors
     """
 
-    def __init__(self, words=None, vectors=None, centered=True, normalized=False):
+    def __init__(
+        self, words=None, vectors=None, centered=True, normalized=False, dtype=np.float32
+    ):
         """
-        words: BiMap of word, id pairs
+        words: collection of words, the ith word gets id i
+        a Vocabulary (e.g. another WordVectors' words) is shared rather than rebuilt
         vectors: dimension len(words)*n numpy array containing floats
         ith row corresponds to the embedding for the ith word in words
         centered: flag controlling whether we will center the vectors on initialization
         normalized: flag controlling whether we will normalize the vectors on initializtion
+        dtype: floating point type to store the vectors as (float32 halves the memory of float64)
         """
         # input sanitization
         # we should never feed a length 0 wordvector in
         assert len(words) != 0
-        # BiMap containing word->id pairs
-        b, a = zip(*enumerate(words))
-        self.words = BiMap(a, b)
+        # Vocabulary containing word<->id pairs
+        self.words = words if isinstance(words, Vocabulary) else Vocabulary(words)
         # vectors for each word
-        self.vectors = np.array(vectors, dtype=float)
+        # they are copied once if they are about to be transformed in place, otherwise
+        # arrays of the right dtype (e.g. memory-mapped ones) are used as is
+        if centered or normalized:
+            self.vectors = np.array(vectors, dtype=dtype)
+        else:
+            self.vectors = np.asarray(vectors, dtype=dtype)
         # int containing the length of each individual vector
         self.vector_dimension = len(vectors[0])
         self.length = len(self.words)
@@ -57,24 +64,38 @@ class WordVectors:
         """
         return word in self.words
 
+    def _writeable_vectors(self):
+        """
+        returns self.vectors, first copying them into memory if they are read-only (memory-mapped)
+        """
+        if not self.vectors.flags.writeable:
+            self.vectors = np.array(self.vectors)
+        return self.vectors
+
     def center(self):
         """
-        centers word vectors so they have 0 mean
+        centers word vectors so they have 0 mean, in place
         """
-        self.vectors = self.vectors - self.vectors.mean(axis=0, keepdims=True)
+        vectors = self._writeable_vectors()
+        vectors -= vectors.mean(axis=0, keepdims=True)
 
     def normalize(self):
         """
-        normalizes all word vectors (l2 norm)
+        normalizes all word vectors (l2 norm), in place
         mutates the current wordvectors object O(len(self)*self.get_vector_dimension())
         """
-        self.vectors = preprocessing.normalize(self.vectors, norm="l2")
+        vectors = self._writeable_vectors()
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        # leave zero vectors as they are
+        norms[norms == 0] = 1
+        vectors /= norms
 
     def get_words(self):
         """
-        returns the list of words contained in this wordvectors object
+        returns the words contained in this wordvectors object, in id order
+        as a read-only numpy array shared with the vocabulary (not a copy)
         """
-        return list(self.words.keys())
+        return self.words.get_words()
 
     def vectors_for_words(self, input_words):
         """
@@ -83,17 +104,13 @@ class WordVectors:
         where the ith row corresponds to the vector
         for the ith word in input_words
         """
-        indices = []
-        for word in input_words:
-            indices.append(self.words.get_value(word))
-        # todo test my use of np take
-        return np.take(self.vectors, indices, axis=0)
+        return self.vectors[self.get_ids(input_words)]
 
     def get_vector(self, input_word):
         """
         get the 1*self.vector_dimension vector associated with input_word
         """
-        return self.vectors[self.words.get_value(input_word)]
+        return self.vectors[self.words.get_id(input_word)]
 
     def get_count(self, word):
         """
@@ -105,13 +122,20 @@ class WordVectors:
         """
         get the word associated with a particular word id
         """
-        return self.words.get_key(word_id)
+        return self.words.get_word(word_id)
 
     def get_id(self, input_word):
         """
         get the id associated with an input word
         """
-        return self.words.get_value(input_word)
+        return self.words.get_id(input_word)
+
+    def get_ids(self, input_words):
+        """
+        get the ids associated with a collection of input words
+        returns: int64 numpy array with the ith id belonging to the ith word
+        """
+        return self.words.get_ids(input_words)
 
     def get_vector_dimension(self):
         """
@@ -121,7 +145,21 @@ class WordVectors:
 
     def to_file(self, path):
         """
-        write a WordVectors object to a text file
+        write a WordVectors object to disk in binary form
+        path: pathlib path object to the directory we want to write to
+        the directory holds vocab.txt (one word per line, in id order)
+        and vectors.npy (the raw vector matrix)
+        will create intermediate directories in the input path if they do not exist
+        will overwrite if there already exists a WordVectors object at path
+        """
+        path.mkdir(parents=True, exist_ok=True)
+        with (path / "vocab.txt").open("w") as fout:
+            fout.write("\n".join(self.get_words()))
+        np.save(path / "vectors.npy", self.vectors)
+
+    def to_text_file(self, path):
+        """
+        write a WordVectors object to a text file (one word and its vector per line)
         path: pathlib path object to path we want to write to
         will create intermediate directories in the input path if they do not exist
         will overwrite if there already exists file at path
@@ -138,10 +176,30 @@ class WordVectors:
             fout.write("\n".join(lines))
 
     @staticmethod
-    def from_file(path):
+    def from_file(path, mmap=False, dtype=np.float32):
+        """
+        read a WordVectors object from disk
+        path: pathlib path object to a directory written by to_file,
+        or to a text file written by to_text_file (or in word2vec text format)
+        mmap: if True the vectors of a binary WordVectors object are memory-mapped
+        rather than read into memory (if they were stored as dtype)
+        dtype: floating point type of the returned vectors
+        returns: WordVectors object, or throws an OSError if the file is not found
+        """
+        if not path.is_dir():
+            return WordVectors.from_text_file(path, dtype=dtype)
+        words = (path / "vocab.txt").read_text().split("\n")
+        vectors = np.load(path / "vectors.npy", mmap_mode="r" if mmap else None)
+        # the stored vectors were already centered (or not) when they were written
+        return WordVectors(words, vectors, centered=False, dtype=dtype)
+
+    @staticmethod
+    def from_text_file(path, dtype=np.float32):
         """
         read a WordVectors object from a text file
         path: pathlib path object to path
+        dtype: floating point type of the returned vectors
+        accepts files with or without a word2vec "<count> <dimension>" header line
         returns: WordVectors object, or throws an OSError if the file is not found
         """
         # open the file if it exists
@@ -150,14 +208,17 @@ class WordVectors:
             def process_line(line):
                 line_list = line.rstrip().split(" ")
                 w = line_list[0]
-                v = np.array(line_list[1:], dtype=float)
+                v = np.array(line_list[1:], dtype=dtype)
                 return w, v
 
-            # skip the first line containing dimensions
-            fin.readline()
-            data = map(process_line, fin.readlines())
+            lines = fin.readlines()
+            # skip the first line if it contains dimensions
+            header = lines[0].split() if lines else []
+            if len(header) == 2 and all(x.isdigit() for x in header):
+                lines = lines[1:]
+            data = map(process_line, lines)
             words, vectors = zip(*data)
-            return WordVectors(words, vectors)
+            return WordVectors(words, vectors, dtype=dtype)
 
     @staticmethod
     def same_vector_dimension(*args):
@@ -173,30 +234,51 @@ class WordVectors:
         return True
 
     @staticmethod
-    def union(*args, f=lambda x: sum(x) / len(x)):
+    def union(*args, f=None):
         """
         Performs union of two or more word vectors
         returns a new WordVectors object or None if no WordVectors objects were passed in
         *args: some number of WordVectors objects to union
-        f: function of n numpy vectors of equal dimension
-        (defaults to average)
+        f: function of n numpy vectors of equal dimension (an n x d array)
+        (defaults to average, which is computed for all words at once)
         this function is used to combine the vectors of words in the union
+        words are ordered by their first appearance in args
         """
         if len(args) == 0:
             return None
         # error check; every WordVectors object should have the same vector_dim
         assert WordVectors.same_vector_dimension(*args)
-        # compute the union of the words
-        union_words = set.union(*(set(wv.get_words()) for wv in args))
-        # allocate space for each word in the union
-        vectors = np.zeros(
-            (len(union_words), args[0].get_vector_dimension()), dtype=float
-        )
-        # union the vectors for each word
-        for i, word in enumerate(union_words):
-            vecs = np.array([wv[word] for wv in args if word in wv])
-            vectors[i] = f(vecs)  # Combine vectors
-        return WordVectors(union_words, vectors)
+        # position of each word in the union, in order of first appearance
+        union_index = dict()
+        for wv in args:
+            for w in wv.get_words():
+                union_index.setdefault(w, len(union_index))
+        union_words = list(union_index)
+        # positions[k][i] is the position in the union of the ith word of args[k]
+        positions = [
+            np.fromiter((union_index[w] for w in wv.get_words()), dtype=np.int64, count=len(wv))
+            for wv in args
+        ]
+        dtype = args[0].vectors.dtype
+        shape = (len(union_words), args[0].get_vector_dimension())
+        if f is None:
+            # average, words appear at most once per input so the scattered adds don't collide
+            vectors = np.zeros(shape, dtype=dtype)
+            counts = np.zeros(len(union_words), dtype=dtype)
+            for wv, pos in zip(args, positions):
+                vectors[pos] += wv.vectors
+                counts[pos] += 1
+            vectors /= counts[:, None]
+        else:
+            # row of each union word in each input, -1 if the input doesn't contain it
+            rows = np.full((len(args), len(union_words)), -1, dtype=np.int64)
+            for k, pos in enumerate(positions):
+                rows[k, pos] = np.arange(len(pos))
+            vectors = np.zeros(shape, dtype=dtype)
+            for i in range(len(union_words)):
+                vecs = np.array([args[k].vectors[r] for k, r in enumerate(rows[:, i]) if r >= 0])
+                vectors[i] = f(vecs)  # Combine vectors
+        return WordVectors._centered(union_words, vectors)
 
     @staticmethod
     def intersect(*args):
@@ -205,10 +287,8 @@ class WordVectors:
         returns: a list of WordVectors objects
         the ith WordVector object in the output list is the a copy of the ith WordVectors
         object in the input list with the words not in the the overall intersection removed
-        the order of the words in each output vector is the same
+        the order of the words in each output vector is the same (the order of the first input)
         """
-        # time how long it takes
-        start = time.time()
         # check we have at least one argument
         if len(args) == 0:
             return None
@@ -217,13 +297,22 @@ class WordVectors:
             if args[0].get_vector_dimension() != arg.get_vector_dimension():
                 raise ValueError("All arguments must have the same vector_dimension")
 
-        common_words = set.intersection(*[set(wv.get_words()) for wv in args])
-        # Get intersecting words following the order of first WordVector
-        wv0_order = [w for w in args[0].get_words() if w in common_words]
-        # Retrieve vectors from a and b for intersecting words
-        wv_out = list()  # list of output WordVectors
-        for wv in args:
-            vectors = np.array([wv.get_vector(w) for w in wv0_order])
-            wv_out.append(WordVectors(wv0_order, vectors))
-        end = time.time()
-        return wv_out
+        with metrics.stage("intersect"):
+            # Get intersecting words following the order of first WordVector
+            common = Vocabulary(
+                [w for w in args[0].get_words() if all(w in wv.words for wv in args[1:])]
+            )
+            # Gather the rows of the intersecting words from each input in one go
+            # the outputs share one vocabulary
+            return [WordVectors._centered(common, wv.vectors[wv.get_ids(common)]) for wv in args]
+
+    @staticmethod
+    def _centered(words, vectors):
+        """
+        returns a centered WordVectors object that owns vectors, a freshly allocated array
+        centering happens in place, so unlike the constructor this does not copy vectors
+        """
+        wv = WordVectors(words, vectors, centered=False, dtype=vectors.dtype)
+        wv.center()
+        wv.centered = True
+        return wv
@@ -1,30 +1,68 @@
-from multiprocessing import Pool
+import numpy as np
 from gensim.models.word2vec import LineSentence
 from gensim.models import Word2Vec
 from app.preprocessing.WordVectors import WordVectors
+from app.resources import available_cpus
+from app import metrics
+
 
 def w2v_embed(
-    file_in, size=100, window=5, min_count=5, wv_workers=48
+    file_in,
+    size=100,
+    window=5,
+    min_count=5,
+    wv_workers=None,
+    dtype=np.float32,
+    epochs=5,
+    negative=5,
+    sample=1e-3,
+    corpus_file=True,
 ):
     """
     generate Word2Vec embedding for sentences with given parameters.
     file in contains preprocessed sentences; one per line
+    wv_workers: number of training threads, defaults to the number of cpus available to this process
+    dtype: floating point type of the returned vectors
+    epochs, negative, sample: passed through to gensim
+    corpus_file: if True gensim reads file_in itself, with every worker thread reading its own part of the file
+    otherwise sentences are fed to the workers by a single python iterator, which caps throughput at a few cores
     """
+    if wv_workers is None:
+        wv_workers = available_cpus()
     print("generating Word2Vec embedding")
     # print settings
     print("size:", size)
     print("window:", window)
     print("min_count:", min_count)
-    with file_in.open() as f:
-        sentences = LineSentence(f)
-        model = Word2Vec(
-            sentences,
-            vector_size=size,
-            window=window,
-            min_count=min_count,
-            workers=wv_workers
+    print("workers:", wv_workers)
+    print("epochs:", epochs, "negative:", negative, "sample:", sample)
+    settings = dict(
+        vector_size=size,
+        window=window,
+        min_count=min_count,
+        workers=wv_workers,
+        epochs=epochs,
+        negative=negative,
+        sample=sample,
+    )
+    with metrics.stage("train") as t:
+        if corpus_file:
+            model = Word2Vec(corpus_file=str(file_in), **settings)
+        else:
+            with file_in.open() as f:
+                model = Word2Vec(LineSentence(f), **settings)
+    elapsed = t.seconds
+    # words/sec over every epoch, including vocabulary building
+    words_per_sec = model.corpus_total_words * epochs / max(elapsed, 1e-9)
+    print(
+        "trained on {} words x {} epochs in {:.2f}s ({:.0f} words/sec, {})".format(
+            model.corpus_total_words,
+            epochs,
+            elapsed,
+            words_per_sec,
+            "corpus_file" if corpus_file else "iterator",
         )
-        # create a WordVectors object from the model
-        wv = WordVectors(model.wv.index_to_key, vectors=model.wv.vectors)
-        return wv
-
+    )
+    # create a WordVectors object from the model
+    wv = WordVectors(model.wv.index_to_key, vectors=model.wv.vectors, dtype=dtype)
+    return wv
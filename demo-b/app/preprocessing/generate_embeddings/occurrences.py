@@ -1,6 +1,9 @@
 import numpy as np
-from multiprocessing import Pool
+from array import array
 import nltk
+from app.preprocessing.line_index import read_lines
+from app import metrics
+from app.resources import worker_pool
 
 
 def tok_w_i(il):
@@ -11,60 +14,132 @@ def tok_w_i(il):
     return (il[0], nltk.word_tokenize(il[1]))
 
 
-def get_occurrences(file_in, limit=2000, workers=48):
+class OccurrenceIndex:
     """
-    file_in: path object pointing to the plaintext
-    limit: int - maximum number of lines to record as containing the word of interest
-    returns: dict(str: set(int)) - dictionary of which lines contain which words
+    compact index of which lines contain which words
+    postings are stored CSR-style: the lines containing the ith word of vocab
+    are lines[offsets[i]:offsets[i + 1]], sorted ascending
+    on disk the index is a directory holding vocab.txt, offsets.npy and lines.npy
+    which is memory-mapped on load, so looking up a word only touches that word's postings
     """
-    # read in the lines
-    occurrences = dict()
-    with file_in.open() as f:
-        with Pool(workers) as p:
-            for i, line in p.map(tok_w_i, enumerate(f)):
-                for tok in line:
-                    if tok not in occurrences:
-                        occurrences[tok] = set()
-                    if len(occurrences[tok]) < limit:
-                        occurrences[tok].add(i)
-    return occurrences
 
+    def __init__(self, vocab, offsets, lines):
+        """
+        vocab: list(str) - indexed words
+        offsets: int64 numpy array of length len(vocab) + 1
+        lines: int32 numpy array of line ids
+        """
+        assert len(offsets) == len(vocab) + 1
+        self.vocab = vocab
+        self.word_ids = {w: i for i, w in enumerate(vocab)}
+        self.offsets = offsets
+        self.lines = lines
+
+    def __len__(self):
+        """returns the number of indexed words"""
+        return len(self.vocab)
+
+    def __contains__(self, word):
+        """true if word occurs in the indexed file"""
+        return word in self.word_ids
+
+    def __getitem__(self, word):
+        """
+        returns the sorted int32 array of line ids containing word
+        raises KeyError if word is not in the index
+        """
+        i = self.word_ids[word]
+        return self.lines[self.offsets[i] : self.offsets[i + 1]]
+
+    def write(self, path):
+        """
+        writes the index to the directory at path, creating it if it doesn't exist
+        path: pathlib path object
+        """
+        path.mkdir(parents=True, exist_ok=True)
+        with (path / "vocab.txt").open("w") as f:
+            f.write("\n".join(self.vocab))
+        np.save(path / "offsets.npy", self.offsets)
+        np.save(path / "lines.npy", self.lines)
+
+    @staticmethod
+    def load(path, mmap=True):
+        """
+        reads an index written by OccurrenceIndex.write
+        path: pathlib path object to the index directory
+        mmap: if True the postings are memory-mapped instead of read into memory
+        """
+        mode = "r" if mmap else None
+        vocab = (path / "vocab.txt").read_text().split("\n")
+        offsets = np.load(path / "offsets.npy", mmap_mode=mode)
+        lines = np.load(path / "lines.npy", mmap_mode=mode)
+        if len(offsets) == 1:
+            # empty index, the vocab file holds no words
+            vocab = []
+        return OccurrenceIndex(vocab, offsets, lines)
 
 
-def _embed_line(line, wv, c, vectors):
+class OccurrenceIndexBuilder:
     """
-    embeds a line in the corpus by adding the vector representations of its words
-    line: list(str) - list of words
-    wv1: WordVectors - word vectors to use
-    returns: none, mutates input array vectors
+    streams (line id, tokens) pairs into an OccurrenceIndex
+    only the first limit lines containing each word are kept,
+    so memory is bounded by the vocabulary size times limit
     """
-    for word in nltk.word_tokenize(line):
-        if word in wv:
-            vectors[c] += wv[word]
 
+    def __init__(self, limit=2000):
+        """
+        limit: int - maximum number of lines to record as containing each word
+        """
+        self.limit = limit
+        self.word_ids = dict()
+        self.counts = []
+        # (word id, line id) postings in the order they were added
+        self._words = array("i")
+        self._lines = array("i")
 
-def embed_lines(file_in, line_ind, wv):
+    def add(self, line_id, tokens):
+        """
+        records that the line line_id contains tokens
+        lines must be added in ascending order of line_id
+        """
+        for tok in set(tokens):
+            w = self.word_ids.get(tok)
+            if w is None:
+                w = self.word_ids[tok] = len(self.counts)
+                self.counts.append(0)
+            if self.counts[w] < self.limit:
+                self.counts[w] += 1
+                self._words.append(w)
+                self._lines.append(line_id)
+
+    def build(self):
+        """
+        returns: OccurrenceIndex containing every line added so far
+        """
+        words = np.frombuffer(self._words, dtype=np.int32)
+        lines = np.frombuffer(self._lines, dtype=np.int32)
+        # lines were added in ascending order so a stable sort by word keeps each posting list sorted
+        order = np.argsort(words, kind="stable")
+        offsets = np.zeros(len(self.counts) + 1, dtype=np.int64)
+        np.cumsum(self.counts, out=offsets[1:])
+        return OccurrenceIndex(list(self.word_ids), offsets, lines[order])
+
+
+def get_occurrences(file_in, limit=2000, workers=None, chunksize=10000, pool=None):
     """
-    embeds lines in the corpus by adding the vector representations of their words
-    file_in: Path obj file in
-    line_ind: set of indices of the lines in file_in we should embed
-    wv1: WordVectors - word vectors to use
-    returns:
-    indices: list(int) - list of indices of lines in the original file
-    vectors: list of embedded sentences
-    the i'th line in vectors is the indices[i]th line in the original file
+    file_in: path object pointing to the plaintext
+    limit: int - maximum number of lines to record as containing the word of interest
+    streams the file through the pool in chunks rather than reading it all at once
+    workers: number of processes, defaults to the cpus available to this process
+    pool: optional multiprocessing Pool to run on (e.g. a ResourceScheduler's), workers is ignored if given
+    returns: OccurrenceIndex - index of which lines contain which words
     """
-    # pre-allocate np array
-    indices = np.zeros(len(line_ind))
-    vectors = np.zeros((len(line_ind), wv.get_vector_dimension()), dtype=float)
-    c = 0
-    with file_in.open() as f:
-        for i, line in enumerate(f):
-            if i in line_ind:
-                _embed_line(line, wv, c, vectors)
-                indices[c] = i
-                c += 1
-    return indices, vectors
+    builder = OccurrenceIndexBuilder(limit)
+    with metrics.stage("occurrences"), file_in.open() as f:
+        with worker_pool(pool, workers) as p:
+            for i, line in p.imap(tok_w_i, enumerate(f), chunksize=chunksize):
+                builder.add(i, line)
+    return builder.build()
 
 
 def line_from_file(file, line_index):
@@ -74,21 +149,15 @@ def line_from_file(file, line_index):
     line_index: int - line number to return
     returns: str - line
     """
-    with file.open() as f:
-        for i, line in enumerate(f):
-            if i == line_index:
-                return line
+    return lines_from_file(file, [line_index])[0]
+
+
 def lines_from_file(f_p, line_indices):
     """
     returns the lines specified by line_indices from the file pointed to by f_p
+    uses the file's byte-offset index, so only the requested lines are read
     f_p: path object
-    line_indices: list of indices to return, ascending order
+    line_indices: list of indices to return, in any order
+    returns: list(str) - the lines in the order of line_indices
     """
-    # todo this function is broken
-    lines = [""] * len(line_indices)
-    with f_p.open() as f:
-        for i, line in enumerate(f):
-            if i in line_indices:
-                l = line_indices.index(i)
-                lines[l] = line
-    return lines
+    return read_lines(f_p, line_indices)
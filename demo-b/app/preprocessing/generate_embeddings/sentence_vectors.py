@@ -0,0 +1,37 @@
+import numpy as np
+
+"""
+precomputed sentence embeddings of a tokenized plaintext under a particular embedding
+row i is the sum of the word vectors of the tokens on line i of the tokenized file
+(which is also line i of the scrubbed file), words missing from the embedding are skipped
+rows are computed from the token-id corpus (see token_corpus) as sparse sentence x vocab products
+on disk the matrix is a single .npy file which is memory-mapped on load
+"""
+
+
+def build(corpus, wv, path, chunksize=100000):
+    """
+    computes the sentence vectors of every line of a tokenized plaintext and writes them to path
+    corpus: TokenCorpus - the tokenized plaintext encoded as token ids
+    wv: WordVectors - embedding trained on the plaintext
+    path: Path object to the .npy file to write
+    chunksize: int - number of lines embedded at once, bounds the memory used
+    """
+    # columns of the sentence x vocab count matrices are the embedding's word ids
+    remap = corpus.vocab_map(wv.words)
+    out = np.lib.format.open_memmap(
+        path, mode="w+", dtype=wv.vectors.dtype, shape=(len(corpus), wv.get_vector_dimension())
+    )
+    for start in range(0, len(corpus), chunksize):
+        counts = corpus.sentence_matrix(remap, len(wv), start, start + chunksize)
+        out[start : start + counts.shape[0]] = counts @ wv.vectors
+    out.flush()
+    del out
+
+
+def load(path):
+    """
+    memory-maps the sentence vectors stored at path
+    returns: (number of lines) x (vector dimension) numpy array
+    """
+    return np.load(path, mmap_mode="r")
@@ -1,90 +1,211 @@
-from time import time
-from sklearn.metrics.pairwise import cosine_similarity
+import json
+import os
+import shutil
+import uuid
 import numpy as np
 from app.preprocessing.WordVectors import WordVectors
+from app.preprocessing.Vocabulary import Vocabulary
+from app.preprocessing.neighbors import top_k
+from app.preprocessing.ivf import DEFAULT_NPROBE, IVFIndex
 import app.preprocessing.generate_embeddings.occurrences as occ
-from .global_align import GlobalAlignConfig
-from .noise_aware_align import NoiseAwareAlignConfig
-from .s4_align import S4AlignConfig
+import app.preprocessing.generate_examples.pairing as pairing
 from pathlib import Path
+from app import metrics
 from sklearn.metrics.pairwise import paired_cosine_distances
-from sklearn.metrics import pairwise_distances
 
+# version of the on-disk alignment bundle layout, see Alignment.write
+BUNDLE_FORMAT = 1
+
+
+def _fsync_tree(path):
+    """
+    flushes every file under the directory path, and the directories themselves, to disk
+    """
+    for root, _, files in os.walk(path):
+        for name in files:
+            with open(os.path.join(root, name), "rb") as f:
+                os.fsync(f.fileno())
+        _fsync_dir(root)
+
+
+def _fsync_dir(path):
+    """flushes the entries of the directory path to disk"""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
 
 
 class Alignment:
-    def __init__(self, common, v1, v2, shifts, dists, Q):
+    def __init__(self, common, v1, v2, shifts, Q, index1=None, index2=None, ranking=None):
         """
         creates an alignment object
-        :param common: list of common words
+        :param common: Vocabulary of the common words
         :param v1: word vectors 1
         :param v2: word vectors 2
         :param shifts: list of shifts
-        :param dists: list of distances
+        :param Q: rotation matrix aligning the first embedding to the second
+        :param index1, index2: optional IVFIndex over v1 and v2 for approximate neighbor queries
+        :param ranking: ids of the common words from most to least shifted, computed from shifts if not given
         """
         self.common = common
         self.v1 = v1
         self.v2 = v2
         self.shifts = shifts
-        self.dists = dists
         self.Q = Q
+        self.index1 = index1
+        self.index2 = index2
+        if ranking is None:
+            ranking = Alignment.rank_shifts(shifts)
+        self.ranking = ranking
+
     @staticmethod
-    def top_shifted_words(common, shifts, num_words=10):
-        """
-        returns the top num_words shifted words in the alignment
-        """
-        # error check inputs
-        if len(common) != len(shifts):
-            raise ValueError("common and shifts must be the same length")
-        # if num words is the wrong type
-        if not isinstance(num_words, int):
-            raise TypeError("num_words must be an integer")
-        if num_words < 0:
-            raise ValueError("num_words must be greater than 0")
-        if num_words == 0:
-            return []
-
-        # get the top shifted words
-        num_words = min(num_words, len(shifts)-1)
-        indices = np.argpartition(shifts, -1*num_words)[-1*num_words:]
-        top_shifted_words = [(common[i], shifts[i]) for i in indices]
-        top_shifted_words.sort(key=lambda x: x[1], reverse=True)
-        return top_shifted_words
+    def rank_shifts(shifts):
+        """
+        returns: int64 numpy array of word ids from most to least shifted, ties in id order
+        """
+        return np.argsort(-np.asarray(shifts), kind="stable").astype(np.int64)
+
+    def shifted_words(self, offset=0, limit=10, most=True):
+        """
+        returns a page of the words ranked by shift, as a list of (word, shift)
+        offset: number of words of the ranking to skip
+        limit: maximum number of words returned
+        most: if True the ranking starts at the most shifted word, otherwise at the least shifted
+        only the requested slice of the stored ranking is read
+        """
+        if not isinstance(offset, int) or not isinstance(limit, int):
+            raise TypeError("offset and limit must be integers")
+        if offset < 0 or limit < 0:
+            raise ValueError("offset and limit must not be negative")
+        n = len(self.ranking)
+        if most:
+            ids = self.ranking[offset : offset + limit]
+        else:
+            end = max(n - offset, 0)
+            ids = self.ranking[max(end - limit, 0) : end][::-1]
+        return [(self.common[i], float(self.shifts[i])) for i in ids]
+
+    def build_indices(self, **kwargs):
+        """
+        builds approximate neighbor indices over both aligned embeddings
+        kwargs are passed on to IVFIndex.build
+        """
+        self.index1 = IVFIndex.build(self.v1, **kwargs)
+        self.index2 = IVFIndex.build(self.v2, **kwargs)
+
+    def write(self, path):
+        """
+        writes the alignment to a bundle directory at path, which must not exist
+        the bundle holds meta.json, vocab.txt (one common word per line, in id order),
+        v1.npy, v2.npy, shifts.npy, ranking.npy, Q.npy and, if they were built, the indices ann1 and ann2
+        it is written to a temporary directory beside path and renamed into place,
+        so path either holds a complete alignment or doesn't exist
+        path: pathlib path object
+        """
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+        tmp.mkdir()
+        try:
+            with (tmp / "vocab.txt").open("w") as f:
+                f.write("\n".join(self.common))
+            np.save(tmp / "v1.npy", self.v1)
+            np.save(tmp / "v2.npy", self.v2)
+            np.save(tmp / "shifts.npy", self.shifts)
+            np.save(tmp / "ranking.npy", self.ranking)
+            np.save(tmp / "Q.npy", self.Q)
+            if self.index1 is not None:
+                self.index1.write(tmp / "ann1")
+                self.index2.write(tmp / "ann2")
+            meta = {
+                "format": BUNDLE_FORMAT,
+                "words": len(self.common),
+                "dim": int(self.v1.shape[1]),
+                "dtype": str(self.v1.dtype),
+                "ann": self.index1 is not None,
+            }
+            with (tmp / "meta.json").open("w") as f:
+                json.dump(meta, f)
+            _fsync_tree(tmp)
+            os.rename(tmp, path)
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        _fsync_dir(path.parent)
+
+    @staticmethod
+    def load(path, mmap=True):
+        """
+        reads an alignment bundle written by Alignment.write
+        path: pathlib path object to the bundle directory
+        mmap: if True the arrays are memory-mapped, so only the pages a query reads are loaded
+        """
+        with (path / "meta.json").open() as f:
+            meta = json.load(f)
+        if meta["format"] != BUNDLE_FORMAT:
+            raise ValueError(f"unsupported alignment bundle format {meta['format']}")
+        words = (path / "vocab.txt").read_text().split("\n") if meta["words"] else []
+        mode = "r" if mmap else None
+        index1, index2 = None, None
+        # bundles written before the ranking was stored rank their shifts on load
+        ranking = None
+        if (path / "ranking.npy").exists():
+            ranking = np.load(path / "ranking.npy", mmap_mode=mode)
+        if meta["ann"]:
+            index1 = IVFIndex.load(path / "ann1")
+            index2 = IVFIndex.load(path / "ann2")
+        return Alignment(
+            Vocabulary(words),
+            np.load(path / "v1.npy", mmap_mode=mode),
+            np.load(path / "v2.npy", mmap_mode=mode),
+            np.load(path / "shifts.npy", mmap_mode=mode),
+            np.load(path / "Q.npy", mmap_mode=mode),
+            index1,
+            index2,
+            ranking,
+        )
+
     @staticmethod
-    def get_context(common, v1, v2, dists, target, first, num_neighbors = 10):
+    def get_context(common, v1, v2, target, first, num_neighbors = 10, index=None, nprobe=DEFAULT_NPROBE):
         """
         get the nearest neighbors of the target word in the adjacent context
+        euclidean distances from the target are computed on demand in bounded blocks (see neighbors.top_k)
+        index: optional IVFIndex over the adjacent context's vectors, searched approximately with nprobe lists
         """
-        # this is bad o(n) in the number of words in the intersection
-        # but fixing will require ds refactor
-        # todo
-        wi = common.index(target)
+        wi = common.get_id(target)
+        if wi is None:
+            raise ValueError(f"{target} is not in the alignment")
         # get the nearest neighbors
         if first:
             # target word is in the first context
             # find nearest neighbors in the second context
-            indices = np.argpartition(dists[wi, :], num_neighbors)[:num_neighbors]
-            r = [(common[i], dists[wi, i], v2[i]) for i in indices]
             iv = v1[wi]
+            nv = v2
         else:
             # target word is in the second context
             # find nearest neighbors in the first context
-            indices = np.argpartition(dists[:, wi], num_neighbors)[:num_neighbors]
-            r = [(common[i], dists[i, wi], v1[i]) for i in indices]
             iv = v2[wi]
-        r.sort(key=lambda x: x[1])
+            nv = v1
+        with metrics.stage("dists", query="context", search="exact" if index is None else "ivf"):
+            if index is None:
+                indices, dists = top_k(iv, nv, num_neighbors, metric="euclidean")
+            else:
+                indices, dists = index.search(nv, iv, num_neighbors, nprobe=nprobe)
+        r = [(common[i], float(d), nv[i]) for i, d in zip(indices[0], dists[0])]
         # return unzipped r
         words, distances, vectors = zip(*r)
         return words, distances, vectors, iv
 
     @staticmethod
-    def from_wv_and_config(wv1, wv2, atype, config_dict):
+    def from_wv_and_config(wv1, wv2, atype, config_dict, dtype=np.float32):
         """
         generates an alignment object from wv1 and wv2
         assumes the embeddings have already been intersected
         wv1: WordVectors object
         wv2: WordVectors object
         config_dict: dict() of the config for the alignment
+        dtype: floating point type of the aligned vectors, shifts and Q
         """
         # print the atype and config_dict
         print("atype:", atype)
@@ -93,16 +214,16 @@ class Alignment:
         cfg_obj = Alignment.config_from_dict(atype, config_dict)
         # intersect wv1, wv2
         wv1, wv2 = WordVectors.intersect(wv1, wv2)
-        wv1_aligned, _, Q = cfg_obj.align(wv1, wv2)
+        with metrics.stage("align", method=atype):
+            wv1_aligned, _, Q = cfg_obj.align(wv1, wv2)
         # vectors for each word
-        v1 = wv1_aligned.vectors
-        v2 = wv2.vectors
+        v1 = wv1_aligned.vectors.astype(dtype, copy=False)
+        v2 = wv2.vectors.astype(dtype, copy=False)
 
-        common = wv1.get_words()
+        common = wv1.words
         # semantic shift for each word
-        shifts = Alignment.compute_shifts(v1, v2)
-        dists = Alignment.compute_dists(v1, v2)
-        return Alignment(common, v1, v2, shifts, dists, Q)
+        shifts = Alignment.compute_shifts(v1, v2).astype(dtype, copy=False)
+        return Alignment(common, v1, v2, shifts, np.asarray(Q, dtype=dtype))
 
     @staticmethod
     def config_from_dict(atype, args):
@@ -111,11 +232,18 @@ class Alignment:
         config_json: dict() of the alignment configuration
         returns: AlignmentConfig object
         """
+        # backends are imported on demand, s4 pulls in tensorflow
         if atype == "s4":
+            from .s4_align import S4AlignConfig
+
             return S4AlignConfig(**args)
         elif atype == "global":
+            from .global_align import GlobalAlignConfig
+
             return GlobalAlignConfig(**args)
         elif atype == "noise-aware":
+            from .noise_aware_align import NoiseAwareAlignConfig
+
             return NoiseAwareAlignConfig(**args)
         else:
             raise ValueError("Unknown alignment type encountered in config")
@@ -127,82 +255,55 @@ class Alignment:
         """
         # compute row-wise cosine similarity
         # time how long it takes
+        with metrics.stage("shifts") as t:
+            cosDist = True
+            if not cosDist:
+                # cos sim
+                r = paired_cosine_distances(wv1, wv2) * -1 + 1
+            else:
+                r = paired_cosine_distances(wv1, wv2)
         if verbose:
-            start = time()
-        cosDist = True
-        if not cosDist:
-            # cos sim
-            r = paired_cosine_distances(wv1, wv2) * -1 + 1
-        else:
-            r = paired_cosine_distances(wv1, wv2)
-        if verbose:
-            end = time()
-            print("Computing shifts took {} seconds".format(end - start))
+            print("Computing shifts took {} seconds".format(t.seconds))
         return r
 
     @staticmethod
-    def compute_dists(v1, v2, verbose=False):
-        """
-        computes the distance between each word vector in the two examples
+    def get_example_sentences(target, occ1, occ2, spt_path1, spt_path2, Q, sv1, sv2, max_sent=1000, method="greedy"):
         """
-        if verbose:
-            # time how long it takes
-            start = time()
-        # compute pairwise euclidean distance
-        dists = pairwise_distances(v1, v2, metric="euclidean")
-        if verbose:
-            end = time()
-            print("Computing pairwise distances took {} seconds".format(end - start))
-        return dists
-    @staticmethod
-    def get_example_sentences(target, occ1, occ2, spt_path1, spt_path2, Q, wv1, wv2, max_sent=1000):
-        """
-        gets a pair of example sentences
+        gets pairs of example sentences, one from each plaintext, using the target most differently
         target: word to find example sentences for
         occ1: dictionary containing the number of times each word occurs in each line of pt1
         occ2: dictionary containing the number of times each word occurs in each line of pt2
         spt_path1: path object to the scrubbed plaintext 1
         spt_path2: path object to the scrubbed plaintext 2
         Q: rotation matrix of the associated alignment
-        wv1: WordVectors to embed the sentences from pt1 with
-        wv2: WordVectors to embed the sentences from pt2 with
+        sv1: sentence vectors of pt1 (see sentence_vectors), row i embeds line i
+        sv2: sentence vectors of pt2
         max_sent: the maximum number of sentences to return
+        method: "greedy" or "optimal" one-to-one pairing of the sentences (see pairing)
+        returns: list of (sentence 1, sentence 2), least similar pair first
         """
         i1 = occ1[target]
         i2 = occ2[target]
-        indices1, s1te = occ.embed_lines(spt_path1, i1, wv1)
-        indices2, s2te = occ.embed_lines(spt_path2, i2, wv2)
+        # the sentences were embedded ahead of time, gather the rows containing the target
+        indices1 = np.asarray(i1, dtype=np.int64)
+        indices2 = np.asarray(i2, dtype=np.int64)
+        s1te = sv1[indices1]
+        s2te = sv2[indices2]
         # align embedded sentences using Q
         s1tea = np.matmul(s1te, Q)
-        max_sent = min(max_sent, len(indices1), len(indices2))
-        indices = np.argpartition(
-            cosine_similarity(s1tea, s2te),
-            max_sent,
-            axis=None,
-            kind="introselect",
-            order=None
+        # each sentence is used at most once
+        rows, cols, _ = pairing.dissimilar_pairs(s1tea, s2te, max_sent, method=method)
+        # read all the sentences in one batch per file and zip
+        return list(
+            zip(
+                occ.lines_from_file(spt_path1, indices1[rows]),
+                occ.lines_from_file(spt_path2, indices2[cols]),
+            )
         )
-        indices = indices[:min(len(indices), max_sent)]
-        spt1inds =  []
-        spt2inds = []
-        used_i = set()
-        used_j = set()
-        for ind in indices:
-            i, j = np.unravel_index(ind, (len(s1tea), len(s2te)))
-            if i not in used_i and j not in used_j:
-                spt1inds.append(indices1[i])
-                spt2inds.append(indices2[j])
-                used_i.add(i)
-                used_j.add(j)
-        # zip and return
-        sents = []
-        for i1, i2 in zip(spt1inds, spt2inds):
-            sents.append((occ.line_from_file(spt_path1, i1), occ.line_from_file(spt_path2, i2)))
-        return sents
 
 
     @staticmethod
-    def get_random_sentence(target, occ1, occ2, spt_path1, spt_path2, Q, wv1, wv2, max_sent=1000):
+    def get_random_sentence(target, occ1, occ2, spt_path1, spt_path2, Q, sv1, sv2, num_neighbors=3, seed=None):
         """
         gets a pair of example sentences
         a pair looks liks (sent1, list(sent2))
@@ -213,40 +314,26 @@ class Alignment:
         spt_path1: path object to the scrubbed plaintext 1
         spt_path2: path object to the scrubbed plaintext 2
         Q: rotation matrix of the associated alignment
-        wv1: WordVectors to embed the sentences from pt1 with
-        wv2: WordVectors to embed the sentences from pt2 with
-        max_sent: the maximum number of sentences to return
+        sv1: sentence vectors of pt1 (see sentence_vectors), row i embeds line i
+        sv2: sentence vectors of pt2
+        num_neighbors: the number of sentences from pt2 to return, least similar first
+        seed: seed of the random choice of sent1, None for a fresh choice every call
         """
-        i1 = occ1[target]
-        i2 = occ2[target]
-        indices1, s1te = occ.embed_lines(spt_path1, i1, wv1)
-        indices2, s2te = occ.embed_lines(spt_path2, i2, wv2)
-        # align embedded sentences using Q
-        s1tea = np.matmul(s1te, Q)
-        max_sent = min(max_sent, len(indices1), len(indices2))
-        sims = cosine_similarity(s1tea, s2te)
+        indices1 = np.asarray(occ1[target], dtype=np.int64)
+        indices2 = np.asarray(occ2[target], dtype=np.int64)
         # randomly pick some sentence from the first context
-        i = int(np.random.choice(range(len(indices1)), 1)[0])
-        # subset sims to only compare to the sentence we picked
-        sims = sims[i, :]
-        max_sent = min(3, sims.shape[0])
-        indices = np.argpartition(
-            sims,
-            max_sent,
-            axis=None,
-            kind="introselect",
-            order=None
-        )
-        indices = indices[:min(len(indices), max_sent)]
-        spt2inds = []
-        for ind in indices:
-            j = ind 
-            spt2inds.append(indices2[j])
-        sents = []
-        for i2 in spt2inds:
-            sents.append(occ.line_from_file(spt_path2, i2))
+        rng = np.random.default_rng(seed)
+        i = int(rng.integers(len(indices1)))
+        # only the picked sentence is aligned, using Q
+        v = np.matmul(sv1[indices1[i]], Q)
+        # cosine similarity to every sentence of the second context in one matrix-vector product
+        s2te = sv2[indices2]
+        norms = np.linalg.norm(s2te, axis=1) * np.linalg.norm(v)
+        norms[norms == 0] = 1
+        sims = np.matmul(s2te, v) / norms
+        k = min(num_neighbors, len(sims))
+        indices = np.argpartition(sims, k - 1)[:k] if k > 0 else np.empty(0, dtype=np.int64)
+        indices = indices[np.argsort(sims[indices], kind="stable")]
+        sents = occ.lines_from_file(spt_path2, indices2[indices])
         ts = occ.line_from_file(spt_path1, indices1[i])
         return ts, sents
-
-
-        
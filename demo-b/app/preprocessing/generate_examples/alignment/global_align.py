@@ -1,4 +1,3 @@
-from tkinter import W
 from scipy.linalg import orthogonal_procrustes
 import numpy as np
 from app.preprocessing.WordVectors import WordVectors
@@ -56,7 +55,6 @@ class GlobalAlignConfig:
         """
         # they should have the same number of words
         assert len(wv1) == len(wv2)
-        # might be no efficient way to do this
         words = wv1.get_words()
         if self._anchor_top is not None:
             v1 = [
@@ -90,24 +88,30 @@ class GlobalAlignConfig:
                 wv2.vectors[i] for i in anchors if wv2.get_word(i) not in self._exclude
             ]
         elif self._anchor_indices is not None:
-            v1 = [
-                wv1.vectors[i]
-                for i in self._anchor_indices
-                if wv1.get_word(i) not in self._exclude
-            ]
-            v2 = [
-                wv2.vectors[i]
-                for i in self._anchor_indices
-                if wv2.get_word(i) not in self._exclude
-            ]
+            indices = np.asarray(self._anchor_indices, dtype=int)
+            if self._exclude:
+                indices = np.array(
+                    [i for i in indices if wv1.get_word(i) not in self._exclude],
+                    dtype=int,
+                )
+            v1 = wv1.vectors[indices]
+            v2 = wv2.vectors[indices]
         elif self._anchor_words is not None:
-            v1 = [wv1[w] for w in self._anchor_words if w not in self._exclude]
-            v2 = [wv2[w] for w in self._anchor_words if w not in self._exclude]
+            anchors = [w for w in self._anchor_words if w not in self._exclude]
+            v1 = wv1.vectors_for_words(anchors)
+            v2 = wv2.vectors_for_words(anchors)
         else:  # just use all words
-            v1 = [wv1[w] for w in words if w not in self._exclude]
-            v2 = [wv2[w] for w in words if w not in self._exclude]
+            if self._exclude:
+                words = [w for w in words if w not in self._exclude]
+            v1 = wv1.vectors_for_words(words)
+            v2 = wv2.vectors_for_words(words)
         v1 = np.array(v1)
         v2 = np.array(v2)
         Q, _ = orthogonal_procrustes(v1, v2)
-        wv1_ = WordVectors(words=wv1.get_words(), vectors=np.matmul(wv1.vectors, Q))
+        # Q has the dtype of the vectors, so the aligned vectors keep it too
+        wv1_ = WordVectors(
+            words=wv1.words,
+            vectors=np.matmul(wv1.vectors, Q),
+            dtype=wv1.vectors.dtype,
+        )
         return wv1_, wv2, Q
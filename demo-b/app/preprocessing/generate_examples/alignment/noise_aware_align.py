@@ -28,7 +28,7 @@ class NoiseAwareAlignConfig:
             wv1.vectors, wv2.vectors, self._is_soft
         )
         _wv1v = np.matmul(wv1.vectors, Q)
-        _wv1 = WordVectors(wv1.get_words(), _wv1v)
+        _wv1 = WordVectors(wv1.words, _wv1v, dtype=wv1.vectors.dtype)
         return _wv1, wv2, Q
 
 
@@ -41,10 +41,10 @@ def P(Y, dim, mu, s):
     :param s: sigma - variance
     :return: probability
     """
+    # the covariance is isotropic (s * I) so the mahalanobis term is a scaled squared norm
     C = -dim / 2 * (np.log(2 * np.pi * s))
-    exp = -0.5 * np.einsum(
-        "ij, ij -> i", Y - mu, np.dot(np.eye(dim) * (1 / s), (Y - mu).T).T
-    )
+    diff = Y - mu
+    exp = -0.5 * np.einsum("ij, ij -> i", diff, diff) / s
     return C + exp
 
 
@@ -69,51 +69,42 @@ def EM_aux(X, Y, alpha, Q, sigma, muy, sigmay, is_soft):
         j = j + 1
         prev_alpha = alpha
         # E-step
-        ws = [0] * n
-        nom = [0] * n
-        sup = [0] * n
-        nom[:] = np.log(alpha) + P(Y, dim, np.dot(X, Q), sigma)
-        sup[:] = np.log((1 - alpha)) + P(Y, dim, muy, sigmay)
-        m = max(nom)
-        ws[:] = np.exp(nom[:] - m) / (np.exp(nom[:] - m) + np.exp(sup[:] - m))
+        nom = np.log(alpha) + P(Y, dim, np.dot(X, Q), sigma)
+        sup = np.log((1 - alpha)) + P(Y, dim, muy, sigmay)
+        m = nom.max()
+        ws = np.exp(nom - m) / (np.exp(nom - m) + np.exp(sup - m))
         ws = np.where(np.isnan(ws), 0, ws)
         # M-step
         if is_soft:
-            sum_ws = float(sum(ws))
+            sum_ws = float(ws.sum())
             alpha = sum_ws / float(n)
-            Q, _ = orthogonal_procrustes(
-                np.multiply(np.array(ws).reshape((n, 1)), X),
-                np.multiply(np.array(ws).reshape((n, 1)), Y),
-            )
-            sigma = sum(
-                np.linalg.norm(np.dot(X[i, :], Q) - Y[i, :]) ** 2 * ws[i]
-                for i in range(0, n)
-            ) / (sum_ws * dim)
-            muy = sum(Y[i, :] * (1 - ws[i]) for i in range(0, n)) / (n - sum_ws)
-            sigmay = sum(
-                np.linalg.norm(muy - Y[i, :]) ** 2 * (1 - ws[i]) for i in range(0, n)
-            ) / ((n - sum_ws) * dim)
+            Q, _ = orthogonal_procrustes(ws[:, None] * X, ws[:, None] * Y)
+            # squared residual of every pair, weighted by how likely it is to be clean
+            res = np.dot(X, Q) - Y
+            sq_res = np.einsum("ij, ij -> i", res, res)
+            sigma = np.dot(ws, sq_res) / (sum_ws * dim)
+            muy = np.dot(1 - ws, Y) / (n - sum_ws)
+            dev = muy - Y
+            sq_dev = np.einsum("ij, ij -> i", dev, dev)
+            sigmay = np.dot(1 - ws, sq_dev) / ((n - sum_ws) * dim)
         else:  # hard EM
-            t_indices = np.where(np.asarray(ws) >= 0.5)[0]
-            f_indices = np.where(np.asarray(ws) < 0.5)[0]
+            t_indices = np.where(ws >= 0.5)[0]
+            f_indices = np.where(ws < 0.5)[0]
             assert len(t_indices) > 0
             assert len(f_indices) > 0
-            X_clean = np.squeeze(X[[t_indices], :])
-            Y_clean = np.squeeze(Y[[t_indices], :])
+            X_clean = X[t_indices]
+            Y_clean = Y[t_indices]
             alpha = float(len(t_indices)) / float(n)
             Q, _ = orthogonal_procrustes(X_clean, Y_clean)
-            sigma = sum(
-                np.linalg.norm(np.dot(X[i, :], Q) - Y[i, :]) ** 2 for i in t_indices
-            ) / (len(t_indices) * dim)
-            muy = sum(Y[i, :] for i in f_indices) / len(f_indices)
-            sigmay = sum(np.linalg.norm(muy - Y[i, :]) ** 2 for i in f_indices) / (
-                len(f_indices) * dim
-            )
+            sigma = np.sum((np.dot(X_clean, Q) - Y_clean) ** 2) / (len(t_indices) * dim)
+            Y_noisy = Y[f_indices]
+            muy = Y_noisy.mean(axis=0)
+            sigmay = np.sum((muy - Y_noisy) ** 2) / (len(f_indices) * dim)
 
         # print('iter:', j, 'alpha:', round(alpha,3), 'sigma:', round(sigma,3), 'sigmay', round(sigmay,3))
 
-    t_indices = np.where(np.asarray(ws) >= 0.5)[0]
-    f_indices = np.where(np.asarray(ws) < 0.5)[0]
+    t_indices = np.where(ws >= 0.5)[0]
+    f_indices = np.where(ws < 0.5)[0]
     return np.asarray(Q), alpha, t_indices, f_indices
 
 
@@ -11,23 +11,18 @@ there. Alternatively, one can start from random landmarks."""
 
 
 # Third party modules
-from ast import Global
+# tensorflow and matplotlib are slow to import, so they are imported where they are used
 import numpy as np
-import tensorflow as tf
-from tensorflow import keras
 from sklearn.svm import SVC
 from sklearn.metrics import accuracy_score, log_loss
-from scipy.spatial.distance import cosine, euclidean
-import matplotlib.pyplot as plt
-import seaborn as sns
+from scipy.spatial.distance import cosine
 
 # Local modules
 from ...WordVectors import WordVectors
 from .global_align import GlobalAlignConfig
 
-# Initialize random seeds
+# Initialize random seeds (tensorflow's is set in build_keras_model)
 np.random.seed(1)
-tf.random.set_seed(1)
 
 
 class S4AlignConfig:
@@ -117,6 +112,50 @@ def inject_change_single(wv, w, words, v_a, alpha, replace=False, max_tries=50):
     return v_b
 
 
+def cosine_rows(A, B):
+    """
+    cosine distance between corresponding rows of A and B
+    equivalent to [cosine(u, v) for u, v in zip(A, B)]
+    A, B: n x d numpy arrays
+    returns: length n numpy array
+    """
+    dots = np.einsum("ij, ij -> i", A, B)
+    return 1 - dots / (np.linalg.norm(A, axis=1) * np.linalg.norm(B, axis=1))
+
+
+def inject_change(vectors, targets, v_a, alpha, replace=False, max_tries=50):
+    """
+    Batched version of inject_change_single, injects change into every target at once.
+    Each target keeps sampling words (uniformly from all rows of vectors) until its modified
+    vector has a higher cosine distance to its row of v_a than the original, or until max_tries.
+    Targets that are done drop out of the batch.
+
+    Arguments:
+            vectors -   (np.ndarray) n x d vectors of the corpus to be modified
+            targets -   (np.ndarray) row indices of the words to be modified
+            v_a     -   (np.ndarray) len(targets) x d vectors of the targets in the parallel source
+            alpha   -   (float) Rate of injected change
+            replace -   (bool) Whether to replace w with t instead of 'moving' w towards t
+    Returns:
+            v_b     -   (np.ndarray) len(targets) x d modified vectors of the targets
+    """
+    v_w = vectors[targets]
+    cos_t = cosine_rows(v_a, v_w)  # cosine distance thresholds we want to surpass
+    v_b = v_w.copy()
+    active = np.flatnonzero(cos_t > 0)
+    tries = 0
+    while len(active) > 0 and tries < max_tries:
+        tries += 1
+        selected = np.random.randint(len(vectors), size=len(active))  # words with new senses
+        if not replace:
+            v_b[active] = v_w[active] + alpha * vectors[selected]
+        else:
+            v_b[active] = vectors[selected]
+        c = cosine_rows(v_a[active], v_b[active])
+        active = active[c < cos_t[active]]
+    return v_b
+
+
 def get_features(x, names=["cos"]):
     """
     Compute features given input training data (concatenated vectors)
@@ -127,12 +166,12 @@ def get_features(x, names=["cos"]):
     Returns:
             n x d feature matrix (floats)
     """
+    x = np.asarray(x)
+    half = x.shape[1] // 2
     x_out = np.zeros((len(x), len(names)), dtype=float)
-    for i, p in enumerate(x):
-        for j, feat in enumerate(names):
-            if feat == "cos":
-                x_ = cosine(p[: len(p) // 2], p[len(p) // 2 :])
-                x_out[i][j] = x_
+    for j, feat in enumerate(names):
+        if feat == "cos":
+            x_out[:, j] = cosine_rows(x[:, :half], x[:, half:])
     return x_out
 
 
@@ -152,11 +191,15 @@ def build_keras_model(dim):
     Builds the keras model to be used in self-supervision.
     Return: Keras-Tensorflow2 model
     """
+    import tensorflow as tf
+    from tensorflow import keras
+
+    tf.random.set_seed(1)
     h1_dim = 100
     h2_dim = 100
     model = keras.Sequential(
         [
-            keras.layers.Input(shape=(dim)),
+            keras.layers.Input(shape=(dim,)),
             keras.layers.Dense(
                 h1_dim,
                 activation="relu",
@@ -345,39 +388,44 @@ def s4(
         def verbose_print(*s, end="\n"):
             return None
 
-    wv2_original = WordVectors(words=wv2.get_words(), vectors=wv2.vectors.copy())
+    wv2_original = WordVectors(
+        words=wv2.words, vectors=wv2.vectors, dtype=wv2.vectors.dtype
+    )
+    words = wv1.get_words()
+    n = len(words)
 
     avg_window = 0  # number of iterations to use in running average
 
     ga = GlobalAlignConfig()
     # Begin alignment
-    if update_landmarks:
-        # Check if landmarks is initialized
-        if landmarks == None:
-            wv1, wv2, Q = ga.align(wv1, wv2)  # start from global alignment
-            landmark_dists = [euclidean(u, v) for u, v in zip(wv1.vectors, wv2.vectors)]
-            landmark_args = np.argsort(landmark_dists)
-            landmarks = [
-                wv1.get_words()[i]
-                for i in landmark_args[: int(len(wv1.get_words()) * 0.5)]
-            ]
-            # landmarks = np.random.choice(wv1.words, int(len(wv1)*0.5))
-        landmark_set = set(landmarks)
-        non_landmarks = np.array([w for w in wv1.get_words() if w not in landmark_set])
+    # landmarks are tracked as a boolean mask over word ids
+    if update_landmarks and landmarks is None:
+        wv1, wv2, Q = ga.align(wv1, wv2)  # start from global alignment
+        landmark_dists = np.linalg.norm(wv1.vectors - wv2.vectors, axis=1)
+        landmark_args = np.argsort(landmark_dists)
+        is_landmark = np.zeros(n, dtype=bool)
+        is_landmark[landmark_args[: int(n * 0.5)]] = True
+        # landmarks = np.random.choice(wv1.words, int(len(wv1)*0.5))
     else:
-        landmark_set = set(landmarks)
-        non_landmarks = [w for w in wv1.get_words() if w not in landmark_set]
+        is_landmark = np.zeros(n, dtype=bool)
+        is_landmark[[wv1.get_id(w) for w in landmarks]] = True
+    landmark_ids = np.flatnonzero(is_landmark)
+    non_landmark_ids = np.flatnonzero(~is_landmark)
     # modify the global alignment config to use the landmarks we found
-
-    ga._anchor_words = landmarks
+    ga._anchor_indices = landmark_ids
     # align
     wv1, wv2, Q = ga.align(wv1, wv2)
+    dim = wv1.get_vector_dimension()
     if cls_model == "nn":
-        print("dim is", wv1.get_vector_dimension())
-        model = build_keras_model(wv1.get_vector_dimension() * 2)
+        print("dim is", dim)
+        model = build_keras_model(dim * 2)
     elif cls_model == "svm_auto" or cls_model == "svm_features":
         model = build_sklearn_model()  # get SVC
 
+    # [wv1 | wv2] feature matrix of the whole vocabulary, only the wv1 half changes between iterations
+    x_real = np.empty((n, 2 * dim), dtype=wv1.vectors.dtype)
+    x_real[:, dim:] = wv2_original.vectors
+
     landmark_hist = list()  # store no. of landmark history
     loss_hist = list()  # store self-supervision loss history
     alignment_loss_hist = list()  # store landmark alignment loss
@@ -396,63 +444,47 @@ def s4(
     cumulative_cos_in = list()
     cumulative_cos_out = list()
 
-    prev_landmarks = set(landmarks)
+    prev_landmarks = is_landmark
     for iter in range(iters):
 
-        pos_samples = list()
-        pos_vectors = dict()
-
         # Randomly sample words to inject change to
         # If no word is flagged as non_landmarks, sample from all words
         # In practice, this should never occur when selecting landmarks
         # but only for classification when aligning on all words
-        if len(non_landmarks) > 0:
-            targets = np.random.choice(non_landmarks, n_targets)
+        if len(non_landmark_ids) > 0:
+            targets = np.random.choice(non_landmark_ids, n_targets)
             # Make targets deterministic
-            # targets = non_landmarks
+            # targets = non_landmark_ids
         else:
-            targets = np.random.choice(wv1.get_words(), n_targets)
-
-        for target in targets:
+            targets = np.random.randint(n, size=n_targets)
 
-            # Simulate semantic change in target word
-            v = inject_change_single(
-                wv2_original, target, wv1.get_words(), wv1[target], rate
-            )
-
-            pos_vectors[target] = v
-
-            pos_samples.append(target)
-        # Convert to numpy array
-        pos_samples = np.array(pos_samples)
+        # Simulate semantic change in the target words
+        pos_vectors = inject_change(
+            wv2_original.vectors, targets, wv1.vectors[targets], rate
+        )
         # Get negative samples from landmarks
-        neg_samples = negative_samples(landmarks, n_negatives, p=None)
-        neg_vectors = {w: wv2_original[w] for w in neg_samples}
-        # Create dictionary of supervision samples (positive and negative)
-        # Mapping word -> vector
-        sup_vectors = {**neg_vectors, **pos_vectors}
-
-        # Prepare training data
-        words_train = np.concatenate((pos_samples, neg_samples))
+        neg_samples = negative_samples(landmark_ids, n_negatives, p=None)
+
+        # Prepare training data, each row is [wv1 | (modified) wv2] of a sample
+        ids_train = np.concatenate((targets, neg_samples))
+        x_train = np.empty((len(ids_train), 2 * dim), dtype=wv1.vectors.dtype)
+        x_train[:, :dim] = wv1.vectors[ids_train]
+        x_train[: len(targets), dim:] = pos_vectors
+        x_train[len(targets) :, dim:] = wv2_original.vectors[neg_samples]
         # assign labels to positive and negative samples
-        y_train = [1] * len(pos_samples) + [0] * len(neg_samples)
+        y_train = np.array([1] * len(targets) + [0] * len(neg_samples))
 
-        # Stack columns to shuffle data and labels together
-        train = np.column_stack((words_train, y_train))
-        # Shuffle batch
-        np.random.shuffle(train)
-        # Detach data and labels
-        words_train = train[:, 0]
-        y_train = train[:, -1].astype(int)
-
-        x_train = np.array([np.append(wv1[w], sup_vectors[w]) for w in words_train])
+        # Shuffle data and labels together
+        order = np.random.permutation(len(ids_train))
+        x_train = x_train[order]
+        y_train = y_train[order]
 
         # Append history
-        landmark_hist.append(len(landmarks))
-        v1_land = np.array([wv1[w] for w in landmarks])
-        v2_land = np.array([wv2_original[w] for w in landmarks])
-        v1_out = np.array([wv1[w] for w in non_landmarks])
-        v2_out = np.array([wv2_original[w] for w in non_landmarks])
+        landmark_hist.append(len(landmark_ids))
+        v1_land = wv1.vectors[landmark_ids]
+        v2_land = wv2_original.vectors[landmark_ids]
+        v1_out = wv1.vectors[non_landmark_ids]
+        v2_out = wv2_original.vectors[non_landmark_ids]
 
         alignment_loss = np.linalg.norm(v1_land - v2_land) ** 2 / len(v1_land)
         alignment_loss_hist.append(alignment_loss)
@@ -466,13 +498,13 @@ def s4(
         # all loss
         alignment_all_loss = np.linalg.norm(
             wv1.vectors - wv2_original.vectors
-        ) ** 2 / len(wv1.words)
+        ) ** 2 / n
         alignment_all_hist.append(alignment_all_loss)
 
         if debug:
             # cosine loss
-            cos_in = np.mean([cosine(u, v) for u, v in zip(v1_land, v2_land)])
-            cos_out = np.mean([cosine(u, v) for u, v in zip(v1_out, v2_out)])
+            cos_in = np.mean(cosine_rows(v1_land, v2_land))
+            cos_out = np.mean(cosine_rows(v1_out, v2_out))
             cos_loss_in_hist.append(cos_in)
             cos_loss_out_hist.append(cos_out)
             cumulative_cos_in.append(np.mean(cos_loss_in_hist))
@@ -480,7 +512,7 @@ def s4(
 
         # Begin training of neural network
         if cls_model == "nn":
-            history = model.train_on_batch(x_train, y_train, reset_metrics=False)
+            history = model.train_on_batch(x_train, y_train)
             # history = model.fit(x_train, y_train, epochs=5, verbose=0)
             # history = [history.history["loss"][0]]
         elif cls_model == "svm_auto":
@@ -498,11 +530,9 @@ def s4(
         loss_hist.append(history[0])
 
         # Apply model on original data to select landmarks
-        x_real = np.array(
-            [np.append(u, v) for u, v in zip(wv1.vectors, wv2_original.vectors)]
-        )
+        x_real[:, :dim] = wv1.vectors
         if cls_model == "nn":
-            predict_real = model.predict(x_real)
+            predict_real = model.predict(x_real).ravel()
         elif cls_model == "svm_auto":
             predict_real = model.predict_proba(x_real)
             predict_real = predict_real[:, 1]
@@ -514,30 +544,27 @@ def s4(
         y_predict = predict_real > t
 
         if update_landmarks:
-            landmarks = [
-                wv1.get_word(i) for i in range(len(wv1.words)) if predict_real[i] < t
-            ]
-            non_landmarks = [
-                wv1.get_word(i) for i in range(len(wv1.words)) if predict_real[i] > t
-            ]
+            is_landmark = predict_real < t
+            landmark_ids = np.flatnonzero(is_landmark)
+            non_landmark_ids = np.flatnonzero(predict_real > t)
 
         # Update landmark overlap using Jaccard Index
-        isect_ab = set.intersection(prev_landmarks, set(landmarks))
-        union_ab = set.union(prev_landmarks, set(landmarks))
-        j_index = len(isect_ab) / len(union_ab)
+        isect_ab = np.count_nonzero(prev_landmarks & is_landmark)
+        union_ab = np.count_nonzero(prev_landmarks | is_landmark)
+        j_index = isect_ab / union_ab
         overlap_hist.append(j_index)
 
         cumulative_overlap_hist.append(
             np.mean(overlap_hist[-avg_window:])
         )  # store mean
 
-        prev_landmarks = set(landmarks)
+        prev_landmarks = is_landmark
 
         verbose_print(
             "> %3d | L %4d | l(in): %.2f | l(out): %.2f | loss: %.2f | overlap %.2f | acc: %.2f"
             % (
                 iter,
-                len(landmarks),
+                len(landmark_ids),
                 cumulative_alignment_hist[-1],
                 cumulative_out_hist[-1],
                 history[0],
@@ -546,18 +573,23 @@ def s4(
             ),
             end="\r",
         )
-        ga._anchor_words = landmarks
-        
+        ga._anchor_indices = landmark_ids
+
         wv1, wv2_original, Q = ga.align(wv1, wv2_original)
 
         # Check if overlap difference is below threhsold
         if np.mean(overlap_hist) > t_overlap:
             break
 
+    landmarks = words[landmark_ids].tolist()
+    non_landmarks = words[non_landmark_ids].tolist()
+
     # Print new line
     verbose_print()
 
     if plot == 1:
+        import matplotlib.pyplot as plt
+
         iter += 1  # add one to iter for plotting
         plt.plot(range(iter), landmark_hist, label="landmarks")
         plt.hlines(len(wv1.words), 0, iter, colors="red")
@@ -0,0 +1,100 @@
+import numpy as np
+from app.preprocessing.neighbors import normalize_rows, SCRATCH_BYTES
+
+"""
+one-to-one pairing of the sentences of two contexts by dissimilarity
+used to pick example sentences where a word is used differently in each context
+"""
+
+METHODS = ("greedy", "optimal")
+
+
+def cosine_similarities(A, B, scratch_bytes=SCRATCH_BYTES):
+    """
+    returns the (len(A) x len(B)) float32 matrix of cosine similarities between the rows of A and B
+    rows of A are multiplied against B in blocks, so no intermediate beyond the result
+    grows with len(A) (the result itself is bounded by the occurrence limit of the callers)
+    """
+    A = normalize_rows(np.asarray(A, dtype=np.float32))
+    B = normalize_rows(np.asarray(B, dtype=np.float32))
+    sims = np.empty((len(A), len(B)), dtype=np.float32)
+    block = max(1, scratch_bytes // max(B.nbytes, 1))
+    for lo in range(0, len(A), block):
+        np.matmul(A[lo : lo + block], B.T, out=sims[lo : lo + block])
+    return sims
+
+
+def greedy_pairs(sims, max_pairs):
+    """
+    pairs rows with columns one-to-one, least similar first
+    the result is the one visiting every (row, column) pair from least to most similar
+    and keeping each pair whose row and column are both unused, but it is found in rounds:
+    every round keeps the pairs that are each other's least similar among the unused rows and columns,
+    which the sorted walk would keep too
+    sims: (n1 x n2) numpy array
+    max_pairs: maximum number of pairs returned
+    returns: (rows, cols) int64 numpy arrays of the pairs, least similar first
+    """
+    n1, n2 = sims.shape
+    max_pairs = min(max_pairs, n1, n2)
+    rows = np.empty(0, dtype=np.int64)
+    cols = np.empty(0, dtype=np.int64)
+    if max_pairs == 0:
+        return rows, cols
+    active_rows = np.arange(n1)
+    active_cols = np.arange(n2)
+    while len(active_rows) and len(active_cols):
+        if len(active_rows) == n1 and len(active_cols) == n2:
+            sub = sims
+        else:
+            sub = sims[np.ix_(active_rows, active_cols)]
+        row_best = sub.argmin(axis=1)
+        col_best = sub.argmin(axis=0)
+        row_min = sub[np.arange(len(active_rows)), row_best]
+        # rows whose least similar column has that row as its least similar row
+        mutual = col_best[row_best] == np.arange(len(active_rows))
+        rows = np.concatenate((rows, active_rows[mutual]))
+        cols = np.concatenate((cols, active_cols[row_best[mutual]]))
+        # pairs found later are never less similar than the least similar remaining pair
+        remaining_min = row_min[~mutual].min() if not mutual.all() else np.inf
+        if len(rows) >= max_pairs:
+            kth = np.partition(sims[rows, cols], max_pairs - 1)[max_pairs - 1]
+            if kth <= remaining_min:
+                break
+        keep_rows = np.ones(len(active_rows), dtype=bool)
+        keep_rows[mutual] = False
+        keep_cols = np.ones(len(active_cols), dtype=bool)
+        keep_cols[row_best[mutual]] = False
+        active_rows = active_rows[keep_rows]
+        active_cols = active_cols[keep_cols]
+    order = np.argsort(sims[rows, cols], kind="stable")[:max_pairs]
+    return rows[order], cols[order]
+
+
+def optimal_pairs(sims, max_pairs):
+    """
+    pairs rows with columns one-to-one minimizing the total similarity of the pairing
+    (scipy's linear_sum_assignment), then keeps the max_pairs least similar pairs
+    returns: (rows, cols) int64 numpy arrays of the pairs, least similar first
+    """
+    from scipy.optimize import linear_sum_assignment
+
+    rows, cols = linear_sum_assignment(sims)
+    order = np.argsort(sims[rows, cols], kind="stable")[: max(max_pairs, 0)]
+    return rows[order].astype(np.int64), cols[order].astype(np.int64)
+
+
+def dissimilar_pairs(A, B, max_pairs, method="greedy", scratch_bytes=SCRATCH_BYTES):
+    """
+    pairs the rows of A with the rows of B one-to-one, preferring pairs with low cosine similarity
+    method: "greedy" or "optimal"
+    returns: (rows, cols, sims) numpy arrays of at most max_pairs pairs, least similar first
+    """
+    if method not in METHODS:
+        raise ValueError(f"method must be one of {METHODS}, got {method}")
+    sims = cosine_similarities(A, B, scratch_bytes)
+    if method == "greedy":
+        rows, cols = greedy_pairs(sims, max_pairs)
+    else:
+        rows, cols = optimal_pairs(sims, max_pairs)
+    return rows, cols, sims[rows, cols]
@@ -0,0 +1,74 @@
+from array import array
+from app import metrics
+from app.resources import worker_pool
+from app.preprocessing.sentencize import split_sentences
+from app.preprocessing.tokenize import keep_tokens
+from app.preprocessing.token_corpus import TokenCorpusBuilder
+from app.preprocessing.line_index import write_offsets
+
+"""
+single pass ingest of an uploaded plaintext
+sentence-splits, tokenizes, token-id encodes and indexes the upload while reading it exactly once
+"""
+
+
+def ingest_line(line):
+    """
+    scrubs and tokenizes a single line of the raw plaintext
+    line: str
+    returns: list(tuple(str, list(str))) - (sentence, tokens) for every sentence kept on the line
+    """
+    return [(s, keep_tokens(tokens)) for s, tokens in split_sentences(line)]
+
+
+def ingest(in_path, s_path, t_path, limit=2000, workers=None, chunksize=10000, pool=None, progress=None):
+    """
+    in_path: Path object to the uploaded plaintext file
+    s_path: Path object to the location we should write the scrubbed file
+    t_path: Path object to the location we should write the tokenized file
+    limit: int - maximum number of lines to record as containing each word
+    writes one sentence per line to s_path and the matching tokenized sentence to the same line of t_path
+    equivalent to sentencize.initial_scrub, tokenize.initial_tokenize and occurrences.get_occurrences
+    run back to back, but the upload is only read (and tokenized) once
+    also writes the byte-offset index of both output files (see line_index)
+    progress: optional callable, called with the fraction of the upload read so far
+    workers: number of processes, defaults to the cpus available to this process
+    pool: optional multiprocessing Pool to run on (e.g. a ResourceScheduler's), workers is ignored if given
+    returns: tuple(TokenCorpus, OccurrenceIndex) - the tokenized file encoded as token ids,
+    and the index of which lines contain which words (computed from the token ids)
+    """
+    corpus = TokenCorpusBuilder()
+    # line start offsets of the scrubbed and tokenized files
+    s_offsets = array("Q", [0])
+    t_offsets = array("Q", [0])
+    size = max(in_path.stat().st_size, 1)
+    n_read = 0
+
+    def read_lines(f):
+        # count characters handed to the pool so we can report progress
+        nonlocal n_read
+        for line in f:
+            n_read += len(line)
+            yield line
+
+    # scrubbing and tokenizing happen together in the pool, so they are timed as one stage
+    with metrics.stage("ingest"), in_path.open() as f_in, s_path.open("wb") as s_out, t_path.open("wb") as t_out:
+        with worker_pool(pool, workers) as p:
+            for j, sents in enumerate(p.imap(ingest_line, read_lines(f_in), chunksize=chunksize)):
+                if progress is not None and j % chunksize == 0:
+                    progress(n_read / size)
+                for s, toks in sents:
+                    s_line = f"{s}\n".encode("utf-8")
+                    t_line = "{}\n".format(" ".join(toks)).encode("utf-8")
+                    s_out.write(s_line)
+                    t_out.write(t_line)
+                    s_offsets.append(s_offsets[-1] + len(s_line))
+                    t_offsets.append(t_offsets[-1] + len(t_line))
+                    corpus.add(toks)
+    write_offsets(s_path, s_offsets)
+    write_offsets(t_path, t_offsets)
+    with metrics.stage("encode"):
+        corpus = corpus.build()
+    with metrics.stage("occurrences"):
+        occs = corpus.occurrences(limit)
+    return corpus, occs
@@ -0,0 +1,142 @@
+import json
+import numpy as np
+from app.preprocessing.neighbors import METRICS, normalize_rows, top_k
+
+"""
+approximate nearest neighbor search with an inverted file (IVF) index
+the rows are partitioned by k-means, and a query is only compared against the rows
+of the nprobe lists whose centroids are nearest to it
+nprobe trades recall for speed: probing every list gives the exact neighbors
+on disk the index is a directory holding centroids.npy, offsets.npy, ids.npy and meta.json,
+the vectors themselves are not stored with the index
+"""
+
+DEFAULT_NPROBE = 16
+
+
+def kmeans(X, n_clusters, n_iter=10, seed=0):
+    """
+    Lloyd's k-means with centroids initialized to random rows of X
+    X: (n x dim) numpy array, n >= n_clusters
+    returns: (n_clusters x dim) numpy array of centroids
+    """
+    rng = np.random.default_rng(seed)
+    centroids = X[rng.choice(len(X), n_clusters, replace=False)].astype(np.float32)
+    X = np.asarray(X, dtype=np.float32)
+    for _ in range(n_iter):
+        assign = top_k(X, centroids, 1, metric="euclidean")[0][:, 0]
+        counts = np.bincount(assign, minlength=n_clusters)
+        sums = np.zeros_like(centroids)
+        order = np.argsort(assign, kind="stable")
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        nonempty = counts > 0
+        sums[nonempty] = np.add.reduceat(X[order], starts[nonempty], axis=0)
+        # clusters that lost every row keep their centroid
+        centroids[nonempty] = sums[nonempty] / counts[nonempty, None]
+    return centroids
+
+
+class IVFIndex:
+    """
+    inverted file index over the rows of a matrix
+    the rows of list j are ids[offsets[j]:offsets[j + 1]]
+    """
+
+    def __init__(self, centroids, offsets, ids, metric="euclidean"):
+        """
+        centroids: (number of lists x dim) numpy array
+        offsets: int64 numpy array of length (number of lists + 1)
+        ids: int64 numpy array of row ids grouped by list
+        metric: "cosine" or "euclidean"
+        """
+        if metric not in METRICS:
+            raise ValueError(f"metric must be one of {METRICS}, got {metric}")
+        assert offsets[-1] == len(ids)
+        self.centroids = centroids
+        self.offsets = offsets
+        self.ids = ids
+        self.metric = metric
+
+    def __len__(self):
+        """returns the number of rows indexed"""
+        return len(self.ids)
+
+    @staticmethod
+    def build(vectors, n_lists=None, metric="euclidean", n_iter=10, train_size=64, seed=0):
+        """
+        partitions the rows of vectors with k-means
+        vectors: (n x dim) numpy array
+        n_lists: number of partitions, defaults to sqrt(n)
+        n_iter: k-means iterations
+        train_size: k-means is trained on at most train_size rows per list
+        """
+        X = normalize_rows(vectors) if metric == "cosine" else np.asarray(vectors)
+        n = len(X)
+        if n_lists is None:
+            n_lists = int(round(np.sqrt(n)))
+        n_lists = max(1, min(n_lists, n))
+        rng = np.random.default_rng(seed)
+        sample = X
+        if n > train_size * n_lists:
+            sample = X[np.sort(rng.choice(n, train_size * n_lists, replace=False))]
+        centroids = kmeans(sample, n_lists, n_iter=n_iter, seed=seed)
+        if metric == "cosine":
+            centroids = normalize_rows(centroids)
+        assign = top_k(X, centroids, 1, metric=metric)[0][:, 0]
+        ids = np.argsort(assign, kind="stable").astype(np.int64)
+        offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assign, minlength=n_lists), out=offsets[1:])
+        return IVFIndex(centroids, offsets, ids, metric)
+
+    def search(self, vectors, queries, k, nprobe=DEFAULT_NPROBE):
+        """
+        vectors: the (n x dim) numpy array the index was built on
+        queries: (m x dim) numpy array, or a single vector
+        k: int - number of neighbors of each query, capped at the number of rows
+        nprobe: number of nearest lists searched, more lists are probed if they hold fewer than k rows
+        returns: (indices, distances) - (m x k) arrays of the nearest rows found for each query, nearest first
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=vectors.dtype))
+        m, n_lists = len(queries), len(self.centroids)
+        k = min(k, len(self.ids))
+        indices = np.empty((m, k), dtype=np.int64)
+        distances = np.empty((m, k), dtype=np.float64)
+        # lists ordered by the distance of their centroid to each query
+        probes = top_k(queries, self.centroids, n_lists, metric=self.metric)[0]
+        sizes = np.diff(self.offsets)
+        for j in range(m):
+            # enough lists to hold k rows
+            filled = np.searchsorted(np.cumsum(sizes[probes[j]]), k) + 1
+            lists = probes[j, : min(max(nprobe, filled), n_lists)]
+            cand = np.concatenate([self.ids[self.offsets[p] : self.offsets[p + 1]] for p in lists])
+            ci, cd = top_k(queries[j], vectors[cand], k, metric=self.metric)
+            indices[j] = cand[ci[0]]
+            distances[j] = cd[0]
+        return indices, distances
+
+    def write(self, path):
+        """
+        writes the index to the directory at path, creating it if it doesn't exist
+        path: pathlib path object
+        """
+        path.mkdir(parents=True, exist_ok=True)
+        np.save(path / "centroids.npy", self.centroids)
+        np.save(path / "offsets.npy", self.offsets)
+        np.save(path / "ids.npy", self.ids)
+        with (path / "meta.json").open("w") as f:
+            json.dump({"metric": self.metric}, f)
+
+    @staticmethod
+    def load(path):
+        """
+        reads an index written by IVFIndex.write
+        path: pathlib path object to the index directory
+        """
+        with (path / "meta.json").open() as f:
+            meta = json.load(f)
+        return IVFIndex(
+            np.load(path / "centroids.npy"),
+            np.load(path / "offsets.npy"),
+            np.load(path / "ids.npy"),
+            meta["metric"],
+        )
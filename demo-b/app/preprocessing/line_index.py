@@ -0,0 +1,77 @@
+import mmap
+import numpy as np
+
+"""
+byte-offset indices for line oriented artifacts (scrubbed and tokenized plaintexts)
+line i of a file spans bytes offsets[i]:offsets[i + 1], so reading k lines costs k slices
+"""
+
+
+def offsets_path(path):
+    """
+    path: Path object to a line oriented file
+    returns: Path object to the file's offset index
+    """
+    return path.with_suffix(".offsets.npy")
+
+
+def build_offsets(path, chunksize=1 << 24):
+    """
+    scans the file at path for line breaks
+    returns: uint64 numpy array of length (number of lines + 1) of line start offsets,
+    the last entry is the size of the file
+    """
+    starts = [np.zeros(1, dtype=np.uint64)]
+    pos = 0
+    with path.open("rb") as f:
+        while True:
+            buf = f.read(chunksize)
+            if not buf:
+                break
+            nl = np.flatnonzero(np.frombuffer(buf, dtype=np.uint8) == ord("\n"))
+            starts.append((nl + pos + 1).astype(np.uint64))
+            pos += len(buf)
+    offsets = np.concatenate(starts)
+    # the last line may not be terminated by a line break
+    if offsets[-1] != pos:
+        offsets = np.append(offsets, np.uint64(pos))
+    return offsets
+
+
+def write_offsets(path, offsets):
+    """
+    writes the offset index for the file at path
+    offsets: collection of line start offsets, ending with the size of the file
+    """
+    np.save(offsets_path(path), np.asarray(offsets, dtype=np.uint64))
+
+
+def load_offsets(path):
+    """
+    memory-maps the offset index for the file at path, building it first if it doesn't exist
+    returns: uint64 numpy array of line start offsets
+    """
+    o_path = offsets_path(path)
+    if not o_path.exists():
+        write_offsets(path, build_offsets(path))
+    return np.load(o_path, mmap_mode="r")
+
+
+def read_lines(path, line_indices, offsets=None):
+    """
+    reads the lines at line_indices from the file at path without scanning the file
+    path: Path object to a line oriented file
+    line_indices: collection of line numbers, in any order
+    offsets: the file's offset index, loaded with load_offsets if not supplied
+    returns: list(str) - the requested lines (including their line breaks) in the order requested
+    """
+    if len(line_indices) == 0:
+        return []
+    if offsets is None:
+        offsets = load_offsets(path)
+    line_indices = np.asarray(line_indices, dtype=np.int64)
+    starts = offsets[line_indices]
+    ends = offsets[line_indices + 1]
+    with path.open("rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return [mm[s:e].decode("utf-8") for s, e in zip(starts, ends)]
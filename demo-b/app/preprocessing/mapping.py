@@ -1,15 +1,18 @@
 """
 Performs mapping of words between two input word embeddings A and B
 """
-from sklearn.neighbors import NearestNeighbors
+from app.preprocessing.neighbors import NeighborSearch, SCRATCH_BYTES
+from app import metrics
 
 
-def perform_mapping(wva, wvb, k=5, metric="cosine"):
+def perform_mapping(wva, wvb, k=5, metric="cosine", scratch_bytes=SCRATCH_BYTES):
     """
     Given aligned wv_a and wv_b, performs mapping (translation) of words in a to those in b
-    Returns (distances, indices) as n-sized lists of distances and the indices of the top neighbors
+    Returns (distances, indices) as (len(wva) x k) arrays of the distances and the indices in wvb of the top neighbors
+    metric: "cosine" or "euclidean"
+    scratch_bytes: memory budget of the neighbor search
     """
-    nbrs = NearestNeighbors(n_neighbors=k, n_jobs=12, metric=metric).fit(wvb.vectors)
-    distances, indices = nbrs.kneighbors(wva.vectors)
+    with metrics.stage("dists", query="mapping", search="exact"):
+        indices, distances = NeighborSearch(wvb.vectors, metric, scratch_bytes).search(wva.vectors, k)
 
     return distances, indices
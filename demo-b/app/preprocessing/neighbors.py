@@ -0,0 +1,130 @@
+import numpy as np
+
+"""
+exact k nearest neighbor search over the rows of a matrix
+scores are computed with blocked matrix products into a reused scratch buffer, so memory use is
+bounded by scratch_bytes no matter how many rows are searched or how many queries are batched
+"""
+
+# default memory budget of a search, shared by the score block and its partition indices
+SCRATCH_BYTES = 64 * 1024**2
+# queries scored together when the searched matrix doesn't fit the budget in one block
+QUERY_BATCH = 256
+METRICS = ("cosine", "euclidean")
+
+
+def normalize_rows(X):
+    """
+    returns a copy of X with every row scaled to unit L2 norm, zero rows are left as is
+    """
+    X = np.array(X, dtype=np.result_type(X.dtype, np.float32))
+    norms = np.linalg.norm(X, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    X /= norms
+    return X
+
+
+class NeighborSearch:
+    """
+    exact top-k search over the rows of a matrix by cosine or euclidean distance
+    the matrix is searched as given (e.g. memory-mapped) and never copied, only its row norms are kept
+    """
+
+    def __init__(self, vectors, metric="cosine", scratch_bytes=SCRATCH_BYTES):
+        """
+        vectors: (n x dim) numpy array of the rows to search
+        metric: "cosine" or "euclidean"
+        scratch_bytes: int - memory budget of a search
+        """
+        if metric not in METRICS:
+            raise ValueError(f"metric must be one of {METRICS}, got {metric}")
+        self.metric = metric
+        self.scratch_bytes = scratch_bytes
+        self.vectors = np.asarray(vectors)
+        self._sq_norms = np.einsum("ij,ij->i", self.vectors, self.vectors)
+        if metric == "cosine":
+            # scales each block of scores instead of normalizing a copy of the rows, zero rows score 0
+            norms = np.sqrt(self._sq_norms)
+            self._inv_norms = np.divide(1, norms, out=np.zeros_like(norms), where=norms > 0)
+
+    def __len__(self):
+        """returns the number of rows searched"""
+        return len(self.vectors)
+
+    def _block_shape(self, m, k):
+        """
+        returns (query rows, searched rows) scored per block so the scores
+        and the indices argpartition allocates for them fit in scratch_bytes
+        """
+        n = len(self.vectors)
+        budget = max(self.scratch_bytes // (self.vectors.dtype.itemsize + 8), 1)
+        block = min(n, max(k, budget // min(m, QUERY_BATCH)))
+        batch = min(m, max(budget // block, 1))
+        return batch, block
+
+    def _scores(self, q, lo, hi, out):
+        """
+        scores queries q against rows lo:hi into out, higher is nearer
+        cosine scores are q.v / |v| for normalized queries q
+        euclidean scores are 2 q.v - |v|^2, which is |q|^2 - |q - v|^2
+        """
+        np.matmul(q, self.vectors[lo:hi].T, out=out)
+        if self.metric == "cosine":
+            out *= self._inv_norms[lo:hi]
+        else:
+            out *= 2
+            out -= self._sq_norms[lo:hi]
+        return out
+
+    def search(self, queries, k):
+        """
+        queries: (m x dim) numpy array, or a single vector
+        k: int - number of neighbors of each query, capped at the number of rows searched
+        returns: (indices, distances) - (m x k) arrays of the nearest rows of each query, nearest first
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=self.vectors.dtype))
+        if self.metric == "cosine":
+            queries = normalize_rows(queries)
+        n, m = len(self.vectors), len(queries)
+        k = min(k, n)
+        indices = np.empty((m, k), dtype=np.int64)
+        scores = np.empty((m, k), dtype=self.vectors.dtype)
+        if k > 0 and m > 0:
+            batch, block = self._block_shape(m, k)
+            scratch = np.empty(batch * block, dtype=self.vectors.dtype)
+            for qs in range(0, m, batch):
+                q = queries[qs : qs + batch]
+                best_i, best_s = None, None
+                for lo in range(0, n, block):
+                    hi = min(lo + block, n)
+                    s = self._scores(q, lo, hi, scratch[: len(q) * (hi - lo)].reshape(len(q), hi - lo))
+                    kk = min(k, hi - lo)
+                    part = np.argpartition(s, hi - lo - kk, axis=1)[:, -kk:]
+                    cand_s = np.take_along_axis(s, part, axis=1)
+                    cand_i = part + lo
+                    if best_i is not None:
+                        cand_i = np.hstack((best_i, cand_i))
+                        cand_s = np.hstack((best_s, cand_s))
+                    if cand_i.shape[1] > k:
+                        keep = np.argpartition(cand_s, cand_s.shape[1] - k, axis=1)[:, -k:]
+                        cand_i = np.take_along_axis(cand_i, keep, axis=1)
+                        cand_s = np.take_along_axis(cand_s, keep, axis=1)
+                    best_i, best_s = cand_i, cand_s
+                # nearest first
+                order = np.argsort(-best_s, axis=1, kind="stable")
+                indices[qs : qs + batch] = np.take_along_axis(best_i, order, axis=1)
+                scores[qs : qs + batch] = np.take_along_axis(best_s, order, axis=1)
+        if self.metric == "cosine":
+            distances = 1 - scores
+        else:
+            sq_q = np.einsum("ij,ij->i", queries, queries)
+            distances = np.sqrt(np.maximum(sq_q[:, None] - scores, 0))
+        return indices, distances
+
+
+def top_k(queries, vectors, k, metric="cosine", scratch_bytes=SCRATCH_BYTES):
+    """
+    returns (indices, distances) of the k rows of vectors nearest to each query, nearest first
+    see NeighborSearch.search
+    """
+    return NeighborSearch(vectors, metric, scratch_bytes).search(queries, k)
@@ -1,5 +1,30 @@
-from multiprocessing import Pool
+from app import metrics
+from app.resources import worker_pool
 import nltk
+from app.preprocessing.tokenize import word_tokens
+
+def split_sentences(line, min_sent_len=4):
+    """
+    splits a line into sentences, dropping degenerate sentences that are less than min_sent_len tokens long
+    each sentence is word-tokenized once (see tokenize.word_tokens), the same tokens decide whether
+    it is kept and, filtered by tokenize.keep_tokens, are its tokenized form
+    line: str
+    returns: list(tuple(str, list(str))) - (sentence, word tokens) for every sentence on the line that is long enough to keep
+    """
+    sents = []
+    for s in nltk.sent_tokenize(line):
+        tokens = word_tokens(s)
+        if len(tokens) >= min_sent_len:
+            sents.append((s, tokens))
+    return sents
+
+
+def scrub_sentences(line, min_sent_len=4):
+    """
+    returns: list(str) - the sentences on the line that are long enough to keep, see split_sentences
+    """
+    return [s for s, _ in split_sentences(line, min_sent_len)]
+
 
 def scrub_line(line, min_sent_len=4):
     """
@@ -8,14 +33,9 @@ def scrub_line(line, min_sent_len=4):
     line: str
     returns: str
     """
-    return "{}\n".format("\n".join(
-        filter(
-            lambda x: len(nltk.word_tokenize(x)) > min_sent_len,
-            nltk.sent_tokenize(line),
-        )
-    ))
+    return "{}\n".format("\n".join(scrub_sentences(line, min_sent_len)))
 
-def initial_scrub(in_path, out_path, workers=48, chunksize=10000):
+def initial_scrub(in_path, out_path, workers=None, chunksize=10000, pool=None):
     """
     in_path: Path object to a plaintext_file
     out_path: Path object to the location we should write the scrubbed file
@@ -23,11 +43,13 @@ def initial_scrub(in_path, out_path, workers=48, chunksize=10000):
     uses streams and iterators so we don't load the entire file into memory at once
     will consume tons of memory if the whole file is on one line
     creates file at out_path if it doesn't exist
+    workers: number of processes, defaults to the cpus available to this process
+    pool: optional multiprocessing Pool to run on (e.g. a ResourceScheduler's), workers is ignored if given
     """
-    with in_path.open() as f_in:
+    with metrics.stage("scrub"), in_path.open() as f_in:
         # open file to write out, creating it if it doesn't exist
         with out_path.open("w") as f_out:
-            with Pool(workers) as p:
+            with worker_pool(pool, workers) as p:
                 for s_res in p.imap(scrub_line, f_in, chunksize=chunksize):
                     if s_res.strip():
                         f_out.write(s_res)
\ No newline at end of file
@@ -0,0 +1,151 @@
+import numpy as np
+from array import array
+from scipy.sparse import csr_matrix
+from app.preprocessing.generate_embeddings.occurrences import OccurrenceIndex
+
+"""
+token-id encoded form of a tokenized plaintext
+the tokens of line i are vocab[tokens[offsets[i]:offsets[i + 1]]], so downstream consumers
+(counting, occurrence indexing, sentence embedding) work on integer arrays instead of re-tokenizing text
+on disk the corpus is a directory holding vocab.txt, offsets.npy and tokens.npy
+"""
+
+
+class TokenCorpus:
+    """
+    a tokenized plaintext stored as a flat int32 array of token ids plus line offsets
+    """
+
+    def __init__(self, vocab, offsets, tokens):
+        """
+        vocab: list(str) - token id i is the word vocab[i]
+        offsets: int64 numpy array of length (number of lines + 1)
+        tokens: int32 numpy array of token ids
+        """
+        assert offsets[-1] == len(tokens)
+        self.vocab = vocab
+        self.offsets = offsets
+        self.tokens = tokens
+
+    def __len__(self):
+        """returns the number of lines in the corpus"""
+        return len(self.offsets) - 1
+
+    def line(self, i):
+        """returns the int32 array of token ids on line i"""
+        return self.tokens[self.offsets[i] : self.offsets[i + 1]]
+
+    def line_ids(self):
+        """returns: int64 numpy array holding the line of every token"""
+        return np.repeat(np.arange(len(self), dtype=np.int64), np.diff(self.offsets))
+
+    def counts(self):
+        """returns: int64 numpy array with the number of times each word of vocab occurs"""
+        return np.bincount(self.tokens, minlength=len(self.vocab))
+
+    def occurrences(self, limit=2000):
+        """
+        limit: int - maximum number of lines to record as containing each word
+        returns: OccurrenceIndex - the first limit lines containing each word
+        (the same index get_occurrences builds from the text)
+        """
+        n_lines = max(len(self), 1)
+        # one key per distinct (word, line) pair, sorted by word then line
+        keys = np.unique(self.tokens.astype(np.int64) * n_lines + self.line_ids())
+        words = keys // n_lines
+        lines = (keys % n_lines).astype(np.int32)
+        # keep the first limit lines of every word
+        starts = np.searchsorted(words, np.arange(len(self.vocab)))
+        keep = np.arange(len(keys)) - starts[words] < limit
+        counts = np.bincount(words[keep], minlength=len(self.vocab))
+        offsets = np.zeros(len(self.vocab) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        return OccurrenceIndex(list(self.vocab), offsets, lines[keep])
+
+    def vocab_map(self, words):
+        """
+        words: Vocabulary, e.g. the words of an embedding trained on the corpus
+        returns: int64 numpy array mapping corpus token ids to ids in words, -1 for words it lacks
+        """
+        ids = words.ids
+        return np.fromiter(
+            (ids.get(w, -1) for w in self.vocab), dtype=np.int64, count=len(self.vocab)
+        )
+
+    def sentence_matrix(self, remap, n_columns, start=0, stop=None):
+        """
+        returns the lines start:stop as a sparse (lines x n_columns) matrix of word counts
+        remap: mapping from corpus token ids to columns (see vocab_map), tokens mapped to -1 are dropped
+        """
+        stop = len(self) if stop is None else min(stop, len(self))
+        lo, hi = self.offsets[start], self.offsets[stop]
+        cols = remap[self.tokens[lo:hi]]
+        kept = cols >= 0
+        # line boundaries after dropping the unmapped tokens
+        kept_before = np.zeros(hi - lo + 1, dtype=np.int64)
+        np.cumsum(kept, out=kept_before[1:])
+        indptr = kept_before[self.offsets[start : stop + 1] - lo]
+        return csr_matrix(
+            (np.ones(indptr[-1], dtype=np.float32), cols[kept], indptr),
+            shape=(stop - start, n_columns),
+        )
+
+    def write(self, path):
+        """
+        writes the corpus to the directory at path, creating it if it doesn't exist
+        path: pathlib path object
+        """
+        path.mkdir(parents=True, exist_ok=True)
+        with (path / "vocab.txt").open("w") as f:
+            f.write("\n".join(self.vocab))
+        np.save(path / "offsets.npy", self.offsets)
+        np.save(path / "tokens.npy", self.tokens)
+
+    @staticmethod
+    def load(path, mmap=True):
+        """
+        reads a corpus written by TokenCorpus.write
+        path: pathlib path object to the corpus directory
+        mmap: if True the arrays are memory-mapped instead of read into memory
+        """
+        mode = "r" if mmap else None
+        offsets = np.load(path / "offsets.npy", mmap_mode=mode)
+        tokens = np.load(path / "tokens.npy", mmap_mode=mode)
+        vocab = (path / "vocab.txt").read_text().split("\n")
+        if vocab == [""]:
+            # empty corpus, the vocab file holds no words
+            vocab = []
+        return TokenCorpus(vocab, offsets, tokens)
+
+
+class TokenCorpusBuilder:
+    """
+    streams tokenized lines into a TokenCorpus, assigning ids to words in order of first appearance
+    """
+
+    def __init__(self):
+        self.word_ids = dict()
+        self._tokens = array("i")
+        self._offsets = array("q", [0])
+
+    def add(self, tokens):
+        """
+        appends a line holding tokens (list(str)) to the corpus
+        """
+        ids = self.word_ids
+        for tok in tokens:
+            i = ids.get(tok)
+            if i is None:
+                i = ids[tok] = len(ids)
+            self._tokens.append(i)
+        self._offsets.append(len(self._tokens))
+
+    def build(self):
+        """
+        returns: TokenCorpus containing every line added so far
+        """
+        return TokenCorpus(
+            list(self.word_ids),
+            np.frombuffer(self._offsets, dtype=np.int64),
+            np.frombuffer(self._tokens, dtype=np.int32),
+        )
@@ -1,4 +1,5 @@
-from multiprocessing import Pool
+from app import metrics
+from app.resources import worker_pool
 import nltk
 import re
 
@@ -11,36 +12,52 @@ r = re.compile("[a-zA-Z\.]+")
 r_html = re.compile("<.*?>")  # Match HTML tags
 r_acronym = re.compile("\.")
 
-def remove_small(line, min_size=4):
+def word_tokens(line):
+    """
+    Removes html tags and acronym periods from the input line and splits it into nltk word tokens
+    returns: list(str) - every token, in case and without a size filter
+    """
+    return nltk.word_tokenize(r_acronym.sub("", r_html.sub("", line)))
+
+
+def keep_tokens(tokens, min_size=4):
     # todo remove unicode chars from each line
     # for now, min_size=4 cleans them all
+    """
+    returns: list(str) - the tokens at least min_size long, lowercased
+    """
+    return [x.lower() for x in tokens if len(x) >= min_size]
+
+
+def tokenize_sentence(line, min_size=4):
+    """
+    Tokenizes the input line, removing tokens that are smaller than min_size
+    Removes html tags and acronyms
+    returns: list(str) - lowercased tokens
+    """
+    return keep_tokens(word_tokens(line), min_size)
+
+
+def remove_small(line, min_size=4):
     """
     Removes tokens that are smaller than min_count from the input line
     Removes html tags and acronyms
     """
-    return "{}\n".format(
-        " ".join(
-            filter(
-                lambda x: len(x) >= min_size,
-                (
-                    x.lower()
-                    for x in nltk.word_tokenize(r_acronym.sub("", r_html.sub("", line)))
-                ),
-            )
-        )
-    )
+    return "{}\n".format(" ".join(tokenize_sentence(line, min_size)))
 
 
-def initial_tokenize(in_path, out_path, workers=48, chunksize=10000):
+def initial_tokenize(in_path, out_path, workers=None, chunksize=10000, pool=None):
     """
     in_path: Path object to a scrubbed plaintext file
     out_path: Path object to the location we should write the tokenized file
     reads the file and writes a file to out_path such that every line contains a tokenized sentence
     creates file at out_path if it doesn't exist
+    workers: number of processes, defaults to the cpus available to this process
+    pool: optional multiprocessing Pool to run on (e.g. a ResourceScheduler's), workers is ignored if given
     """
-    with in_path.open() as f_in:
+    with metrics.stage("tokenize"), in_path.open() as f_in:
         with out_path.open("w") as f_out:
-            with Pool(workers) as p:
+            with worker_pool(pool, workers) as p:
                 for s_res in p.imap(remove_small, f_in, chunksize=chunksize):
                     for s in s_res:
                         f_out.write(s)
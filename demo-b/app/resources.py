@@ -0,0 +1,162 @@
+import os
+import time
+import fcntl
+import threading
+from contextlib import contextmanager
+from multiprocessing import Pool
+from pathlib import Path
+from threadpoolctl import threadpool_limits
+
+"""
+cpu budget of a node, shared by the gunicorn workers and the jobs they run
+the cores available to the process are split between at most heavy_jobs concurrent jobs on the node,
+and each job sizes its process pool, word2vec threads and BLAS threads to its share
+outside of jobs, BLAS threads are limited so every gunicorn worker can use its share of the cores for queries
+"""
+
+
+def available_cpus():
+    """
+    returns the number of cpus this process may run on
+    (its affinity mask, further capped by a cgroup v2 cpu quota, e.g. a container's --cpus)
+    """
+    if hasattr(os, "sched_getaffinity"):
+        cpus = len(os.sched_getaffinity(0))
+    else:
+        cpus = os.cpu_count() or 1
+    try:
+        quota, period = Path("/sys/fs/cgroup/cpu.max").read_text().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, -(-int(quota) // int(period))))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+
+def _limit_pool_worker():
+    """
+    initializer of pool processes: the pool already occupies every core of the job, so no BLAS threads on top
+    """
+    threadpool_limits(1)
+
+
+@contextmanager
+def worker_pool(pool=None, workers=None):
+    """
+    yields pool if given, otherwise a Pool of workers processes (default: available_cpus) that is closed on exit
+    """
+    if pool is not None:
+        yield pool
+        return
+    with Pool(workers or available_cpus(), initializer=_limit_pool_worker) as p:
+        yield p
+
+
+class ResourceScheduler:
+    """
+    sizes the work of a process from the cores available to it
+    heavy jobs hold one of heavy_jobs slots, which are POSIX locks on files in lock_dir,
+    so the cap holds across every process on the node that uses the same lock_dir
+    """
+
+    def __init__(self, lock_dir, cpus=None, heavy_jobs=1, web_workers=1):
+        """
+        lock_dir: path to the directory holding the slot lock files
+        cpus: number of cores to budget, defaults to available_cpus
+        heavy_jobs: number of heavy jobs that may run at once on the node
+        web_workers: number of gunicorn workers sharing the cores for queries
+        """
+        self.lock_dir = Path(lock_dir)
+        self.cpus = cpus or available_cpus()
+        self.heavy_jobs = max(1, heavy_jobs)
+        # cores of each heavy job
+        self.job_cpus = max(1, self.cpus // self.heavy_jobs)
+        # BLAS threads of a worker outside of heavy jobs
+        self.query_threads = max(1, self.cpus // max(1, web_workers))
+        self._lock = threading.Lock()
+        self._pid = None
+        self._pool = None
+        # slot -> fd of the slots held by this process
+        self._held = {}
+
+    def _check_fork(self):
+        """
+        forgets the pool and slots of the parent after a fork, neither belongs to this process
+        """
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._pool = None
+            self._held = {}
+
+    def limit_query_threads(self):
+        """
+        limits the BLAS threads of this process to its share of the cores
+        """
+        threadpool_limits(self.query_threads)
+
+    def pool(self):
+        """
+        returns: the persistent Pool of job_cpus processes of this process, created on first use
+        it is shared by every stage of every job instead of forking a pool per stage
+        """
+        with self._lock:
+            self._check_fork()
+            if self._pool is None:
+                self._pool = Pool(self.job_cpus, initializer=_limit_pool_worker)
+            return self._pool
+
+    def _try_slot(self):
+        """
+        returns: the number of a slot this process now holds, or None if every slot is taken
+        """
+        with self._lock:
+            self._check_fork()
+            for i in range(self.heavy_jobs):
+                # POSIX locks belong to the process, so a thread must not reopen (and on close release)
+                # a slot another thread of this process holds
+                if i in self._held:
+                    continue
+                fd = os.open(self.lock_dir / f"heavy-{i}.lock", os.O_RDWR | os.O_CREAT)
+                try:
+                    fcntl.lockf(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    os.close(fd)
+                    continue
+                self._held[i] = fd
+                return i
+        return None
+
+    def _release_slot(self, i):
+        with self._lock:
+            fd = self._held.pop(i, None)
+            if fd is not None:
+                fcntl.lockf(fd, fcntl.LOCK_UN)
+                os.close(fd)
+
+    @contextmanager
+    def heavy(self, poll=0.5):
+        """
+        waits for a free heavy job slot on the node and holds it for the duration of the block,
+        with BLAS threads limited to job_cpus
+        poll: seconds between attempts to take a slot
+        """
+        self.lock_dir.mkdir(parents=True, exist_ok=True)
+        slot = self._try_slot()
+        while slot is None:
+            time.sleep(poll)
+            slot = self._try_slot()
+        try:
+            with threadpool_limits(self.job_cpus):
+                yield
+        finally:
+            self._release_slot(slot)
+
+    def close(self):
+        """
+        shuts down the persistent pool of this process
+        """
+        with self._lock:
+            if self._pool is not None and self._pid == os.getpid():
+                self._pool.close()
+                self._pool.join()
+            self._pool = None
@@ -7,4 +7,7 @@ if [ "$1" = "--clean-start" ]; then
     export FLASK_CLEAN_START=true
 fi
 
-python3 app/run_gunicorn.py --bind localhost:5000 wsgi:app --timeout 99999999 --workers 2
+# uploads, embeddings and alignments run as background jobs, so requests return quickly
+# the app splits the cores of the node between the workers, so it needs to know how many there are
+export FLASK_WEB_WORKERS=2
+python3 app/run_gunicorn.py --bind localhost:5000 wsgi:app --timeout 300 --workers $FLASK_WEB_WORKERS
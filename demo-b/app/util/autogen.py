@@ -1,6 +1,7 @@
 import http.client
 import itertools
 import json
+import time
 import requests
 
 def upload(filepath, ptname, desc):
@@ -23,6 +24,20 @@ def upload(filepath, ptname, desc):
 
 
 
+def wait_for_job(job_id, interval=1):
+    """
+    polls a background job until it finishes, returning the job
+    """
+    url = "http://127.0.0.1:5000/getJob"
+    while True:
+        job = requests.post(url, json={"id": job_id}).json()["job"]
+        if job["status"] == "done":
+            return job
+        if job["status"] == "failed":
+            raise RuntimeError(f"job {job_id} failed: {job['error']}")
+        time.sleep(interval)
+
+
 def embed(
     conn, id, name="default word2vec", desc="vector size 100, default window size"
 ):
@@ -104,8 +119,9 @@ if __name__ == "__main__":
             filepath = os.path.join(sys.argv[1], file)
             # upload
             res = upload(filepath, file, "automatically generated description")
-            # get the id of the file
-            plaintext_ids.append(str(res["id"]))
+            # wait for the file to be indexed and get its id
+            job = wait_for_job(res["job_id"])
+            plaintext_ids.append(str(job["artifact_id"]))
     # now we have uploaded all the files, we can generate the vectors
     # embed each file with default word2vec parameters
     embedding_ids = []
@@ -113,8 +129,9 @@ if __name__ == "__main__":
         conn = http.client.HTTPConnection("127.0.0.1:5000")
         print("embedding file: " + id)
         res = embed(conn, id)
-        embedding_ids.append(str(res["id"]))
         conn.close()
+        job = wait_for_job(res["job_id"])
+        embedding_ids.append(str(job["artifact_id"]))
     # generate alignments
     print("generating alignments")
     # for every combination of embedding, generate alignments
@@ -0,0 +1,87 @@
+"""
+recall and per-query latency of the IVF index against exact blocked search
+run from demo-b:
+  python -m benchmarks.bench_ann [--words N] [--dim D] [--data clustered|gaussian]
+  python -m benchmarks.bench_ann --vectors embedding.vec (a trained embedding in word2vec text format)
+synthetic clustered data flatters the index, check recall on a real embedding before relying on a setting
+"""
+import argparse
+import time
+import numpy as np
+from app.preprocessing.neighbors import NeighborSearch
+from app.preprocessing.ivf import IVFIndex
+
+
+def make_clustered(n, dim, n_topics=500, seed=0):
+    """
+    points scattered around many topic centers
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(n_topics, dim))
+    X = centers[rng.integers(n_topics, size=n)] + rng.normal(size=(n, dim))
+    return X.astype(np.float32)
+
+
+def make_gaussian(n, dim, seed=0):
+    """
+    unclustered anisotropic gaussian: a decaying spectrum of variances along random directions
+    """
+    rng = np.random.default_rng(seed)
+    scales = 1 / np.sqrt(1 + np.arange(dim))
+    rotation = np.linalg.qr(rng.normal(size=(dim, dim)))[0]
+    return ((rng.normal(size=(n, dim)) * scales) @ rotation).astype(np.float32)
+
+
+def load_vectors(path):
+    """
+    reads an embedding in word2vec text format
+    """
+    from gensim.models import KeyedVectors
+
+    return KeyedVectors.load_word2vec_format(path).vectors.astype(np.float32)
+
+
+def main(X, k=10, n_queries=200, recall_target=0.95):
+    n, dim = X.shape
+    queries = X[np.random.default_rng(1).choice(n, n_queries, replace=False)]
+    exact = NeighborSearch(X, metric="euclidean")
+    start = time.perf_counter()
+    ref = np.vstack([exact.search(q, k)[0] for q in queries])
+    t_exact = (time.perf_counter() - start) / n_queries
+    start = time.perf_counter()
+    index = IVFIndex.build(X)
+    t_build = time.perf_counter() - start
+    n_lists = len(index.centroids)
+    print(f"{n} words x {dim} dims, {n_lists} lists built in {t_build:.2f}s")
+    print(f"{'search':>12} {'ms/query':>10} {'speedup':>8} {'recall@' + str(k):>10}")
+    print(f"{'exact':>12} {t_exact * 1000:>10.2f} {1:>7.1f}x {1:>10.3f}")
+    reached = None
+    nprobe = 1
+    while True:
+        start = time.perf_counter()
+        found = np.vstack([index.search(X, q, k, nprobe=nprobe)[0] for q in queries])
+        t = (time.perf_counter() - start) / n_queries
+        recall = np.mean([len(set(a) & set(b)) / k for a, b in zip(found, ref)])
+        print(f"{'nprobe=' + str(nprobe):>12} {t * 1000:>10.2f} {t_exact / t:>7.1f}x {recall:>10.3f}")
+        if reached is None and recall >= recall_target:
+            reached = nprobe
+        if nprobe >= n_lists or (reached is not None and nprobe >= 4 * reached):
+            break
+        nprobe = min(2 * nprobe, n_lists)
+    print(f"smallest nprobe tried with recall@{k} >= {recall_target}: {reached}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--words", type=int, default=200000)
+    parser.add_argument("--dim", type=int, default=100)
+    parser.add_argument("--data", choices=("clustered", "gaussian"), default="clustered")
+    parser.add_argument("--vectors", help="embedding in word2vec text format, instead of synthetic data")
+    args = parser.parse_args()
+    if args.vectors:
+        X = load_vectors(args.vectors)
+    elif args.data == "gaussian":
+        X = make_gaussian(args.words, args.dim)
+    else:
+        X = make_clustered(args.words, args.dim)
+    main(X)
@@ -0,0 +1,109 @@
+"""
+metadata query latency of the sqlite db under the app's access patterns
+compares a connection per request against a reused connection, queries with and without the
+schema's indexes, and reader latency while another process writes, in rollback journal and WAL mode
+run from demo-b: python -m benchmarks.bench_db [rows]
+"""
+import sys
+import time
+import sqlite3
+import tempfile
+import multiprocessing
+from pathlib import Path
+import numpy as np
+from app.database import connect, BUSY_TIMEOUT
+
+QUERY = "SELECT id, name, description FROM alignments WHERE e1_id = ? AND e2_id = ?"
+
+
+def make_db(path, rows, indexes=True):
+    with sqlite3.connect(path) as db:
+        db.executescript(Path("app/db/schema.sql").read_text())
+        if not indexes:
+            db.execute("drop index alignments_e1_id_e2_id")
+        rng = np.random.default_rng(0)
+        db.executemany(
+            "INSERT INTO alignments (name, description, e1_id, e2_id, a_path) VALUES (?, ?, ?, ?, ?)",
+            (
+                (f"a{i}", "d", int(e1), int(e2), f"app/artifacts/alignments/{i}")
+                for i, (e1, e2) in enumerate(rng.integers(1, 200, size=(rows, 2)))
+            ),
+        )
+
+
+def per_query_ms(run, n):
+    start = time.perf_counter()
+    for i in range(n):
+        run(i)
+    return (time.perf_counter() - start) / n * 1000
+
+
+def writer(path, journal_mode, stop):
+    """
+    registers rows in long transactions, like alignment jobs in the other worker
+    """
+    db = sqlite3.connect(path, timeout=BUSY_TIMEOUT)
+    db.execute(f"PRAGMA journal_mode={journal_mode}")
+    while not stop.is_set():
+        with db:
+            db.executemany(
+                "INSERT INTO jobs (kind, status, num_stages, progress, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (("alignment", "done", 4, 1.0, 0.0, 0.0) for _ in range(20000)),
+            )
+    db.close()
+
+
+def contended_latencies(path, journal_mode, seconds=2.0):
+    db = sqlite3.connect(path, timeout=BUSY_TIMEOUT)
+    db.execute(f"PRAGMA journal_mode={journal_mode}")
+    stop = multiprocessing.Event()
+    w = multiprocessing.Process(target=writer, args=(path, journal_mode, stop))
+    w.start()
+    time.sleep(0.2)
+    latencies = []
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        start = time.perf_counter()
+        db.execute(QUERY, (1, 2)).fetchall()
+        latencies.append(time.perf_counter() - start)
+    stop.set()
+    w.join()
+    db.close()
+    return np.array(latencies) * 1000
+
+
+def main(rows):
+    with tempfile.TemporaryDirectory() as tmp:
+        indexed = str(Path(tmp) / "indexed.db")
+        plain = str(Path(tmp) / "plain.db")
+        make_db(indexed, rows)
+        make_db(plain, rows, indexes=False)
+        n = 2000
+        print(f"{rows} alignments, ms per /getAlignments query")
+
+        def fresh(i):
+            db = sqlite3.connect(indexed)
+            db.execute(QUERY, (i % 200, (i * 7) % 200)).fetchall()
+            db.close()
+
+        reused = connect(indexed)
+        print(f"{'connection per request':>28} {per_query_ms(fresh, n):>8.3f}")
+        print(f"{'reused connection':>28} {per_query_ms(lambda i: reused.execute(QUERY, (i % 200, (i * 7) % 200)).fetchall(), n):>8.3f}")
+        scan = sqlite3.connect(plain)
+        print(f"{'reused, no index':>28} {per_query_ms(lambda i: scan.execute(QUERY, (i % 200, (i * 7) % 200)).fetchall(), n):>8.3f}")
+        reused.close()
+        scan.close()
+        print("reader latency (ms) while another process writes")
+        print(f"{'journal':>10} {'queries':>8} {'p50':>8} {'p99':>8} {'max':>8}")
+        for mode in ("delete", "wal"):
+            path = str(Path(tmp) / f"{mode}.db")
+            make_db(path, rows)
+            lat = contended_latencies(path, mode)
+            print(
+                f"{mode:>10} {len(lat):>8} {np.percentile(lat, 50):>8.3f} "
+                f"{np.percentile(lat, 99):>8.3f} {lat.max():>8.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -0,0 +1,44 @@
+"""
+compares word2vec training throughput when gensim reads the tokenized file itself (corpus_file)
+against feeding it sentences from a python iterator, across worker counts
+run from demo-b: python -m benchmarks.bench_embed [million words] [workers...]
+"""
+import sys
+import tempfile
+import time
+from pathlib import Path
+import numpy as np
+from app.preprocessing.generate_embeddings.embed import w2v_embed
+from app.resources import available_cpus
+
+
+def write_corpus(path, n_words, vocab=20000, sent_len=20, seed=0):
+    """
+    writes a tokenized corpus with zipf distributed words, one sentence per line
+    """
+    rng = np.random.default_rng(seed)
+    ids = np.minimum(rng.zipf(1.2, size=n_words), vocab)
+    words = np.array([f"w{i}" for i in range(vocab + 1)])
+    with path.open("w") as f:
+        for start in range(0, n_words, sent_len):
+            f.write(" ".join(words[ids[start : start + sent_len]]) + "\n")
+
+
+def main(n_words, workers):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "corpus.txt"
+        write_corpus(path, n_words)
+        print(f"{'mode':<12} {'workers':>8} {'time (s)':>9} {'words/sec':>12}")
+        for w in workers:
+            for corpus_file in (False, True):
+                start = time.perf_counter()
+                w2v_embed(path, size=100, window=5, min_count=5, wv_workers=w, corpus_file=corpus_file)
+                elapsed = time.perf_counter() - start
+                mode = "corpus_file" if corpus_file else "iterator"
+                print(f"{mode:<12} {w:>8} {elapsed:>9.2f} {n_words * 5 / elapsed:>12.0f}")
+
+
+if __name__ == "__main__":
+    n_words = int(float(sys.argv[1]) * 1e6) if len(sys.argv) > 1 else 2_000_000
+    workers = [int(a) for a in sys.argv[2:]] or sorted({1, available_cpus()})
+    main(n_words, workers)
@@ -0,0 +1,81 @@
+"""
+times noise-aware EM alignment against the per-word loop implementation it replaced
+run from demo-b: python -m benchmarks.bench_noise_aware [sizes...]
+"""
+import sys
+import time
+import numpy as np
+from scipy.linalg import orthogonal_procrustes
+from app.preprocessing.generate_examples.alignment.noise_aware_align import noise_aware
+
+
+def loop_P(Y, dim, mu, s):
+    C = -dim / 2 * (np.log(2 * np.pi * s))
+    exp = -0.5 * np.einsum(
+        "ij, ij -> i", Y - mu, np.dot(np.eye(dim) * (1 / s), (Y - mu).T).T
+    )
+    return C + exp
+
+
+def loop_noise_aware(X, Y, is_soft=True):
+    """
+    the original soft EM, with per-word generator sums in the M-step
+    """
+    n, dim = X.shape
+    Q, _ = orthogonal_procrustes(X, Y)
+    sigma = np.linalg.norm(np.dot(X, Q) - Y) ** 2 / (n * dim)
+    muy = np.mean(Y, axis=0)
+    sigmay = np.var(Y)
+    alpha = 0.5
+    prev_alpha = -1
+    while abs(alpha - prev_alpha) > 0.01:
+        prev_alpha = alpha
+        nom = np.log(alpha) + loop_P(Y, dim, np.dot(X, Q), sigma)
+        sup = np.log((1 - alpha)) + loop_P(Y, dim, muy, sigmay)
+        m = max(nom)
+        ws = np.exp(nom - m) / (np.exp(nom - m) + np.exp(sup - m))
+        ws = np.where(np.isnan(ws), 0, ws)
+        sum_ws = float(sum(ws))
+        alpha = sum_ws / float(n)
+        Q, _ = orthogonal_procrustes(
+            np.multiply(np.array(ws).reshape((n, 1)), X),
+            np.multiply(np.array(ws).reshape((n, 1)), Y),
+        )
+        sigma = sum(
+            np.linalg.norm(np.dot(X[i, :], Q) - Y[i, :]) ** 2 * ws[i] for i in range(0, n)
+        ) / (sum_ws * dim)
+        muy = sum(Y[i, :] * (1 - ws[i]) for i in range(0, n)) / (n - sum_ws)
+        sigmay = sum(
+            np.linalg.norm(muy - Y[i, :]) ** 2 * (1 - ws[i]) for i in range(0, n)
+        ) / ((n - sum_ws) * dim)
+    return np.asarray(Q), alpha
+
+
+def make_pair(n, dim=100, noise=0.2, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n, dim))
+    R, _ = np.linalg.qr(rng.normal(size=(dim, dim)))
+    Y = np.dot(X, R) + 0.05 * rng.normal(size=(n, dim))
+    k = int(n * noise)
+    Y[:k] = rng.normal(size=(k, dim))
+    return X, Y
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    out = fn(*args)
+    return time.perf_counter() - start, out
+
+
+def main(sizes):
+    print(f"{'words':>8} {'loop (s)':>10} {'vectorized (s)':>15} {'speedup':>8} {'max |dQ|':>10}")
+    for n in sizes:
+        X, Y = make_pair(n)
+        t_loop, (Q_loop, _) = timed(loop_noise_aware, X, Y, True)
+        t_vec, (Q_vec, *_) = timed(noise_aware, X, Y, True)
+        err = np.abs(Q_loop - Q_vec).max()
+        print(f"{n:>8} {t_loop:>10.3f} {t_vec:>15.3f} {t_loop / t_vec:>7.1f}x {err:>10.2e}")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [1000, 5000, 20000])
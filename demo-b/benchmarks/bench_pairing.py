@@ -0,0 +1,50 @@
+"""
+times example-sentence pairing against the argpartition + python loop it replaced
+run from demo-b: python -m benchmarks.bench_pairing [occurrences...]
+"""
+import sys
+import time
+import numpy as np
+from sklearn.metrics.pairwise import cosine_similarity
+from app.preprocessing.generate_examples import pairing
+
+
+def loop_pairs(A, B, max_sent=1000):
+    """
+    the original pairing: the max_sent least similar entries of the full matrix, made one-to-one in a loop
+    """
+    max_sent = min(max_sent, len(A), len(B))
+    indices = np.argpartition(cosine_similarity(A, B), max_sent, axis=None)[:max_sent]
+    rows, cols, used_i, used_j = [], [], set(), set()
+    for ind in indices:
+        i, j = np.unravel_index(ind, (len(A), len(B)))
+        if i not in used_i and j not in used_j:
+            rows.append(i)
+            cols.append(j)
+            used_i.add(i)
+            used_j.add(j)
+    return rows, cols
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    out = fn(*args, **kwargs)
+    return time.perf_counter() - start, out
+
+
+def main(sizes, dim=100, max_sent=1000):
+    rng = np.random.default_rng(0)
+    print(f"{'occurrences':>12} {'method':>8} {'time (s)':>9} {'pairs':>6} {'mean sim':>9}")
+    for n in sizes:
+        A = rng.normal(size=(n, dim)).astype(np.float32)
+        B = rng.normal(size=(n, dim)).astype(np.float32)
+        t, (rows, cols) = timed(loop_pairs, A, B, max_sent)
+        sims = pairing.cosine_similarities(A, B)
+        print(f"{n:>12} {'loop':>8} {t:>9.3f} {len(rows):>6} {sims[rows, cols].mean():>9.3f}")
+        for method in pairing.METHODS:
+            t, (rows, cols, s) = timed(pairing.dissimilar_pairs, A, B, max_sent, method=method)
+            print(f"{n:>12} {method:>8} {t:>9.3f} {len(rows):>6} {s.mean():>9.3f}")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [500, 2000])
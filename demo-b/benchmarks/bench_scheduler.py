@@ -0,0 +1,54 @@
+"""
+cost of starting a process pool per pipeline stage against reusing the scheduler's persistent pool,
+on small uploads where forking the pool dominates
+run from demo-b: python -m benchmarks.bench_scheduler [uploads] [lines per upload]
+"""
+import sys
+import tempfile
+import time
+from pathlib import Path
+import numpy as np
+from app.preprocessing.ingest import ingest
+from app.resources import ResourceScheduler, available_cpus
+
+
+def write_upload(path, n_lines, vocab=5000, seed=0):
+    """
+    writes a plaintext of n_lines lines holding two sentences each
+    """
+    rng = np.random.default_rng(seed)
+    words = np.array([f"word{i}" for i in range(vocab)])
+    with path.open("w") as f:
+        for _ in range(n_lines):
+            a, b = words[rng.integers(0, vocab, size=(2, 12))]
+            f.write(" ".join(a) + ". " + " ".join(b) + ".\n")
+
+
+def run(uploads, tmp, **kwargs):
+    start = time.perf_counter()
+    for i, up in enumerate(uploads):
+        ingest(up, tmp / f"s{i}.txt", tmp / f"t{i}.txt", **kwargs)
+    return time.perf_counter() - start
+
+
+def main(n_uploads, n_lines):
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        uploads = [tmp / f"upload{i}.txt" for i in range(n_uploads)]
+        for i, up in enumerate(uploads):
+            write_upload(up, n_lines, seed=i)
+        scheduler = ResourceScheduler(tmp / "locks")
+        print(f"{n_uploads} uploads of {n_lines} lines, {available_cpus()} cpus")
+        print(f"{'pool':<24} {'processes':>9} {'time (s)':>9}")
+        print(f"{'fresh per stage':<24} {48:>9} {run(uploads, tmp, workers=48):>9.2f}")
+        print(f"{'fresh per stage':<24} {scheduler.job_cpus:>9} {run(uploads, tmp, workers=scheduler.job_cpus):>9.2f}")
+        # the pool is forked once, before the first upload
+        print(f"{'persistent':<24} {scheduler.job_cpus:>9} {run(uploads, tmp, pool=scheduler.pool()):>9.2f}")
+        scheduler.close()
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 20,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 200,
+    )
@@ -0,0 +1,56 @@
+"""
+measures what a gunicorn worker pays to import the flask app
+each measurement imports app.demo_app in a fresh interpreter and reports wall time and peak RSS,
+with and without the s4 backend's heavy dependencies (tensorflow, keras, matplotlib, seaborn),
+which every worker used to import eagerly through align.py
+run from demo-b: python -m benchmarks.bench_startup [repeats]
+"""
+import os
+import subprocess
+import sys
+
+CHILD = """
+import resource, sys, time
+start = time.perf_counter()
+import app.demo_app
+{extra}
+elapsed = time.perf_counter() - start
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(elapsed, rss, int("tensorflow" in sys.modules), int("matplotlib" in sys.modules))
+"""
+
+CASES = [
+    ("app", ""),
+    (
+        "app + s4 deps",
+        "import tensorflow, tensorflow.keras, matplotlib.pyplot, seaborn",
+    ),
+]
+
+
+def measure(extra):
+    env = dict(os.environ, FLASK_CLEAN_START="false", TF_CPP_MIN_LOG_LEVEL="3")
+    env["PYTHONPATH"] = os.pathsep.join(["app", ".", env.get("PYTHONPATH", "")])
+    out = subprocess.run(
+        [sys.executable, "-c", CHILD.format(extra=extra)],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout.split()
+    elapsed, rss, tf, mpl = out[-4:]
+    return float(elapsed), int(rss) / 1024, bool(int(tf)), bool(int(mpl))
+
+
+def main(repeats):
+    print(f"{'imports':<18} {'time (s)':>9} {'peak RSS (MB)':>14} {'tensorflow':>11} {'matplotlib':>11}")
+    for name, extra in CASES:
+        runs = [measure(extra) for _ in range(repeats)]
+        elapsed = min(r[0] for r in runs)
+        rss = min(r[1] for r in runs)
+        _, _, tf, mpl = runs[0]
+        print(f"{name:<18} {elapsed:>9.2f} {rss:>14.0f} {str(tf):>11} {str(mpl):>11}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 3)
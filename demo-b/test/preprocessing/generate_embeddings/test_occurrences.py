@@ -0,0 +1,63 @@
+import unittest
+import tempfile
+from pathlib import Path
+from app.preprocessing.generate_embeddings.occurrences import (
+    OccurrenceIndex,
+    OccurrenceIndexBuilder,
+)
+
+LINES = [
+    "the quick brown fox",
+    "the lazy dog",
+    "",
+    "quick quick dog",
+    "the fox",
+]
+
+
+class OccurrenceIndexTest(unittest.TestCase):
+    def build(self, limit=2000):
+        builder = OccurrenceIndexBuilder(limit)
+        for i, line in enumerate(LINES):
+            builder.add(i, line.split())
+        return builder.build()
+
+    def test_postings_match_dict_of_sets(self):
+        index = self.build()
+        expected = dict()
+        for i, line in enumerate(LINES):
+            for tok in line.split():
+                expected.setdefault(tok, set()).add(i)
+        assert set(index.vocab) == set(expected)
+        for w, lines in expected.items():
+            assert list(index[w]) == sorted(lines)
+        assert "cat" not in index
+        with self.assertRaises(KeyError):
+            index["cat"]
+
+    def test_limit_keeps_first_lines(self):
+        index = self.build(limit=2)
+        assert list(index["the"]) == [0, 1]
+        assert list(index["dog"]) == [1, 3]
+        assert list(index["fox"]) == [0, 4]
+
+    def test_write_and_load_memory_mapped(self):
+        index = self.build()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "occ"
+            index.write(path)
+            loaded = OccurrenceIndex.load(path)
+            assert loaded.vocab == index.vocab
+            for w in index.vocab:
+                assert list(loaded[w]) == list(index[w])
+
+    def test_empty_index_round_trips(self):
+        index = OccurrenceIndexBuilder().build()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "occ"
+            index.write(path)
+            assert len(OccurrenceIndex.load(path)) == 0
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+import unittest
+import tempfile
+from pathlib import Path
+import numpy as np
+from app.preprocessing.WordVectors import WordVectors
+from app.preprocessing.token_corpus import TokenCorpusBuilder
+from app.preprocessing.generate_embeddings import sentence_vectors
+
+LINES = [
+    "the quick brown fox",
+    "the lazy dog",
+    "",
+    "quick quick unknown dog",
+    "the fox",
+]
+
+
+class SentenceVectorsTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+        builder = TokenCorpusBuilder()
+        for line in LINES:
+            builder.add(line.split())
+        self.corpus = builder.build()
+        words = ["the", "quick", "brown", "fox", "lazy", "dog"]
+        rng = np.random.default_rng(0)
+        self.wv = WordVectors(words, rng.normal(size=(len(words), 4)), centered=False)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_rows_are_sums_of_word_vectors(self):
+        expected = np.zeros((len(LINES), 4), dtype=np.float32)
+        for i, line in enumerate(LINES):
+            for tok in line.split():
+                if tok in self.wv:
+                    expected[i] += self.wv[tok]
+        # small chunks so lines are embedded across several chunks
+        for chunksize in (2, 100):
+            path = self.dir / f"sv{chunksize}.npy"
+            sentence_vectors.build(self.corpus, self.wv, path, chunksize=chunksize)
+            sv = sentence_vectors.load(path)
+            assert isinstance(sv, np.memmap)
+            assert sv.dtype == self.wv.vectors.dtype
+            assert np.allclose(sv, expected, atol=1e-6)
+
+
+if __name__ == "__main__":
+    unittest.main()
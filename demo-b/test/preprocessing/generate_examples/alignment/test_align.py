@@ -0,0 +1,125 @@
+import unittest
+import tempfile
+from pathlib import Path
+from unittest import mock
+import numpy as np
+from sklearn.metrics import pairwise_distances
+from sklearn.metrics.pairwise import cosine_similarity
+from app.preprocessing.Vocabulary import Vocabulary
+from app.preprocessing.generate_examples.alignment.align import Alignment
+
+
+class AlignmentTest(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.n = 50
+        self.common = Vocabulary([f"w{i}" for i in range(self.n)])
+        self.v1 = rng.normal(size=(self.n, 8))
+        self.v2 = rng.normal(size=(self.n, 8))
+
+    def test_get_context_matches_dense_distances(self):
+        dists = pairwise_distances(self.v1, self.v2)
+        for first in (True, False):
+            words, distances, vectors, iv = Alignment.get_context(
+                self.common, self.v1, self.v2, "w3", first, 5
+            )
+            row = dists[3, :] if first else dists[:, 3]
+            expected = np.argsort(row)[:5]
+            assert list(words) == [self.common[i] for i in expected]
+            assert np.allclose(distances, row[expected])
+            assert np.allclose(iv, self.v1[3] if first else self.v2[3])
+
+    def test_get_context_all_neighbors(self):
+        words, _, _, _ = Alignment.get_context(
+            self.common, self.v1, self.v2, "w0", True, self.n
+        )
+        assert sorted(words) == sorted(self.common)
+
+    def test_get_context_unknown_word(self):
+        with self.assertRaises(ValueError):
+            Alignment.get_context(self.common, self.v1, self.v2, "missing", True, 5)
+
+    def alignment(self):
+        shifts = np.linalg.norm(self.v1 - self.v2, axis=1)
+        return Alignment(self.common, self.v1, self.v2, shifts, np.eye(8))
+
+    def test_shifted_words_pages(self):
+        a = self.alignment()
+        order = np.argsort(-a.shifts)
+        expected = [(self.common[i], a.shifts[i]) for i in order]
+        pages = [a.shifted_words(offset, 7) for offset in range(0, self.n, 7)]
+        got = [w for page in pages for w in page]
+        assert [w for w, _ in got] == [w for w, _ in expected]
+        assert np.allclose([s for _, s in got], [s for _, s in expected])
+        least = a.shifted_words(2, 5, most=False)
+        assert [w for w, _ in least] == [w for w, _ in expected[::-1][2:7]]
+        assert a.shifted_words(self.n, 5) == []
+        assert a.shifted_words(self.n, 5, most=False) == []
+        assert len(a.shifted_words(self.n - 3, 10, most=False)) == 3
+        with self.assertRaises(ValueError):
+            a.shifted_words(-1, 5)
+
+    def test_get_random_sentence(self):
+        rng = np.random.default_rng(1)
+        sv1 = rng.normal(size=(20, 8))
+        sv2 = rng.normal(size=(30, 8))
+        Q = np.linalg.qr(rng.normal(size=(8, 8)))[0]
+        occ1 = {"w": [1, 4, 7, 9]}
+        occ2 = {"w": [0, 3, 5, 8, 12, 20, 29]}
+        with tempfile.TemporaryDirectory() as tmp:
+            p1, p2 = Path(tmp) / "s1.txt", Path(tmp) / "s2.txt"
+            p1.write_text("".join(f"a{i}\n" for i in range(20)))
+            p2.write_text("".join(f"b{i}\n" for i in range(30)))
+            ts, sents = Alignment.get_random_sentence("w", occ1, occ2, p1, p2, Q, sv1, sv2, 4, seed=3)
+            # the same seed picks the same sentence
+            assert (ts, sents) == Alignment.get_random_sentence(
+                "w", occ1, occ2, p1, p2, Q, sv1, sv2, 4, seed=3
+            )
+            i = int(ts[1:])
+            sims = cosine_similarity((sv1[i] @ Q).reshape(1, -1), sv2[occ2["w"]])[0]
+            expected = [f"b{occ2['w'][j]}\n" for j in np.argsort(sims)[:4]]
+            assert sents == expected
+            # more neighbors than sentences returns every sentence
+            _, sents = Alignment.get_random_sentence("w", occ1, occ2, p1, p2, Q, sv1, sv2, 100, seed=3)
+            assert len(sents) == len(occ2["w"])
+
+    def test_bundle_round_trip(self):
+        a = self.alignment()
+        a.build_indices(n_lists=4)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "alignment"
+            a.write(path)
+            # only the bundle is left in the parent directory
+            assert [p.name for p in Path(tmp).iterdir()] == ["alignment"]
+            loaded = Alignment.load(path)
+            assert isinstance(loaded.v1, np.memmap)
+            assert list(loaded.common) == list(self.common)
+            for name in ("v1", "v2", "shifts", "ranking", "Q"):
+                assert np.array_equal(getattr(loaded, name), getattr(a, name))
+            assert np.array_equal(loaded.index1.ids, a.index1.ids)
+            assert np.array_equal(loaded.index2.centroids, a.index2.centroids)
+            # approximate search through the loaded index
+            words, _, _, _ = Alignment.get_context(
+                loaded.common, loaded.v1, loaded.v2, "w3", True, 5, index=loaded.index2, nprobe=4
+            )
+            assert len(words) == 5
+
+    def test_bundle_without_indices(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "alignment"
+            self.alignment().write(path)
+            loaded = Alignment.load(path, mmap=False)
+            assert loaded.index1 is None and loaded.index2 is None
+            assert not isinstance(loaded.v2, np.memmap)
+
+    def test_failed_write_leaves_nothing(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "alignment"
+            with mock.patch("numpy.save", side_effect=OSError("disk full")):
+                with self.assertRaises(OSError):
+                    self.alignment().write(path)
+            assert list(Path(tmp).iterdir()) == []
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+import unittest
+import numpy as np
+from scipy.linalg import orthogonal_procrustes
+import app.preprocessing.generate_examples.alignment.noise_aware_align as na
+
+
+def P_reference(Y, dim, mu, s):
+    """
+    the original dense-covariance gaussian log probability
+    """
+    C = -dim / 2 * (np.log(2 * np.pi * s))
+    exp = -0.5 * np.einsum(
+        "ij, ij -> i", Y - mu, np.dot(np.eye(dim) * (1 / s), (Y - mu).T).T
+    )
+    return C + exp
+
+
+def EM_aux_reference(X, Y, alpha, Q, sigma, muy, sigmay, is_soft):
+    """
+    the original per-word loop implementation of EM_aux
+    """
+    n, dim = X.shape
+    prev_alpha = -1
+    while abs(alpha - prev_alpha) > 0.01:
+        prev_alpha = alpha
+        nom = np.log(alpha) + P_reference(Y, dim, np.dot(X, Q), sigma)
+        sup = np.log((1 - alpha)) + P_reference(Y, dim, muy, sigmay)
+        m = max(nom)
+        ws = np.exp(nom - m) / (np.exp(nom - m) + np.exp(sup - m))
+        ws = np.where(np.isnan(ws), 0, ws)
+        if is_soft:
+            sum_ws = float(sum(ws))
+            alpha = sum_ws / float(n)
+            Q, _ = orthogonal_procrustes(
+                np.multiply(np.array(ws).reshape((n, 1)), X),
+                np.multiply(np.array(ws).reshape((n, 1)), Y),
+            )
+            sigma = sum(
+                np.linalg.norm(np.dot(X[i, :], Q) - Y[i, :]) ** 2 * ws[i]
+                for i in range(0, n)
+            ) / (sum_ws * dim)
+            muy = sum(Y[i, :] * (1 - ws[i]) for i in range(0, n)) / (n - sum_ws)
+            sigmay = sum(
+                np.linalg.norm(muy - Y[i, :]) ** 2 * (1 - ws[i]) for i in range(0, n)
+            ) / ((n - sum_ws) * dim)
+        else:
+            t_indices = np.where(np.asarray(ws) >= 0.5)[0]
+            f_indices = np.where(np.asarray(ws) < 0.5)[0]
+            alpha = float(len(t_indices)) / float(n)
+            Q, _ = orthogonal_procrustes(X[t_indices], Y[t_indices])
+            sigma = sum(
+                np.linalg.norm(np.dot(X[i, :], Q) - Y[i, :]) ** 2 for i in t_indices
+            ) / (len(t_indices) * dim)
+            muy = sum(Y[i, :] for i in f_indices) / len(f_indices)
+            sigmay = sum(np.linalg.norm(muy - Y[i, :]) ** 2 for i in f_indices) / (
+                len(f_indices) * dim
+            )
+    t_indices = np.where(np.asarray(ws) >= 0.5)[0]
+    f_indices = np.where(np.asarray(ws) < 0.5)[0]
+    return np.asarray(Q), alpha, t_indices, f_indices
+
+
+def noisy_pair(n=300, dim=10, noisy=60, seed=0):
+    """
+    Y is a rotation of X plus small noise, except for the first noisy rows which are random
+    """
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n, dim))
+    R, _ = np.linalg.qr(rng.normal(size=(dim, dim)))
+    Y = np.dot(X, R) + 0.05 * rng.normal(size=(n, dim))
+    Y[:noisy] = rng.normal(size=(noisy, dim))
+    return X, Y
+
+
+class NoiseAwareAlignTest(unittest.TestCase):
+    def test_P_matches_dense_covariance(self):
+        X, Y = noisy_pair()
+        mu = Y.mean(axis=0)
+        assert np.allclose(na.P(Y, Y.shape[1], mu, 0.7), P_reference(Y, Y.shape[1], mu, 0.7))
+
+    def test_matches_reference_implementation(self):
+        X, Y = noisy_pair()
+        n, dim = X.shape
+        Q0, _ = orthogonal_procrustes(X, Y)
+        start = (0.5, Q0, np.linalg.norm(np.dot(X, Q0) - Y) ** 2 / (n * dim), Y.mean(axis=0), np.var(Y))
+        for is_soft in (True, False):
+            Q, alpha, t, f = na.EM_aux(X, Y, *start, is_soft)
+            Q_r, alpha_r, t_r, f_r = EM_aux_reference(X, Y, *start, is_soft)
+            assert np.allclose(Q, Q_r)
+            assert np.isclose(alpha, alpha_r)
+            assert np.array_equal(t, t_r)
+            assert np.array_equal(f, f_r)
+
+    def test_flags_noisy_pairs(self):
+        X, Y = noisy_pair()
+        Q, alpha, t, f = na.noise_aware(X, Y, is_soft=True)
+        assert set(f) == set(range(60))
+        assert np.isclose(alpha, 240 / 300, atol=0.01)
+
+
+if __name__ == "__main__":
+    unittest.main()
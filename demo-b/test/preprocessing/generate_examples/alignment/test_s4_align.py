@@ -2,16 +2,70 @@ import unittest
 import numpy as np
 from app.preprocessing.WordVectors import WordVectors
 import app.preprocessing.generate_examples.alignment.s4_align as s4_align
-from scipy.spatial.distance import cosine, euclidean
+from scipy.spatial.distance import cosine
 
 
 class S4AlignTest(unittest.TestCase):
     def setUp(self):
-        pass
+        np.random.seed(0)
+        rng = np.random.default_rng(0)
+        self.n = 200
+        self.dim = 8
+        self.words = [f"word{i:03d}" for i in range(self.n)]
+        v1 = rng.normal(size=(self.n, self.dim))
+        R, _ = np.linalg.qr(rng.normal(size=(self.dim, self.dim)))
+        v2 = np.dot(v1, R) + 0.01 * rng.normal(size=(self.n, self.dim))
+        # the first 20 words change meaning
+        v2[:20] = rng.normal(size=(20, self.dim))
+        self.wv1 = WordVectors(self.words, v1)
+        self.wv2 = WordVectors(self.words, v2)
 
     def tearDown(self):
         pass
 
+    def test_cosine_rows(self):
+        A = np.random.normal(size=(10, self.dim))
+        B = np.random.normal(size=(10, self.dim))
+        assert np.allclose(s4_align.cosine_rows(A, B), [cosine(u, v) for u, v in zip(A, B)])
+
+    def test_get_features(self):
+        x = np.random.normal(size=(10, 2 * self.dim))
+        expected = [[cosine(p[: self.dim], p[self.dim :])] for p in x]
+        assert np.allclose(s4_align.get_features(x), expected)
+
+    def test_inject_change(self):
+        V = self.wv2.vectors
+        targets = np.array([3, 50, 50, 120])
+        v_a = self.wv1.vectors[targets]
+        cos_t = s4_align.cosine_rows(v_a, V[targets])
+        # replacing a target moves it at least as far from its parallel vector, unless it ran out of tries
+        v_b = s4_align.inject_change(V, targets, v_a, 0, replace=True, max_tries=500)
+        assert v_b.shape == (len(targets), self.dim)
+        assert np.all(s4_align.cosine_rows(v_a, v_b) >= cos_t)
+        # every injected vector is some word's vector
+        for v in v_b:
+            assert np.any(np.all(np.isclose(V, v), axis=1))
+        # no change at rate 0
+        v_b = s4_align.inject_change(V, targets, v_a, 0)
+        assert np.allclose(v_b, V[targets])
+
+    def test_s4_finds_changed_words(self):
+        landmarks, non_landmarks, Q = s4_align.s4(
+            self.wv1, self.wv2, cls_model="svm_features", iters=5, n_targets=20, n_negatives=20, rate=1
+        )
+        assert len(landmarks) + len(non_landmarks) <= self.n
+        assert not set(landmarks) & set(non_landmarks)
+        # the changed words should mostly be classified as non landmarks
+        assert len(set(self.words[:20]) & set(non_landmarks)) > 10
+        assert Q.shape == (self.dim, self.dim)
+
+    def test_s4_nn(self):
+        landmarks, non_landmarks, Q = s4_align.s4(
+            self.wv1, self.wv2, cls_model="nn", iters=3, n_targets=10, n_negatives=10
+        )
+        assert set(landmarks) | set(non_landmarks) <= set(self.words)
+        assert not set(landmarks) & set(non_landmarks)
+
 
 if __name__ == "__main__":
     unittest.main()
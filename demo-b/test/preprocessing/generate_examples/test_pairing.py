@@ -0,0 +1,63 @@
+import unittest
+import numpy as np
+from sklearn.metrics.pairwise import cosine_similarity
+from app.preprocessing.generate_examples import pairing
+
+
+def sorted_greedy(sims, max_pairs):
+    """reference: walk every pair from least to most similar, keeping pairs of unused rows and columns"""
+    used_i, used_j, pairs = set(), set(), []
+    for ind in np.argsort(sims, axis=None, kind="stable"):
+        i, j = np.unravel_index(ind, sims.shape)
+        if i not in used_i and j not in used_j:
+            pairs.append((i, j))
+            used_i.add(i)
+            used_j.add(j)
+    return pairs[:max_pairs]
+
+
+class PairingTest(unittest.TestCase):
+    def setUp(self):
+        self.rng = np.random.default_rng(0)
+
+    def test_cosine_similarities(self):
+        A = self.rng.normal(size=(30, 8))
+        B = self.rng.normal(size=(20, 8))
+        # a budget small enough to split A into several blocks
+        sims = pairing.cosine_similarities(A, B, scratch_bytes=B.nbytes * 2)
+        assert sims.dtype == np.float32
+        assert np.allclose(sims, cosine_similarity(A, B), atol=1e-5)
+
+    def test_greedy_matches_sorted_walk(self):
+        for n1, n2, max_pairs in ((50, 70, 10), (70, 50, 100), (30, 30, 30), (1, 1, 1), (200, 150, 5)):
+            sims = pairing.cosine_similarities(
+                self.rng.normal(size=(n1, 16)), self.rng.normal(size=(n2, 16))
+            )
+            rows, cols = pairing.greedy_pairs(sims, max_pairs)
+            assert list(zip(rows, cols)) == sorted_greedy(sims, max_pairs)
+
+    def test_optimal_pairs(self):
+        sims = pairing.cosine_similarities(self.rng.normal(size=(40, 8)), self.rng.normal(size=(30, 8)))
+        rows, cols = pairing.optimal_pairs(sims, 30)
+        assert len(set(rows)) == len(set(cols)) == 30
+        # the optimal pairing is never more similar in total than the greedy one
+        g_rows, g_cols = pairing.greedy_pairs(sims, 30)
+        assert sims[rows, cols].sum() <= sims[g_rows, g_cols].sum() + 1e-5
+
+    def test_dissimilar_pairs(self):
+        A = self.rng.normal(size=(25, 8))
+        B = self.rng.normal(size=(35, 8))
+        for method in pairing.METHODS:
+            rows, cols, sims = pairing.dissimilar_pairs(A, B, 10, method=method)
+            assert len(rows) == 10
+            assert np.all(np.diff(sims) >= 0)
+        with self.assertRaises(ValueError):
+            pairing.dissimilar_pairs(A, B, 10, method="random")
+
+    def test_empty(self):
+        rows, cols, sims = pairing.dissimilar_pairs(np.zeros((0, 4)), np.ones((3, 4)), 5)
+        assert len(rows) == len(cols) == len(sims) == 0
+
+
+if __name__ == "__main__":
+    unittest.main()
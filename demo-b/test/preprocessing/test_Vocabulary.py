@@ -0,0 +1,44 @@
+import unittest
+import pickle
+import numpy as np
+from app.preprocessing.Vocabulary import Vocabulary
+
+
+class VocabularyTest(unittest.TestCase):
+    def setUp(self):
+        self.words = "the quick brown fox jumps over lazy dog".split()
+        self.vocab = Vocabulary(self.words)
+
+    def test_lookups(self):
+        assert len(self.vocab) == len(self.words)
+        for i, w in enumerate(self.words):
+            assert w in self.vocab
+            assert self.vocab.get_id(w) == i
+            assert self.vocab.get_word(i) == w
+            assert self.vocab[i] == w
+        assert "cat" not in self.vocab
+        assert self.vocab.get_id("cat") is None
+        assert self.vocab.get_word(len(self.words)) is None
+        assert list(self.vocab.get_ids(["dog", "the"])) == [7, 0]
+        with self.assertRaises(KeyError):
+            self.vocab.get_ids(["cat"])
+
+    def test_words_are_shared_and_read_only(self):
+        words = self.vocab.get_words()
+        assert list(words) == self.words
+        assert words is self.vocab.get_words()
+        with self.assertRaises(ValueError):
+            words[0] = "a"
+
+    def test_pickle(self):
+        loaded = pickle.loads(pickle.dumps(self.vocab))
+        assert list(loaded) == self.words
+        assert loaded.get_id("fox") == 3
+
+    def test_duplicate_words(self):
+        with self.assertRaises(AssertionError):
+            Vocabulary(["a", "b", "a"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,7 @@
 import unittest
+import tempfile
 from pathlib import Path
+import numpy as np
 from app.preprocessing.WordVectors import WordVectors
 
 
@@ -7,8 +9,100 @@ class WordVectorsTest(unittest.TestCase):
     def test_wordvectors_initialization_from_disk(self):
         input_path = Path("test/test_data/wordvectors_short.txt")
         wv = WordVectors.from_file(input_path)
-        # todo test wordvectors
-        assert True
+        # the file has no header line, so every line is a word
+        assert len(wv) == 13
+        assert wv.get_words()[0] == "that"
+        assert wv.get_vector_dimension() == 100
+
+    def test_text_file_with_header(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "wv.txt"
+            path.write_text("2 3\na 1 2 3\nb 4 5 6\n")
+            wv = WordVectors.from_file(path)
+            assert list(wv.get_words()) == ["a", "b"]
+
+    def test_binary_round_trip(self):
+        wv = WordVectors.from_file(Path("test/test_data/wordvectors_short.txt"))
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "wv"
+            wv.to_file(path)
+            for mmap in (False, True):
+                loaded = WordVectors.from_file(path, mmap=mmap)
+                assert list(loaded.get_words()) == list(wv.get_words())
+                assert np.array_equal(loaded.vectors, wv.vectors)
+            # memory-mapped vectors are not copied into memory
+            assert not WordVectors.from_file(path, mmap=True).vectors.flags.owndata
+
+    def test_text_round_trip(self):
+        wv = WordVectors.from_file(Path("test/test_data/wordvectors_short.txt"))
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "wv.txt"
+            wv.to_text_file(path)
+            loaded = WordVectors.from_file(path)
+            assert list(loaded.get_words()) == list(wv.get_words())
+            # re-centering already centered vectors is a no-op (up to float32 rounding)
+            assert np.allclose(loaded.vectors, wv.vectors, atol=1e-6)
+
+    def test_dtype(self):
+        vectors = np.arange(12, dtype=np.float64).reshape(4, 3)
+        wv = WordVectors(list("abcd"), vectors)
+        assert wv.vectors.dtype == np.float32
+        wv = WordVectors(list("abcd"), vectors, dtype=np.float64)
+        assert wv.vectors.dtype == np.float64
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "wv"
+            wv.to_file(path)
+            assert WordVectors.from_file(path).vectors.dtype == np.float32
+            assert WordVectors.from_file(path, dtype=np.float64).vectors.dtype == np.float64
+
+    def test_center_and_normalize_in_place(self):
+        vectors = np.arange(12, dtype=np.float32).reshape(4, 3)
+        original = vectors.copy()
+        wv = WordVectors(list("abcd"), vectors, normalized=True)
+        # the caller's array is left alone
+        assert np.array_equal(vectors, original)
+        centered = original - original.mean(axis=0)
+        expected = centered / np.linalg.norm(centered, axis=1, keepdims=True)
+        assert np.allclose(wv.vectors, expected)
+        # read-only (memory-mapped) vectors are copied before being transformed
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "wv"
+            WordVectors(list("abcd"), original, centered=False).to_file(path)
+            wv = WordVectors.from_file(path, mmap=True)
+            wv.center()
+            assert np.allclose(wv.vectors, centered)
+            assert np.array_equal(np.load(path / "vectors.npy"), original)
+
+    def make_wvs(self):
+        rng = np.random.default_rng(0)
+        words = [["a", "b", "c", "d"], ["d", "x", "b", "a"], ["b", "y", "d", "a", "z"]]
+        return [
+            WordVectors(w, rng.normal(size=(len(w), 3)), centered=False, dtype=np.float64)
+            for w in words
+        ]
+
+    def test_intersect(self):
+        wvs = self.make_wvs()
+        out = WordVectors.intersect(*wvs)
+        assert len(out) == 3
+        for wv, o in zip(wvs, out):
+            # order of the first input
+            assert list(o.get_words()) == ["a", "b", "d"]
+            expected = np.array([wv[w] for w in ["a", "b", "d"]])
+            assert np.allclose(o.vectors, expected - expected.mean(axis=0))
+
+    def test_union(self):
+        wvs = self.make_wvs()
+        out = WordVectors.union(*wvs)
+        # order of first appearance
+        words = ["a", "b", "c", "d", "x", "y", "z"]
+        assert list(out.get_words()) == words
+        expected = np.array([np.mean([wv[w] for wv in wvs if w in wv], axis=0) for w in words])
+        assert np.allclose(out.vectors, expected - expected.mean(axis=0))
+        # a custom combining function goes through the same gathered rows
+        out = WordVectors.union(*wvs, f=lambda x: x.max(axis=0))
+        expected = np.array([np.max([wv[w] for wv in wvs if w in wv], axis=0) for w in words])
+        assert np.allclose(out.vectors, expected - expected.mean(axis=0))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,69 @@
+import unittest
+import tempfile
+from pathlib import Path
+import nltk
+from app.preprocessing import ingest, line_index
+from app.preprocessing.sentencize import initial_scrub
+from app.preprocessing.tokenize import initial_tokenize
+from app.preprocessing.generate_embeddings.occurrences import get_occurrences
+
+TEXT = """The quick brown fox jumps over the lazy sleeping dog. Short one.
+Another line that contains several sentences about foxes. Foxes jump over dogs every single day.
+
+tiny
+The <b>lazy</b> dog never jumps over the quick brown fox again.
+"""
+
+
+class IngestTest(unittest.TestCase):
+    def setUp(self):
+        try:
+            nltk.sent_tokenize("punkt check.")
+        except LookupError:
+            self.skipTest("nltk punkt tokenizer data is not installed")
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+        self.in_path = self.dir / "in.txt"
+        self.in_path.write_text(TEXT)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_ingest_matches_staged_pipeline(self):
+        # reference: scrub, tokenize and index as three separate passes
+        s_ref = self.dir / "s_ref.txt"
+        t_ref = self.dir / "t_ref.txt"
+        initial_scrub(self.in_path, s_ref, workers=2)
+        initial_tokenize(s_ref, t_ref, workers=2)
+        # fused single pass
+        s_path = self.dir / "s.txt"
+        t_path = self.dir / "t.txt"
+        corpus, occs = ingest.ingest(self.in_path, s_path, t_path, workers=2)
+        assert s_path.read_text() == s_ref.read_text()
+        assert t_path.read_text() == t_ref.read_text()
+        # ingest writes the offset index of both files
+        for path in (s_path, t_path):
+            offsets = line_index.load_offsets(path)
+            assert list(offsets) == list(line_index.build_offsets(path))
+        # the token-id corpus decodes back to the tokenized file
+        lines = t_ref.read_text().split("\n")[:-1]
+        assert len(corpus) == len(lines)
+        for i, line in enumerate(lines):
+            assert [corpus.vocab[t] for t in corpus.line(i)] == line.split()
+        occs_ref = get_occurrences(t_ref, workers=2)
+        assert sorted(occs.vocab) == sorted(occs_ref.vocab)
+        for w in occs.vocab:
+            assert list(occs[w]) == list(occs_ref[w])
+
+
+    def test_sentence_length_counts_cleaned_tokens(self):
+        # html tags and acronym periods don't count towards a sentence's length
+        kept = ingest.ingest_line("Four words right here. <b>Two</b> <i>tagged</i> words. The <i>old</i> house stands.")
+        assert kept == [
+            ("Four words right here.", ["four", "words", "right", "here"]),
+            ("The <i>old</i> house stands.", ["house", "stands"]),
+        ]
+
+
+if __name__ == "__main__":
+    unittest.main()
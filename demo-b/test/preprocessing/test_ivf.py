@@ -0,0 +1,69 @@
+import unittest
+import tempfile
+from pathlib import Path
+import numpy as np
+from app.preprocessing.neighbors import top_k
+from app.preprocessing.ivf import IVFIndex, kmeans
+
+
+def clustered(n, dim, n_clusters, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(n_clusters, dim)) * 4
+    return (centers[rng.integers(n_clusters, size=n)] + rng.normal(size=(n, dim))).astype(np.float32)
+
+
+class IVFIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.vectors = clustered(2000, 16, 20)
+        self.queries = self.vectors[:50] + 0.1
+
+    def test_lists_partition_rows(self):
+        index = IVFIndex.build(self.vectors, n_lists=30)
+        assert len(index.centroids) == 30
+        assert sorted(index.ids.tolist()) == list(range(len(self.vectors)))
+
+    def test_probing_every_list_is_exact(self):
+        for metric in ("cosine", "euclidean"):
+            index = IVFIndex.build(self.vectors, metric=metric)
+            indices, distances = index.search(self.vectors, self.queries, 10, nprobe=len(index.centroids))
+            ref_indices, ref_distances = top_k(self.queries, self.vectors, 10, metric=metric)
+            assert np.array_equal(indices, ref_indices)
+            assert np.allclose(distances, ref_distances, atol=1e-3)
+
+    def test_recall(self):
+        index = IVFIndex.build(self.vectors)
+        ref = top_k(self.queries, self.vectors, 10, metric="euclidean")[0]
+        recalls = []
+        for nprobe in (1, 4, 16):
+            indices = index.search(self.vectors, self.queries, 10, nprobe=nprobe)[0]
+            recalls.append(np.mean([len(set(a) & set(b)) / 10 for a, b in zip(indices, ref)]))
+        assert recalls == sorted(recalls)
+        assert recalls[-1] > 0.9
+
+    def test_returns_k_when_probed_lists_are_small(self):
+        index = IVFIndex.build(self.vectors, n_lists=200)
+        indices, distances = index.search(self.vectors, self.queries[0], 150, nprobe=1)
+        assert indices.shape == (1, 150)
+        assert len(set(indices[0])) == 150
+        assert np.all(np.diff(distances[0]) >= 0)
+
+    def test_kmeans_finds_clusters(self):
+        X = np.concatenate([np.zeros((50, 2)), np.full((50, 2), 10.0)])
+        X += np.random.default_rng(0).normal(scale=0.1, size=X.shape)
+        centroids = kmeans(X, 2)
+        assert np.allclose(np.sort(centroids[:, 0]), [0, 10], atol=0.2)
+
+    def test_write_load_round_trip(self):
+        index = IVFIndex.build(self.vectors, metric="cosine")
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "index"
+            index.write(path)
+            loaded = IVFIndex.load(path)
+        assert loaded.metric == "cosine"
+        assert np.array_equal(loaded.centroids, index.centroids)
+        assert np.array_equal(loaded.offsets, index.offsets)
+        assert np.array_equal(loaded.ids, index.ids)
+
+
+if __name__ == "__main__":
+    unittest.main()
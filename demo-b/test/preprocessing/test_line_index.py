@@ -0,0 +1,39 @@
+import unittest
+import tempfile
+from pathlib import Path
+from app.preprocessing import line_index
+
+LINES = ["first line\n", "\n", "third line with ünïcödé\n", "fourth\n", "last line, no break"]
+
+
+class LineIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / "lines.txt"
+        self.path.write_text("".join(LINES), encoding="utf-8")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_build_offsets(self):
+        offsets = line_index.build_offsets(self.path, chunksize=7)
+        assert len(offsets) == len(LINES) + 1
+        assert offsets[-1] == self.path.stat().st_size
+        data = self.path.read_bytes()
+        for i, line in enumerate(LINES):
+            assert data[offsets[i] : offsets[i + 1]].decode("utf-8") == line
+
+    def test_read_lines_in_requested_order(self):
+        ids = [4, 0, 2, 2, 1]
+        assert line_index.read_lines(self.path, ids) == [LINES[i] for i in ids]
+        # the index is written next to the file on first use
+        assert line_index.offsets_path(self.path).exists()
+        assert line_index.read_lines(self.path, []) == []
+
+    def test_read_lines_out_of_range(self):
+        with self.assertRaises(IndexError):
+            line_index.read_lines(self.path, [len(LINES)])
+
+
+if __name__ == "__main__":
+    unittest.main()
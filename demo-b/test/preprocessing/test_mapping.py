@@ -0,0 +1,31 @@
+import unittest
+import numpy as np
+from sklearn.neighbors import NearestNeighbors
+from app.preprocessing.WordVectors import WordVectors
+from app.preprocessing.mapping import perform_mapping
+from app.metrics import REGISTRY
+
+
+class MappingTest(unittest.TestCase):
+    def test_matches_nearest_neighbors(self):
+        rng = np.random.default_rng(1)
+        wva = WordVectors([f"a{i}" for i in range(50)], rng.normal(size=(50, 8)), centered=False)
+        wvb = WordVectors([f"b{i}" for i in range(80)], rng.normal(size=(80, 8)), centered=False)
+        for metric in ("cosine", "euclidean"):
+            distances, indices = perform_mapping(wva, wvb, k=5, metric=metric, scratch_bytes=1024)
+            nbrs = NearestNeighbors(n_neighbors=5, metric=metric).fit(wvb.vectors)
+            ref_distances, ref_indices = nbrs.kneighbors(wva.vectors)
+            assert np.array_equal(indices, ref_indices)
+            assert np.allclose(distances, ref_distances, atol=1e-4)
+
+    def test_search_is_timed(self):
+        labels = dict(stage="dists", query="mapping", search="exact")
+        before = REGISTRY.get("pipeline_stage_seconds", **labels)
+        before = before.count if before is not None else 0
+        wv = WordVectors(["a", "b", "c"], np.eye(3), centered=False)
+        perform_mapping(wv, wv, k=1)
+        assert REGISTRY.get("pipeline_stage_seconds", **labels).count == before + 1
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+import tempfile
+import tracemalloc
+from pathlib import Path
+import numpy as np
+from sklearn.metrics import pairwise_distances
+from app.preprocessing.neighbors import NeighborSearch, normalize_rows, top_k
+
+
+class NeighborSearchTest(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.vectors = rng.normal(size=(300, 16)).astype(np.float32)
+        self.queries = rng.normal(size=(40, 16)).astype(np.float32)
+
+    def check(self, metric, k, scratch_bytes):
+        indices, distances = top_k(self.queries, self.vectors, k, metric, scratch_bytes)
+        ref = pairwise_distances(self.queries, self.vectors, metric=metric)
+        ref_indices = np.argsort(ref, axis=1, kind="stable")[:, :k]
+        assert indices.shape == (len(self.queries), min(k, len(self.vectors)))
+        assert np.array_equal(indices, ref_indices)
+        assert np.allclose(distances, np.take_along_axis(ref, ref_indices, axis=1), atol=1e-4)
+
+    def test_matches_brute_force(self):
+        for metric in ("cosine", "euclidean"):
+            # one block, and budgets small enough to split both the queries and the searched rows
+            for scratch_bytes in (64 * 1024**2, 4096, 200):
+                for k in (1, 7, 300, 1000):
+                    self.check(metric, k, scratch_bytes)
+
+    def test_blocks_fit_budget(self):
+        search = NeighborSearch(self.vectors, scratch_bytes=4096)
+        batch, block = search._block_shape(len(self.queries), 5)
+        assert batch * block * (4 + 8) <= 4096
+        assert block >= 5
+
+    def test_single_query(self):
+        indices, distances = top_k(self.vectors[3], self.vectors, 2, metric="euclidean")
+        assert indices.shape == (1, 2)
+        assert indices[0, 0] == 3
+        assert distances[0, 0] < 1e-3
+
+    def test_memmap_not_copied(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "v.npy"
+            np.save(path, np.random.default_rng(1).normal(size=(20000, 64)).astype(np.float32))
+            vectors = np.load(path, mmap_mode="r")
+            scratch_bytes = 256 * 1024
+            for metric in ("cosine", "euclidean"):
+                tracemalloc.start()
+                NeighborSearch(vectors, metric, scratch_bytes).search(vectors[:1], 10)
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                # scratch plus a few per-row arrays, well under the 5MB of the rows
+                assert peak < scratch_bytes + 8 * 4 * len(vectors), (metric, peak)
+
+    def test_normalize_rows(self):
+        X = np.array([[3.0, 4.0], [0.0, 0.0]])
+        assert np.allclose(normalize_rows(X), [[0.6, 0.8], [0.0, 0.0]])
+        # the input is not modified
+        assert X[0, 0] == 3.0
+
+    def test_invalid_metric(self):
+        with self.assertRaises(ValueError):
+            NeighborSearch(self.vectors, metric="manhattan")
+
+
+if __name__ == "__main__":
+    unittest.main()
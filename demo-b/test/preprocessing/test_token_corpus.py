@@ -0,0 +1,72 @@
+import unittest
+import tempfile
+from pathlib import Path
+import numpy as np
+from app.preprocessing.Vocabulary import Vocabulary
+from app.preprocessing.token_corpus import TokenCorpus, TokenCorpusBuilder
+from app.preprocessing.generate_embeddings.occurrences import OccurrenceIndexBuilder
+
+LINES = [
+    "the quick brown fox",
+    "the lazy dog",
+    "",
+    "quick quick unknown dog",
+    "the fox the fox",
+]
+
+
+class TokenCorpusTest(unittest.TestCase):
+    def setUp(self):
+        builder = TokenCorpusBuilder()
+        for line in LINES:
+            builder.add(line.split())
+        self.corpus = builder.build()
+
+    def test_lines_decode(self):
+        assert len(self.corpus) == len(LINES)
+        for i, line in enumerate(LINES):
+            assert [self.corpus.vocab[t] for t in self.corpus.line(i)] == line.split()
+
+    def test_counts(self):
+        counts = self.corpus.counts()
+        expected = {}
+        for line in LINES:
+            for tok in line.split():
+                expected[tok] = expected.get(tok, 0) + 1
+        assert {w: counts[i] for i, w in enumerate(self.corpus.vocab)} == expected
+
+    def test_occurrences_match_builder(self):
+        for limit in (1, 2, 2000):
+            ref = OccurrenceIndexBuilder(limit=limit)
+            for i, line in enumerate(LINES):
+                ref.add(i, line.split())
+            ref = ref.build()
+            occs = self.corpus.occurrences(limit=limit)
+            assert sorted(occs.vocab) == sorted(ref.vocab)
+            for w in occs.vocab:
+                assert list(occs[w]) == list(ref[w])
+
+    def test_sentence_matrix(self):
+        words = Vocabulary(["dog", "the", "fox", "quick"])
+        remap = self.corpus.vocab_map(words)
+        for start, stop in ((0, None), (1, 4), (3, 100)):
+            m = self.corpus.sentence_matrix(remap, len(words), start, stop).toarray()
+            expected = np.zeros((len(LINES[start:stop]), len(words)))
+            for i, line in enumerate(LINES[start:stop]):
+                for tok in line.split():
+                    if tok in words:
+                        expected[i, words.get_id(tok)] += 1
+            assert np.array_equal(m, expected)
+
+    def test_write_load_round_trip(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "corpus"
+            self.corpus.write(path)
+            loaded = TokenCorpus.load(path)
+            assert loaded.vocab == self.corpus.vocab
+            assert np.array_equal(loaded.offsets, self.corpus.offsets)
+            assert np.array_equal(loaded.tokens, self.corpus.tokens)
+
+
+if __name__ == "__main__":
+    unittest.main()
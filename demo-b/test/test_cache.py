@@ -0,0 +1,79 @@
+import unittest
+import threading
+import time
+import numpy as np
+from app.cache import ArtifactCache, sizeof
+
+
+class ArtifactCacheTest(unittest.TestCase):
+    def test_hit_does_not_reload(self):
+        cache = ArtifactCache(1 << 20)
+        calls = []
+        loader = lambda: calls.append(1) or np.zeros(10)
+        a = cache.get("a", loader)
+        b = cache.get("a", loader)
+        assert a is b
+        assert len(calls) == 1
+
+    def test_evicts_least_recently_used(self):
+        # room for two 800 byte arrays but not three
+        cache = ArtifactCache(2000)
+        cache.get("a", lambda: np.zeros(100))
+        cache.get("b", lambda: np.zeros(100))
+        # touch a so b becomes least recently used
+        cache.get("a", lambda: None)
+        cache.get("c", lambda: np.zeros(100))
+        assert "a" in cache
+        assert "b" not in cache
+        assert "c" in cache
+        assert cache.bytes <= cache.max_bytes
+
+    def test_oversized_artifact_is_not_kept(self):
+        cache = ArtifactCache(100)
+        v = cache.get("big", lambda: np.zeros(1000))
+        assert len(v) == 1000
+        assert "big" not in cache
+        assert cache.bytes == 0
+
+    def test_concurrent_requests_share_one_load(self):
+        cache = ArtifactCache(1 << 20)
+        calls = []
+
+        def loader():
+            calls.append(1)
+            time.sleep(0.1)
+            return np.arange(10)
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(cache.get("k", loader)))
+            for _ in range(8)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert len(calls) == 1
+        assert len(results) == 8
+        assert all(r is results[0] for r in results)
+
+    def test_failed_load_is_not_cached(self):
+        cache = ArtifactCache(1 << 20)
+
+        def fail():
+            raise OSError("missing")
+
+        with self.assertRaises(OSError):
+            cache.get("k", fail)
+        assert "k" not in cache
+        assert cache.get("k", lambda: 1) == 1
+
+    def test_sizeof_counts_buffers_once(self):
+        a = np.zeros(1000)
+        assert sizeof(a) == a.nbytes
+        assert sizeof([a, a]) < 2 * a.nbytes
+        assert sizeof({"x": a}) >= a.nbytes
+
+
+if __name__ == "__main__":
+    unittest.main()
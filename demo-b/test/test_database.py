@@ -0,0 +1,59 @@
+import unittest
+import tempfile
+import threading
+from pathlib import Path
+from app.database import Connections, connect
+
+
+class ConnectionsTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.database = str(Path(self.tmp.name) / "test.db")
+        with connect(self.database) as db:
+            db.execute("create table t (id integer primary key autoincrement, x integer)")
+        self.connections = Connections(self.database)
+
+    def tearDown(self):
+        self.connections.close()
+        self.tmp.cleanup()
+
+    def test_wal_mode(self):
+        mode = self.connections.get().execute("PRAGMA journal_mode").fetchone()[0]
+        assert mode == "wal"
+
+    def test_connection_reused_per_thread(self):
+        db = self.connections.get()
+        assert self.connections.get() is db
+        other = []
+        t = threading.Thread(target=lambda: other.append(self.connections.get()))
+        t.start()
+        t.join()
+        assert other[0] is not db
+
+    def test_release_rolls_back_and_keeps_connection(self):
+        db = self.connections.get()
+        db.execute("insert into t (x) values (1)")
+        assert db.in_transaction
+        self.connections.release()
+        assert self.connections.get() is db
+        assert db.execute("select count(*) from t").fetchone()[0] == 0
+
+    def test_reader_not_blocked_by_open_write(self):
+        writer = connect(self.database)
+        writer.execute("begin immediate")
+        writer.execute("insert into t (x) values (1)")
+        # the uncommitted row is invisible, but reading doesn't wait on the writer's lock
+        assert self.connections.get().execute("select count(*) from t").fetchone()[0] == 0
+        writer.commit()
+        assert self.connections.get().execute("select count(*) from t").fetchone()[0] == 1
+        writer.close()
+
+    def test_lastrowid(self):
+        db = self.connections.get()
+        cur = db.execute("insert into t (x) values (5)")
+        db.commit()
+        assert cur.lastrowid == db.execute("select max(id) from t").fetchone()[0]
+
+
+if __name__ == "__main__":
+    unittest.main()
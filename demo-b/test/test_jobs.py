@@ -0,0 +1,115 @@
+import os
+import subprocess
+import sys
+import unittest
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+from app.jobs import JobQueue
+from app.resources import ResourceScheduler
+
+
+def wait(queue, job_id, timeout=10):
+    """
+    polls the jobs table until job_id finishes
+    """
+    start = time.time()
+    while time.time() - start < timeout:
+        with sqlite3.connect(queue.database) as db:
+            db.row_factory = sqlite3.Row
+            job = dict(db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+        if job["status"] in ("done", "failed"):
+            return job
+        time.sleep(0.01)
+    raise TimeoutError(job_id)
+
+
+class JobQueueTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.database = str(Path(self.tmp.name) / "test.db")
+        schema = Path("app/db/schema.sql").read_text()
+        with sqlite3.connect(self.database) as db:
+            db.executescript(schema)
+        self.queue = JobQueue(self.database)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_job_reports_stages_and_artifact(self):
+        def fn(job, x):
+            job.stage("first")
+            job.progress(0.5)
+            job.stage("second")
+            return x + 1
+
+        job_id = self.queue.submit("test", ["first", "second"], fn, 41)
+        job = wait(self.queue, job_id)
+        assert job["status"] == "done"
+        assert job["artifact_id"] == 42
+        assert job["stage"] == "second"
+        assert job["stage_index"] == 1
+        assert job["num_stages"] == 2
+        assert job["progress"] == 1.0
+        assert job["started_at"] >= job["created_at"]
+        with sqlite3.connect(self.database) as db:
+            stages = db.execute(
+                "SELECT stage, stage_index, seconds FROM job_stages WHERE job_id = ? ORDER BY id", (job_id,)
+            ).fetchall()
+        assert [(s, i) for s, i, _ in stages] == [("first", 0), ("second", 1)]
+        assert all(seconds >= 0 for _, _, seconds in stages)
+
+    def test_failed_job_records_error(self):
+        def fn(job):
+            raise ValueError("bad settings")
+
+        job_id = self.queue.submit("test", [], fn)
+        job = wait(self.queue, job_id)
+        assert job["status"] == "failed"
+        assert job["error"] == "bad settings"
+        assert job["artifact_id"] is None
+
+    def test_fail_interrupted(self):
+        # a process that has exited, and a live one other than this process
+        dead = subprocess.Popen([sys.executable, "-c", "pass"])
+        dead.wait()
+        live = os.getppid()
+        with sqlite3.connect(self.database) as db:
+            rows = [
+                ("running", dead.pid),
+                ("queued", dead.pid),
+                ("running", None),
+                ("running", live),
+                ("done", dead.pid),
+            ]
+            for status, pid in rows:
+                db.execute(
+                    "INSERT INTO jobs (kind, status, num_stages, progress, pid, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    ("test", status, 1, 0.0, pid, 0.0, 0.0),
+                )
+        assert self.queue.fail_interrupted() == 3
+        with sqlite3.connect(self.database) as db:
+            statuses = db.execute("SELECT status, error FROM jobs ORDER BY id").fetchall()
+        assert [st for st, _ in statuses] == ["failed", "failed", "failed", "running", "done"]
+        assert statuses[0][1].startswith("interrupted")
+        # jobs submitted by this process record its id and are left alone by other workers
+        job_id = self.queue.submit("test", [], lambda job: 1)
+        wait(self.queue, job_id)
+        with sqlite3.connect(self.database) as db:
+            assert db.execute("SELECT pid FROM jobs WHERE id = ?", (job_id,)).fetchone()[0] == os.getpid()
+
+    def test_job_waits_for_heavy_slot(self):
+        scheduler = ResourceScheduler(self.tmp.name, cpus=1, heavy_jobs=1)
+        queue = JobQueue(self.database, scheduler=scheduler)
+        with scheduler.heavy():
+            job_id = queue.submit("test", [], lambda job: 1)
+            time.sleep(0.2)
+            with sqlite3.connect(self.database) as db:
+                status = db.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]
+            assert status == "queued"
+        assert wait(queue, job_id)["status"] == "done"
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+import tempfile
+from pathlib import Path
+from app.metrics import Registry, Histogram, timed, disk_bytes
+
+
+class MetricsTest(unittest.TestCase):
+    def test_histogram_buckets(self):
+        h = Histogram(buckets=(0.1, 1))
+        for v in (0.05, 0.5, 0.5, 5):
+            h.observe(v)
+        lines = h.lines("t", (("stage", "align"),))
+        assert lines == [
+            't_bucket{stage="align",le="0.1"} 1',
+            't_bucket{stage="align",le="1.0"} 3',
+            't_bucket{stage="align",le="+Inf"} 4',
+            't_sum{stage="align"} 6.05',
+            't_count{stage="align"} 4',
+        ]
+
+    def test_render(self):
+        r = Registry()
+        r.inc("bytes_total", 10, help="bytes", artifact="corpus")
+        r.inc("bytes_total", 5, artifact="corpus")
+        r.set("words", 3, artifact='a "quoted"\nname')
+        r.observe("latency", 0.2, buckets=(1,), route="/getContext")
+        text = r.render()
+        assert "# HELP bytes_total bytes\n# TYPE bytes_total counter\n" in text
+        assert 'bytes_total{artifact="corpus"} 15.0\n' in text
+        assert 'words{artifact="a \\"quoted\\"\\nname"} 3.0\n' in text
+        assert 'latency_bucket{route="/getContext",le="1.0"} 1\n' in text
+        assert r.get("bytes_total", artifact="corpus") == 15
+        assert r.get("latency", route="/getContext").count == 1
+        with self.assertRaises(ValueError):
+            r.inc("words")
+
+    def test_timed_records_failures(self):
+        r = Registry()
+        with timed("stage_seconds", registry=r, stage="ok") as t:
+            pass
+        assert t.seconds >= 0
+        with self.assertRaises(RuntimeError):
+            with timed("stage_seconds", registry=r, stage="bad"):
+                raise RuntimeError()
+        assert r.get("stage_seconds", stage="ok").count == 1
+        assert r.get("stage_seconds", stage="bad").count == 1
+
+    def test_disk_bytes(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            d = Path(tmp) / "artifact"
+            (d / "sub").mkdir(parents=True)
+            (d / "a.npy").write_bytes(b"x" * 10)
+            (d / "sub" / "b.txt").write_bytes(b"y" * 5)
+            assert disk_bytes(d) == 15
+            assert disk_bytes(d / "a.npy") == 10
+
+
+if __name__ == "__main__":
+    unittest.main()
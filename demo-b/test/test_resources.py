@@ -0,0 +1,103 @@
+import os
+import unittest
+import tempfile
+import threading
+import time
+import multiprocessing
+from threadpoolctl import threadpool_info
+from app.resources import ResourceScheduler, available_cpus, worker_pool
+
+
+def hold_slot(lock_dir, held, seconds):
+    """
+    takes the only heavy job slot in lock_dir in another process and keeps it for seconds
+    """
+    scheduler = ResourceScheduler(lock_dir, cpus=1, heavy_jobs=1)
+    with scheduler.heavy(poll=0.01):
+        held.set()
+        time.sleep(seconds)
+
+
+class ResourceSchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def max_concurrent(self, scheduler, n_jobs):
+        """
+        runs n_jobs threads through scheduler.heavy, returns the most that were inside at once
+        """
+        running = []
+        peak = []
+        lock = threading.Lock()
+
+        def job():
+            with scheduler.heavy(poll=0.01):
+                with lock:
+                    running.append(1)
+                    peak.append(len(running))
+                time.sleep(0.05)
+                with lock:
+                    running.pop()
+
+        threads = [threading.Thread(target=job) for _ in range(n_jobs)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return max(peak)
+
+    def test_budget(self):
+        self.assertGreaterEqual(available_cpus(), 1)
+        scheduler = ResourceScheduler(self.tmp.name, cpus=16, heavy_jobs=2, web_workers=4)
+        self.assertEqual(scheduler.job_cpus, 8)
+        self.assertEqual(scheduler.query_threads, 4)
+        scheduler = ResourceScheduler(self.tmp.name, cpus=2, heavy_jobs=4)
+        self.assertEqual(scheduler.job_cpus, 1)
+
+    def test_heavy_jobs_capped_across_threads(self):
+        self.assertEqual(self.max_concurrent(ResourceScheduler(self.tmp.name, heavy_jobs=1), 4), 1)
+        self.assertEqual(self.max_concurrent(ResourceScheduler(self.tmp.name, heavy_jobs=2), 4), 2)
+
+    def test_heavy_jobs_capped_across_processes(self):
+        held = multiprocessing.Event()
+        p = multiprocessing.Process(target=hold_slot, args=(self.tmp.name, held, 0.5))
+        p.start()
+        self.assertTrue(held.wait(10))
+        scheduler = ResourceScheduler(self.tmp.name, cpus=1, heavy_jobs=1)
+        start = time.perf_counter()
+        with scheduler.heavy(poll=0.01):
+            waited = time.perf_counter() - start
+        p.join()
+        self.assertGreater(waited, 0.2)
+
+    def test_pool_is_persistent(self):
+        scheduler = ResourceScheduler(self.tmp.name, cpus=1)
+        try:
+            pool = scheduler.pool()
+            self.assertIs(scheduler.pool(), pool)
+            first = set(pool.map(_pid, range(4)))
+            # later stages are served by the same process instead of a fresh pool
+            self.assertEqual(set(scheduler.pool().map(_pid, range(4))), first)
+            self.assertNotIn(os.getpid(), first)
+        finally:
+            scheduler.close()
+        with worker_pool(workers=1) as p:
+            self.assertEqual(p.map(abs, [-1, 2]), [1, 2])
+
+    def test_heavy_limits_blas_threads(self):
+        scheduler = ResourceScheduler(self.tmp.name, cpus=1)
+        with scheduler.heavy(poll=0.01):
+            for lib in threadpool_info():
+                if lib["user_api"] == "blas":
+                    self.assertEqual(lib["num_threads"], 1)
+
+
+def _pid(_):
+    return os.getpid()
+
+
+if __name__ == "__main__":
+    unittest.main()
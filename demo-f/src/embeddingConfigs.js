@@ -9,6 +9,9 @@ export const availableEmbeddings = reactive({
 	"word2vec":{
 		  "size": 100,
 		  "window": 5,
-		  "minCount": 5
+		  "minCount": 5,
+		  "epochs": 5,
+		  "negative": 5,
+		  "sample": 0.001
 	}
 });
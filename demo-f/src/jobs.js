@@ -0,0 +1,24 @@
+// helpers for the backend's background job api
+// uploads, embeddings and alignments return a job id right away;
+// poll the job until it finishes to get the id of the created artifact
+export async function waitForJob(jobId, interval = 1000) {
+  for (;;) {
+    const res = await fetch("/api/getJob", {
+      method: "POST",
+      headers: {
+        "Content-Type": "application/json",
+      },
+      body: JSON.stringify({ id: jobId }),
+    }).then((res) => res.json());
+    if (res.error) {
+      throw new Error(res.error);
+    }
+    if (res.job.status === "done") {
+      return res.job;
+    }
+    if (res.job.status === "failed") {
+      throw new Error(res.job.error);
+    }
+    await new Promise((resolve) => setTimeout(resolve, interval));
+  }
+}